@@ -1,20 +1,34 @@
-from fastapi import FastAPI, HTTPException, Depends, BackgroundTasks
+from fastapi import FastAPI, HTTPException, Depends, BackgroundTasks, Query, Request, Response
 from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import List, Optional, Union
 import logging
 from datetime import datetime, timedelta
 import uvicorn
 import os
 import cv2
-import io
+import mimetypes
 import time
+import asyncio
+import anyio
 
-from src.database import get_db, init_db
-from src.models import VideoStream, VideoEvent, VideoAnalytics, SystemMetrics
+from src.database import init_db, run_in_db
+from src.models import VideoStream, VideoEvent, SystemMetrics
 from src.stream_manager import StreamManager
-from pydantic import BaseModel
+from src.pagination import MAX_PAGE_SIZE, paginate
+from src.rollup import RESOLUTIONS, bucket_to_dict
+from src.pubsub import TOPICS as PUSH_TOPICS
+from src.loop_monitor import EventLoopMonitor
+from src.file_serving import resolve_media_path, media_file_response
+from src.thumbnails import snap_width
+from src.purge import PurgeEngine
+from src.partitions import analytics_partitions
+from src.video_processor import FRAMES_DIR, CLIPS_DIR
+from src.recorder import RECORDINGS_DIR
+from src.hls import HLS_SEGMENT_SECONDS
+from src.mjpeg_hub import MJPEG_PROFILES, MjpegProfile, encode_frame, get_profile, multipart_frame, snap_profile
+from pydantic import BaseModel, Field
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -29,10 +43,21 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 # Initialize stream manager
 stream_manager = StreamManager()
+loop_monitor = EventLoopMonitor()
+purge_engine = PurgeEngine(
+    # Stopping and draining a stream can take a while, so the purge job does
+    # it, on the control executor like every other stream change
+    prepare_stream=lambda stream_id: stream_manager.control_executor.submit(
+        stream_manager.remove_stream, stream_id
+    ).result(),
+    # Deleted rows would otherwise stay in the dashboard windows until they expire
+    on_stream_deleted=lambda stream_id: stream_manager.dashboard.seed()
+)
 
 # Pydantic models
 class StreamCreate(BaseModel):
@@ -47,6 +72,7 @@ class StreamResponse(BaseModel):
     stream_type: str
     is_active: bool
     is_running: Optional[bool] = False
+    retention_days: Optional[float] = None
     created_at: datetime
     updated_at: datetime
 
@@ -60,6 +86,8 @@ class EventResponse(BaseModel):
     event_metadata: Optional[dict]
     frame_path: Optional[str]
     clip_path: Optional[str]
+    video_path: Optional[str] = None
+    track_id: Optional[str] = None
 
 class AnalyticsResponse(BaseModel):
     analytics_id: int
@@ -71,12 +99,46 @@ class AnalyticsResponse(BaseModel):
     object_count: int
     quality_score: Optional[float]
     processing_time_ms: Optional[int]
+    analysis_fps: Optional[float] = None
+    skip_ratio: Optional[float] = None
+
+class EventPage(BaseModel):
+    items: List[EventResponse]
+    next_cursor: Optional[str] = None
+
+class AnalyticsPage(BaseModel):
+    items: List[AnalyticsResponse]
+    next_cursor: Optional[str] = None
+
+class AnalyticsBucketResponse(BaseModel):
+    bucket_start: datetime
+    samples: int
+    avg_fps: float
+    max_fps: float
+    motion_frames: int
+    object_count: int
+    max_objects: int
+    avg_quality: float
+    avg_processing_ms: float
+    p50_processing_ms: Optional[float]
+    p95_processing_ms: Optional[float]
+
+class ProcessingBudget(BaseModel):
+    target_analysis_fps: Optional[float] = None
+    max_cpu_ms_per_sec: Optional[float] = None
+
+class StreamRetention(BaseModel):
+    # Null falls back to the global retention windows
+    retention_days: Optional[float] = Field(None, ge=0)
 
 @app.on_event("startup")
 async def startup_event():
     try:
         init_db()
+        stream_manager.dashboard.seed()
         stream_manager.start()
+        purge_engine.start()
+        loop_monitor.start()
         logger.info("Application started successfully")
     except Exception as e:
         logger.error(f"Startup error: {e}")
@@ -84,6 +146,8 @@ async def startup_event():
 
 @app.on_event("shutdown")
 async def shutdown_event():
+    await loop_monitor.stop()
+    purge_engine.stop()
     stream_manager.stop()
     logger.info("Application shutdown complete")
 
@@ -93,106 +157,97 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy", "timestamp": datetime.utcnow()}
+    return {
+        "status": "healthy",
+        "timestamp": datetime.utcnow(),
+        "event_loop_lag_ms": loop_monitor.get_status()['lag_ms']
+    }
 
 # Stream management endpoints
+def _stream_dict(stream: VideoStream) -> dict:
+    """Stream row plus its running status from the stream manager"""
+    return {
+        "stream_id": stream.stream_id,
+        "stream_name": stream.stream_name,
+        "stream_url": stream.stream_url,
+        "stream_type": stream.stream_type,
+        "is_active": stream.is_active,
+        "is_running": stream_manager.active_streams.get(stream.stream_id, {}).get('running', False),
+        "retention_days": stream.retention_days,
+        "created_at": stream.created_at,
+        "updated_at": stream.updated_at
+    }
+
+def _get_stream_row(db: Session, stream_id: int) -> Optional[VideoStream]:
+    return db.query(VideoStream).filter(VideoStream.stream_id == stream_id).first()
+
+def _insert_stream(db: Session, stream_data: StreamCreate) -> int:
+    new_stream = VideoStream(
+        stream_name=stream_data.stream_name,
+        stream_url=stream_data.stream_url,
+        stream_type=stream_data.stream_type,
+        is_active=True
+    )
+    db.add(new_stream)
+    db.commit()
+    return new_stream.stream_id
+
 @app.post("/streams", response_model=StreamResponse)
-async def create_stream(stream_data: StreamCreate, db: Session = Depends(get_db)):
+async def create_stream(stream_data: StreamCreate):
     try:
         # Create stream in database
-        new_stream = VideoStream(
-            stream_name=stream_data.stream_name,
-            stream_url=stream_data.stream_url,
-            stream_type=stream_data.stream_type,
-            is_active=True
-        )
-        db.add(new_stream)
-        db.commit()
-        db.refresh(new_stream)
+        stream_id = await run_in_db(_insert_stream, stream_data)
         
-        # Add to stream manager
-        success = stream_manager.add_stream(
-            new_stream.stream_id,
+        # Opening the source can take seconds for a slow camera, so it runs
+        # on the control executor rather than the event loop
+        success = await stream_manager.run_control(
+            stream_manager.add_stream,
+            stream_id,
             stream_data.stream_url,
             stream_data.stream_name
         )
         
         if not success:
-            logger.warning(f"Failed to initialize stream manager for stream {new_stream.stream_id}")
+            logger.warning(f"Failed to initialize stream manager for stream {stream_id}")
             # Don't fail the request, just log the warning
         else:
             # Automatically start the stream processing
-            start_success = stream_manager.start_stream(new_stream.stream_id)
+            start_success = await stream_manager.run_control(stream_manager.start_stream, stream_id)
             if start_success:
-                logger.info(f"Stream {new_stream.stream_id} started automatically after creation")
+                logger.info(f"Stream {stream_id} started automatically after creation")
             else:
-                logger.warning(f"Failed to auto-start stream {new_stream.stream_id}")
+                logger.warning(f"Failed to auto-start stream {stream_id}")
         
         # Return stream with running status
-        stream_dict = {
-            "stream_id": new_stream.stream_id,
-            "stream_name": new_stream.stream_name,
-            "stream_url": new_stream.stream_url,
-            "stream_type": new_stream.stream_type,
-            "is_active": new_stream.is_active,
-            "is_running": stream_manager.active_streams.get(new_stream.stream_id, {}).get('running', False),
-            "created_at": new_stream.created_at,
-            "updated_at": new_stream.updated_at
-        }
-        
-        return stream_dict
+        new_stream = await run_in_db(_get_stream_row, stream_id)
+        return _stream_dict(new_stream)
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"Error creating stream: {e}")
-        db.rollback()
         raise HTTPException(status_code=500, detail=f"Failed to create stream: {str(e)}")
 
 @app.get("/streams", response_model=List[StreamResponse])
-async def get_streams(db: Session = Depends(get_db)):
+async def get_streams():
     try:
-        streams = db.query(VideoStream).all()
+        streams = await run_in_db(lambda db: db.query(VideoStream).all())
+        deleting = set(purge_engine.deleting_streams())
         
         # Add running status from stream manager
-        result = []
-        for stream in streams:
-            stream_dict = {
-                "stream_id": stream.stream_id,
-                "stream_name": stream.stream_name,
-                "stream_url": stream.stream_url,
-                "stream_type": stream.stream_type,
-                "is_active": stream.is_active,
-                "is_running": stream_manager.active_streams.get(stream.stream_id, {}).get('running', False),
-                "created_at": stream.created_at,
-                "updated_at": stream.updated_at
-            }
-            result.append(stream_dict)
-        
-        return result
+        return [_stream_dict(stream) for stream in streams if stream.stream_id not in deleting]
     except Exception as e:
         logger.error(f"Error fetching streams: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/streams/{stream_id}", response_model=StreamResponse)
-async def get_stream(stream_id: int, db: Session = Depends(get_db)):
+async def get_stream(stream_id: int):
     try:
-        stream = db.query(VideoStream).filter(VideoStream.stream_id == stream_id).first()
+        stream = await run_in_db(_get_stream_row, stream_id)
         if not stream:
             raise HTTPException(status_code=404, detail="Stream not found")
         
         # Add running status from stream manager
-        stream_dict = {
-            "stream_id": stream.stream_id,
-            "stream_name": stream.stream_name,
-            "stream_url": stream.stream_url,
-            "stream_type": stream.stream_type,
-            "is_active": stream.is_active,
-            "is_running": stream_manager.active_streams.get(stream.stream_id, {}).get('running', False),
-            "created_at": stream.created_at,
-            "updated_at": stream.updated_at
-        }
-        
-        return stream_dict
+        return _stream_dict(stream)
     except HTTPException:
         raise
     except Exception as e:
@@ -200,14 +255,16 @@ async def get_stream(stream_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/streams/{stream_id}/start")
-async def start_stream(stream_id: int, db: Session = Depends(get_db)):
+async def start_stream(stream_id: int):
     try:
         # Verify stream exists
-        stream = db.query(VideoStream).filter(VideoStream.stream_id == stream_id).first()
+        stream = await run_in_db(_get_stream_row, stream_id)
         if not stream:
             raise HTTPException(status_code=404, detail="Stream not found")
+        if stream_id in purge_engine.deleting_streams():
+            raise HTTPException(status_code=409, detail="Stream is being deleted")
         
-        success = stream_manager.start_stream(stream_id)
+        success = await stream_manager.run_control(stream_manager.start_stream, stream_id)
         if not success:
             raise HTTPException(status_code=400, detail="Failed to start stream")
         
@@ -221,7 +278,8 @@ async def start_stream(stream_id: int, db: Session = Depends(get_db)):
 @app.post("/streams/{stream_id}/stop")
 async def stop_stream(stream_id: int):
     try:
-        success = stream_manager.stop_stream(stream_id)
+        # Joins the processing thread (or waits on its worker)
+        success = await stream_manager.run_control(stream_manager.stop_stream, stream_id)
         if not success:
             raise HTTPException(status_code=400, detail="Failed to stop stream")
         
@@ -232,99 +290,188 @@ async def stop_stream(stream_id: int):
         logger.error(f"Error stopping stream {stream_id}: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.delete("/streams/{stream_id}")
-async def delete_stream(stream_id: int, db: Session = Depends(get_db)):
+@app.put("/streams/{stream_id}/budget")
+async def set_stream_budget(stream_id: int, budget: ProcessingBudget):
     try:
-        # Stop stream first
-        stream_manager.stop_stream(stream_id)
-        
-        # Remove from stream manager
-        stream_manager.remove_stream(stream_id)
-        
-        # Get all events for this stream to find associated files
-        events = db.query(VideoEvent).filter(VideoEvent.stream_id == stream_id).all()
-        
-        # Delete associated files
-        deleted_files = {"frames": 0, "clips": 0}
-        for event in events:
-            # Delete frame files
-            if event.frame_path and os.path.exists(event.frame_path):
-                try:
-                    os.remove(event.frame_path)
-                    deleted_files["frames"] += 1
-                except Exception as e:
-                    logger.warning(f"Failed to delete frame file {event.frame_path}: {e}")
-            
-            # Delete clip files
-            if event.clip_path and os.path.exists(event.clip_path):
-                try:
-                    os.remove(event.clip_path)
-                    deleted_files["clips"] += 1
-                except Exception as e:
-                    logger.warning(f"Failed to delete clip file {event.clip_path}: {e}")
-        
-        # Delete database entries
-        # Delete events first (foreign key constraint)
-        db.query(VideoEvent).filter(VideoEvent.stream_id == stream_id).delete()
-        
-        # Delete analytics
-        db.query(VideoAnalytics).filter(VideoAnalytics.stream_id == stream_id).delete()
-        
-        # Delete stream
-        stream = db.query(VideoStream).filter(VideoStream.stream_id == stream_id).first()
-        if stream:
-            db.delete(stream)
+        scheduler_status = await stream_manager.run_control(
+            stream_manager.set_processing_budget,
+            stream_id,
+            budget.target_analysis_fps,
+            budget.max_cpu_ms_per_sec
+        )
+        if scheduler_status is None:
+            raise HTTPException(status_code=404, detail="Stream not managed")
         
-        db.commit()
+        return {
+            "message": f"Processing budget updated for stream {stream_id}",
+            "scheduler": scheduler_status
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error updating budget for stream {stream_id}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.delete("/streams/{stream_id}", status_code=202)
+async def delete_stream(stream_id: int):
+    try:
+        stream = await run_in_db(_get_stream_row, stream_id)
+        if not stream:
+            raise HTTPException(status_code=404, detail="Stream not found")
         
-        logger.info(f"Stream {stream_id} deleted: {deleted_files['frames']} frames, {deleted_files['clips']} clips, and all database entries removed")
+        # The job stops the stream, waits for its queued writes, then removes
+        # its rows and files in the background; follow it for progress.
+        # Queueing it stores it, so it runs on the database executor.
+        job = await run_in_db(lambda db: purge_engine.delete_stream(stream_id))
+        logger.info(f"Stream {stream_id} queued for deletion (purge job {job['job_id']})")
         return {
-            "message": f"Stream {stream_id} deleted successfully",
-            "deleted_files": deleted_files
+            "message": f"Stream {stream_id} is being deleted",
+            "job": job
         }
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error deleting stream {stream_id}: {e}")
-        db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.put("/streams/{stream_id}/retention")
+async def set_stream_retention(stream_id: int, retention: StreamRetention):
+    try:
+        def update(db: Session) -> bool:
+            stream = _get_stream_row(db, stream_id)
+            if not stream:
+                return False
+            stream.retention_days = retention.retention_days
+            db.commit()
+            return True
+        
+        if not await run_in_db(update):
+            raise HTTPException(status_code=404, detail="Stream not found")
+        
+        return {
+            "message": f"Retention updated for stream {stream_id}",
+            "retention_days": retention.retention_days
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error updating retention for stream {stream_id}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/purge/status")
+async def get_purge_status():
+    return {
+        "engine": purge_engine.get_status(),
+        "analytics_partitions": await run_in_db(lambda db: analytics_partitions.get_status()),
+        "jobs": purge_engine.list_jobs()
+    }
+
+@app.get("/purge/jobs/{job_id}")
+async def get_purge_job(job_id: int):
+    job = purge_engine.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Purge job not found")
+    return job
+
+@app.post("/purge/run")
+async def run_purge():
+    purge_engine.run_retention_now()
+    return {"message": "Retention pass scheduled"}
+
 # Analytics endpoints
-@app.get("/streams/{stream_id}/analytics", response_model=List[AnalyticsResponse])
+def _page(rows: List, next_cursor: Optional[str], response: Response, paged: bool):
+    """A page of a list endpoint: the bare rows, or with ``paged`` the rows and the next cursor.
+
+    The cursor is also sent as the ``X-Next-Cursor`` header either way, for
+    clients of the bare-list form.
+    """
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    if paged:
+        return {"items": rows, "next_cursor": next_cursor}
+    return rows
+
+@app.get("/streams/{stream_id}/analytics", response_model=Union[List[AnalyticsResponse], AnalyticsPage])
 async def get_stream_analytics(
     stream_id: int,
+    response: Response,
     hours: int = 24,
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    limit: int = Query(MAX_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    paged: bool = False
 ):
     try:
         start_time = datetime.utcnow() - timedelta(hours=hours)
-        analytics = db.query(VideoAnalytics).filter(
-            VideoAnalytics.stream_id == stream_id,
-            VideoAnalytics.timestamp >= start_time
-        ).order_by(VideoAnalytics.timestamp.desc()).limit(1000).all()
         
-        return analytics
+        # Only the day partitions overlapping the window are read
+        analytics, next_cursor = await run_in_db(
+            analytics_partitions.page, stream_id, start_time, cursor, limit
+        )
+        return _page(analytics, next_cursor, response, paged)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error fetching analytics for stream {stream_id}: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/streams/{stream_id}/events", response_model=List[EventResponse])
+@app.get("/streams/{stream_id}/analytics/buckets", response_model=List[AnalyticsBucketResponse])
+async def get_stream_analytics_buckets(
+    stream_id: int,
+    resolution: Optional[str] = None,
+    hours: int = 24
+):
+    try:
+        if resolution is None:
+            # Keep charts at a few hundred points at most
+            resolution = 'minute' if hours <= 6 else 'hour'
+        if resolution not in RESOLUTIONS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Unknown resolution {resolution}, expected one of: {', '.join(RESOLUTIONS)}"
+            )
+        
+        model = RESOLUTIONS[resolution][0]
+        start_time = datetime.utcnow() - timedelta(hours=hours)
+        buckets = await run_in_db(lambda db: db.query(model).filter(
+            model.stream_id == stream_id,
+            model.bucket_start >= start_time
+        ).order_by(model.bucket_start).all())
+        
+        return [bucket_to_dict(bucket) for bucket in buckets]
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error fetching analytics buckets for stream {stream_id}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/streams/{stream_id}/events", response_model=Union[List[EventResponse], EventPage])
 async def get_stream_events(
     stream_id: int,
+    response: Response,
     event_type: Optional[str] = None,
     hours: int = 24,
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    limit: int = Query(MAX_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    paged: bool = False
 ):
     try:
         start_time = datetime.utcnow() - timedelta(hours=hours)
-        query = db.query(VideoEvent).filter(
-            VideoEvent.stream_id == stream_id,
-            VideoEvent.event_time >= start_time
-        )
         
-        if event_type:
-            query = query.filter(VideoEvent.event_type == event_type)
+        def load(db: Session):
+            query = db.query(VideoEvent).filter(
+                VideoEvent.stream_id == stream_id,
+                VideoEvent.event_time >= start_time
+            )
+            
+            if event_type:
+                query = query.filter(VideoEvent.event_type == event_type)
+            
+            return paginate(query, VideoEvent.event_time, VideoEvent.event_id, cursor, limit)
         
-        events = query.order_by(VideoEvent.event_time.desc()).limit(1000).all()
-        return events
+        events, next_cursor = await run_in_db(load)
+        return _page(events, next_cursor, response, paged)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error fetching events for stream {stream_id}: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -337,6 +484,8 @@ async def get_system_status():
         return {
             "system_status": "running",
             "timestamp": datetime.utcnow(),
+            "event_loop": loop_monitor.get_status(),
+            "purge": purge_engine.get_status(),
             "stream_manager": stream_status
         }
     except Exception as e:
@@ -344,84 +493,101 @@ async def get_system_status():
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/system/metrics")
-async def get_system_metrics(hours: int = 24, db: Session = Depends(get_db)):
+async def get_system_metrics(
+    response: Response,
+    hours: int = 24,
+    cursor: Optional[str] = None,
+    limit: int = Query(MAX_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    paged: bool = False
+):
     try:
         start_time = datetime.utcnow() - timedelta(hours=hours)
-        metrics = db.query(SystemMetrics).filter(
-            SystemMetrics.timestamp >= start_time
-        ).order_by(SystemMetrics.timestamp.desc()).limit(1000).all()
-        
-        return metrics
+        metrics, next_cursor = await run_in_db(lambda db: paginate(
+            db.query(SystemMetrics).filter(SystemMetrics.timestamp >= start_time),
+            SystemMetrics.timestamp, SystemMetrics.metric_id, cursor, limit
+        ))
+        return _page(metrics, next_cursor, response, paged)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error fetching system metrics: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 # Dashboard endpoints
 @app.get("/dashboard/summary")
-async def get_dashboard_summary(db: Session = Depends(get_db)):
+async def get_dashboard_summary():
     try:
-        # Get stream counts
-        total_streams = db.query(VideoStream).count()
-        active_streams = db.query(VideoStream).filter(VideoStream.is_active == True).count()
-        
-        # Get recent events count
-        recent_events = db.query(VideoEvent).filter(
-            VideoEvent.event_time >= datetime.utcnow() - timedelta(hours=24)
-        ).count()
-        
-        # Get recent analytics
-        recent_analytics = db.query(VideoAnalytics).filter(
-            VideoAnalytics.timestamp >= datetime.utcnow() - timedelta(hours=1)
-        ).count()
-        
+        # Served from counters kept current as rows are written, no queries
         return {
-            "total_streams": total_streams,
-            "active_streams": active_streams,
-            "recent_events_24h": recent_events,
-            "recent_analytics_1h": recent_analytics,
+            **stream_manager.dashboard.get_summary(),
             "timestamp": datetime.utcnow()
         }
     except Exception as e:
         logger.error(f"Error fetching dashboard summary: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# Push updates
+@app.get("/api/updates")
+async def push_updates(topics: Optional[str] = None):
+    """Server-sent events for stream state, new events, analytics ticks, metrics and the dashboard summary"""
+    requested = [t.strip() for t in topics.split(',') if t.strip()] if topics else list(PUSH_TOPICS)
+    unknown = [t for t in requested if t not in PUSH_TOPICS]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown topics {', '.join(unknown)}, expected any of: {', '.join(PUSH_TOPICS)}"
+        )
+    
+    return StreamingResponse(
+        stream_manager.push_hub.subscribe(requested),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 # Video streaming endpoints
-def generate_video_stream(stream_url: str, stream_type: str):
-    """Generate video frames for streaming"""
+def _open_capture(stream_url: str, stream_type: str):
+    # For webcam, convert string to int if it's a number
+    if stream_type == 'webcam' and stream_url.isdigit():
+        return cv2.VideoCapture(int(stream_url))
+    return cv2.VideoCapture(stream_url)
+
+def _read_encoded(cap, profile: MjpegProfile, encode: bool):
+    """Read the next frame and, if ``encode``, JPEG-encode it; (ok, jpeg bytes or None)"""
+    ret, frame = cap.read()
+    if not ret:
+        return False, None
+    return True, encode_frame(frame, profile) if encode else None
+
+async def generate_video_stream(stream_url: str, stream_type: str, profile: MjpegProfile):
+    """Generate video frames for streaming a source no stream is decoding"""
     cap = None
     try:
-        if stream_type == 'webcam':
-            # For webcam, convert string to int if it's a number
-            if stream_url.isdigit():
-                cap = cv2.VideoCapture(int(stream_url))
-            else:
-                cap = cv2.VideoCapture(stream_url)
-        else:
-            cap = cv2.VideoCapture(stream_url)
-        
+        cap = await anyio.to_thread.run_sync(_open_capture, stream_url, stream_type)
         if not cap.isOpened():
             logger.error(f"Failed to open video stream: {stream_url}")
             return
         
+        # Files decode as fast as they are read, so pace them at their own
+        # rate; live sources block in read() until the next frame arrives
+        source_fps = cap.get(cv2.CAP_PROP_FPS)
+        paced = cap.get(cv2.CAP_PROP_FRAME_COUNT) > 0 and 0 < source_fps <= 120
+        frame_interval = 1.0 / source_fps if paced else 0
+        
+        next_due = 0.0
         while True:
-            ret, frame = cap.read()
+            started = time.time()
+            # Frames beyond the profile's rate are read but not encoded or sent
+            due = started >= next_due
+            ret, frame_bytes = await anyio.to_thread.run_sync(_read_encoded, cap, profile, due)
             if not ret:
                 break
+            if frame_bytes is not None:
+                next_due = started + 0.9 / profile.fps
+                yield multipart_frame(frame_bytes)
             
-            # Encode frame as JPEG
-            ret, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 50])
-            if not ret:
-                continue
-            
-            # Convert to bytes
-            frame_bytes = buffer.tobytes()
-            
-            # Create multipart response
-            yield (b'--frame\r\n'
-                   b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
-            
-            # Small delay to control frame rate
-            time.sleep(0.033)  # ~30 FPS
+            remaining = frame_interval - (time.time() - started)
+            if remaining > 0:
+                await asyncio.sleep(remaining)
     
     except Exception as e:
         logger.error(f"Error in video stream generation: {e}")
@@ -430,27 +596,46 @@ def generate_video_stream(stream_url: str, stream_type: str):
             cap.release()
 
 @app.get("/api/streams/{stream_id}/video")
-async def stream_video(stream_id: int, db: Session = Depends(get_db)):
-    """Stream video from a specific stream"""
+async def stream_video(
+    stream_id: int,
+    w: Optional[int] = Query(None, ge=1),
+    fps: Optional[float] = Query(None, gt=0),
+    quality: Optional[int] = Query(None, ge=1, le=100),
+    profile: Optional[str] = None
+):
+    """Stream video from a specific stream, in the smallest profile meeting w, fps and quality"""
     try:
         # Get stream info from database
-        stream = db.query(VideoStream).filter(VideoStream.stream_id == stream_id).first()
+        stream = await run_in_db(_get_stream_row, stream_id)
         if not stream:
             raise HTTPException(status_code=404, detail="Stream not found")
         
-        # For HTTP streams, we can redirect directly
-        if stream.stream_type == 'http' and stream.stream_url.startswith('http'):
-            # For HTTP video files, we can serve them directly
-            return StreamingResponse(
-                generate_video_stream(stream.stream_url, stream.stream_type),
-                media_type="multipart/x-mixed-replace; boundary=frame"
-            )
+        if profile:
+            selected = get_profile(profile)
+            if selected is None:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Unknown profile {profile}, expected one of: {', '.join(p.name for p in MJPEG_PROFILES)}"
+                )
         else:
-            # For other stream types, use OpenCV to process
+            selected = snap_profile(w, fps, quality)
+        headers = {"X-MJPEG-Profile": selected.name}
+        
+        # Running streams are already being decoded by the stream manager, so
+        # viewers share those frames instead of opening their own capture
+        if stream_manager.active_streams.get(stream_id, {}).get('running', False):
             return StreamingResponse(
-                generate_video_stream(stream.stream_url, stream.stream_type),
-                media_type="multipart/x-mixed-replace; boundary=frame"
+                stream_manager.frame_hub.subscribe(stream_id, selected),
+                media_type="multipart/x-mixed-replace; boundary=frame",
+                headers=headers
             )
+        
+        # Otherwise fall back to decoding the source directly
+        return StreamingResponse(
+            generate_video_stream(stream.stream_url, stream.stream_type, selected),
+            media_type="multipart/x-mixed-replace; boundary=frame",
+            headers=headers
+        )
     
     except HTTPException:
         raise
@@ -459,49 +644,70 @@ async def stream_video(stream_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/streams/{stream_id}/hls/playlist.m3u8")
-async def get_hls_playlist(stream_id: int, db: Session = Depends(get_db)):
-    """Get HLS playlist for RTSP streams (placeholder)"""
+async def get_hls_playlist(stream_id: int):
+    """Live HLS playlist of a running stream, encoded once however many clients watch"""
     try:
-        # Get stream info from database
-        stream = db.query(VideoStream).filter(VideoStream.stream_id == stream_id).first()
+        stream = await run_in_db(_get_stream_row, stream_id)
         if not stream:
             raise HTTPException(status_code=404, detail="Stream not found")
-        
-        # This is a placeholder - in production, you'd use FFmpeg to convert RTSP to HLS
-        hls_playlist = f"""#EXTM3U
-#EXT-X-VERSION:3
-#EXT-X-TARGETDURATION:10
-#EXT-X-MEDIA-SEQUENCE:0
-#EXTINF:10.0,
-/api/streams/{stream_id}/video
-#EXT-X-ENDLIST"""
-        
-        return StreamingResponse(
-            io.StringIO(hls_playlist),
-            media_type="application/vnd.apple.mpegurl"
+        if not stream_manager.hls.available:
+            # Neither ffmpeg nor an OpenCV encoder whose segments browsers can play
+            raise HTTPException(status_code=503, detail="Live HLS is disabled: no usable encoder was found")
+        if not stream_manager.active_streams.get(stream_id, {}).get('running', False):
+            raise HTTPException(status_code=409, detail="Stream is not running")
+
+        playlist_path = await stream_manager.run_control(stream_manager.hls.touch, stream_id)
+        # A new segmenter lists its first segment after about one segment length
+        deadline = time.time() + HLS_SEGMENT_SECONDS * 2 + 3
+        while not os.path.exists(playlist_path):
+            if time.time() > deadline:
+                raise HTTPException(status_code=503, detail="Playlist not ready yet",
+                                    headers={"Retry-After": str(max(1, round(HLS_SEGMENT_SECONDS)))})
+            await asyncio.sleep(0.25)
+
+        with open(playlist_path) as f:
+            playlist = f.read()
+        return Response(
+            content=playlist,
+            media_type="application/vnd.apple.mpegurl",
+            headers={"Cache-Control": "no-cache"}
         )
-    
+
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"Error generating HLS playlist for stream {stream_id}: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/streams/{stream_id}/hls/{segment}")
+async def get_hls_segment(stream_id: int, segment: str, request: Request):
+    """One HLS segment; names are never reused, so segments are cached as immutable"""
+    segment_path = stream_manager.hls.segment_path(stream_id, segment)
+    if not segment_path:
+        raise HTTPException(status_code=404, detail="Segment not found")
+    return await media_file_response(request, segment_path, stream_manager.hls.media_type(segment))
+
+async def _media_response(request: Request, file_path: str, width: Optional[int]):
+    if width:
+        try:
+            thumbnail_path = await stream_manager.thumbnails.fetch(file_path, snap_width(width))
+        except FileNotFoundError:
+            raise HTTPException(status_code=404, detail="File not found")
+        # Sources no wider than the thumbnail are served as they are
+        if thumbnail_path:
+            return await media_file_response(request, thumbnail_path)
+    return await media_file_response(request, file_path)
+
 @app.get("/api/frames/{frame_path:path}")
-async def serve_frame(frame_path: str):
-    """Serve event frame images"""
+async def serve_frame(
+    frame_path: str,
+    request: Request,
+    w: Optional[int] = Query(None, ge=16, le=4096)
+):
+    """Serve event frame images, or a thumbnail at least ``w`` pixels wide"""
     try:
-        file_path = os.path.join(frame_path)
-        if not os.path.exists(file_path):
-            raise HTTPException(status_code=404, detail="Frame not found")
-        
-        with open(file_path, "rb") as f:
-            content = f.read()
-            
-        return StreamingResponse(
-            io.BytesIO(content),
-            media_type="image/jpeg"
-        )
+        file_path = resolve_media_path(frame_path, FRAMES_DIR)
+        return await _media_response(request, file_path, w)
     
     except HTTPException:
         raise
@@ -510,20 +716,15 @@ async def serve_frame(frame_path: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/clips/{clip_path:path}")
-async def serve_clip(clip_path: str):
-    """Serve object clip images"""
+async def serve_clip(
+    clip_path: str,
+    request: Request,
+    w: Optional[int] = Query(None, ge=16, le=4096)
+):
+    """Serve object clip images, or a thumbnail at least ``w`` pixels wide"""
     try:
-        file_path = os.path.join(clip_path)
-        if not os.path.exists(file_path):
-            raise HTTPException(status_code=404, detail="Clip not found")
-        
-        with open(file_path, "rb") as f:
-            content = f.read()
-            
-        return StreamingResponse(
-            io.BytesIO(content),
-            media_type="image/jpeg"
-        )
+        file_path = resolve_media_path(clip_path, CLIPS_DIR)
+        return await _media_response(request, file_path, w)
     
     except HTTPException:
         raise
@@ -531,5 +732,21 @@ async def serve_clip(clip_path: str):
         logger.error(f"Error serving clip {clip_path}: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/recordings/{video_path:path}")
+async def serve_recording(video_path: str, request: Request):
+    """Serve pre/post-event video clips; Range requests let players seek"""
+    try:
+        file_path = resolve_media_path(video_path, RECORDINGS_DIR)
+        media_type = mimetypes.guess_type(file_path)[0] or "application/octet-stream"
+        return await media_file_response(request, file_path, media_type)
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error serving recording {video_path}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    # Long-lived MJPEG and push connections never finish on their own; cut them
+    # off after a few seconds so shutdown can proceed
+    uvicorn.run(app, host="0.0.0.0", port=8000, timeout_graceful_shutdown=5)
\ No newline at end of file
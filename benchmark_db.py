@@ -0,0 +1,142 @@
+"""Compare API read latency while streams are writing, per engine profile.
+
+Runs N writer threads that insert analytics rows in batches (as the
+write-behind queue does) and a reader thread issuing the queries behind
+the analytics, events and dashboard endpoints. Each profile runs against a
+fresh SQLite file:
+
+  legacy  one connection shared by every thread (StaticPool)
+  wal     the current engine profile from src.database (WAL, pooled connections)
+
+Usage: python benchmark_db.py [--streams 8] [--duration 10] [--batch 50]
+"""
+import argparse
+import logging
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import create_engine, desc, func, insert
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from src.database import Base, build_engine
+from src.models import VideoAnalytics, VideoEvent, VideoStream
+
+
+def legacy_engine(url):
+    return create_engine(url, poolclass=StaticPool, connect_args={"check_same_thread": False})
+
+
+def _close(db, stats):
+    try:
+        db.close()
+    except Exception:
+        # A shared connection can be left unusable by another thread
+        stats['close_errors'] += 1
+
+
+def writer(Session, stream_id, stop, batch, stats):
+    while not stop.is_set():
+        rows = [{
+            'stream_id': stream_id,
+            'timestamp': datetime.utcnow(),
+            'fps': 25.0,
+            'frame_count': i,
+            'motion_detected': random.random() < 0.2,
+            'object_count': random.randint(0, 3),
+            'quality_score': random.random(),
+            'processing_time_ms': random.uniform(10, 80)
+        } for i in range(batch)]
+        db = Session()
+        try:
+            db.execute(insert(VideoAnalytics), rows)
+            if random.random() < 0.1:
+                db.add(VideoEvent(stream_id=stream_id, event_type="motion_detected", confidence=0.9))
+            db.commit()
+            stats['rows'] += batch
+        except Exception:
+            stats['write_errors'] += 1
+        finally:
+            _close(db, stats)
+        time.sleep(0.05)
+
+
+def reader(Session, streams, stop, latencies, stats):
+    while not stop.is_set():
+        stream_id = random.randint(1, streams)
+        started = time.perf_counter()
+        db = Session()
+        try:
+            db.query(VideoAnalytics).filter(VideoAnalytics.stream_id == stream_id)\
+                .order_by(desc(VideoAnalytics.timestamp)).limit(100).all()
+            db.query(VideoEvent).order_by(desc(VideoEvent.event_time)).limit(50).all()
+            db.query(func.count(VideoEvent.event_id)).scalar()
+            latencies.append((time.perf_counter() - started) * 1000)
+        except Exception:
+            stats['read_errors'] += 1
+        finally:
+            _close(db, stats)
+
+
+def run_profile(name, make_engine, streams, duration, batch):
+    path = os.path.join(tempfile.mkdtemp(prefix="dbbench-"), "bench.db")
+    engine = make_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    db = Session()
+    for stream_id in range(1, streams + 1):
+        db.add(VideoStream(stream_id=stream_id, stream_name=f"bench {stream_id}", stream_url="bench"))
+    db.commit()
+    db.close()
+
+    stop = threading.Event()
+    latencies = []
+    stats = {'rows': 0, 'write_errors': 0, 'read_errors': 0, 'close_errors': 0}
+    threads = [threading.Thread(target=writer, args=(Session, sid, stop, batch, stats), daemon=True)
+               for sid in range(1, streams + 1)]
+    threads.append(threading.Thread(target=reader, args=(Session, streams, stop, latencies, stats), daemon=True))
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join(timeout=5)
+    # Threads wedged on a shared connection never return; count them and move on
+    hung = len([thread for thread in threads if thread.is_alive()])
+    if not hung:
+        engine.dispose()
+
+    if latencies:
+        ordered = sorted(latencies)
+        p50 = statistics.median(ordered)
+        p95 = ordered[int(len(ordered) * 0.95) - 1]
+        p99 = ordered[int(len(ordered) * 0.99) - 1]
+    else:
+        p50 = p95 = p99 = float('nan')
+    print(f"{name:8} reads={len(latencies):6d} p50={p50:7.2f}ms p95={p95:7.2f}ms p99={p99:7.2f}ms "
+          f"rows/s={stats['rows'] / duration:8.0f} write_errors={stats['write_errors']} "
+          f"read_errors={stats['read_errors']} close_errors={stats['close_errors']} hung_threads={hung}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--streams", type=int, default=8, help="concurrent writer threads")
+    parser.add_argument("--duration", type=float, default=10, help="seconds per profile")
+    parser.add_argument("--batch", type=int, default=50, help="rows per write transaction")
+    args = parser.parse_args()
+    # The legacy profile's shared connection fails noisily; errors are counted instead
+    logging.getLogger("sqlalchemy.pool").setLevel(logging.CRITICAL)
+
+    print(f"{args.streams} writers, {args.batch} rows per batch, {args.duration:.0f}s per profile")
+    run_profile("legacy", legacy_engine, args.streams, args.duration, args.batch)
+    run_profile("wal", build_engine, args.streams, args.duration, args.batch)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,15 @@
+import os
+
+import pytest
+
+# Unit tests run against a throwaway in-memory database, never video_monitoring.db
+os.environ["DATABASE_URL"] = "sqlite://"
+
+
+@pytest.fixture
+def database():
+    """Fresh tables in the in-memory database for one test"""
+    from src.database import Base, engine, init_db
+    init_db()
+    yield
+    Base.metadata.drop_all(bind=engine)
@@ -1,6 +1,7 @@
 import React from 'react';
 import { Routes, Route } from 'react-router-dom';
 import Layout from './components/Layout';
+import { LiveUpdatesProvider } from './hooks/useLiveUpdates';
 import Dashboard from './pages/Dashboard';
 import Streams from './pages/Streams';
 import Events from './pages/Events';
@@ -9,15 +10,17 @@ import SystemMonitor from './pages/SystemMonitor';
 
 function App() {
   return (
-    <Layout>
-      <Routes>
-        <Route path="/" element={<Dashboard />} />
-        <Route path="/streams" element={<Streams />} />
-        <Route path="/events" element={<Events />} />
-        <Route path="/analytics" element={<Analytics />} />
-        <Route path="/system" element={<SystemMonitor />} />
-      </Routes>
-    </Layout>
+    <LiveUpdatesProvider>
+      <Layout>
+        <Routes>
+          <Route path="/" element={<Dashboard />} />
+          <Route path="/streams" element={<Streams />} />
+          <Route path="/events" element={<Events />} />
+          <Route path="/analytics" element={<Analytics />} />
+          <Route path="/system" element={<SystemMonitor />} />
+        </Routes>
+      </Layout>
+    </LiveUpdatesProvider>
   );
 }
 
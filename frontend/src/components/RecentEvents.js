@@ -1,6 +1,7 @@
 import React from 'react';
 import { useQuery } from 'react-query';
 import { apiEndpoints } from '../utils/api';
+import { useLiveRefetchInterval } from '../hooks/useLiveUpdates';
 
 const RecentEvents = () => {
   const { data: streams } = useQuery('streams', async () => {
@@ -8,6 +9,8 @@ const RecentEvents = () => {
     return response.data;
   });
   
+  const eventsRefetchInterval = useLiveRefetchInterval(30000);
+  
   // Get recent events from all streams
   const { data: allEvents, isLoading } = useQuery(
     ['recentEvents'],
@@ -30,7 +33,7 @@ const RecentEvents = () => {
     },
     {
       enabled: !!streams,
-      refetchInterval: 30000,
+      refetchInterval: eventsRefetchInterval,
     }
   );
 
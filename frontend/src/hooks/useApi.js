@@ -1,5 +1,6 @@
 import { useQuery, useMutation, useQueryClient } from 'react-query';
 import { apiEndpoints } from '../utils/api';
+import { useLiveRefetchInterval } from './useLiveUpdates';
 
 // Custom hook for API queries
 export const useApiQuery = (key, queryFn, options = {}) => {
@@ -21,23 +22,28 @@ export const useSystemStatus = () => {
 };
 
 export const useSystemMetrics = (hours = 24) => {
-  return useApiQuery(['systemMetrics', hours], () => apiEndpoints.systemMetrics(hours));
+  const refetchInterval = useLiveRefetchInterval(60000);
+  return useApiQuery(['systemMetrics', hours], () => apiEndpoints.systemMetrics(hours), {
+    refetchInterval,
+  });
 };
 
 export const useDashboardSummary = () => {
+  const refetchInterval = useLiveRefetchInterval(30000);
   return useApiQuery('dashboardSummary', apiEndpoints.dashboardSummary, {
-    refetchInterval: 30000,
+    refetchInterval,
   });
 };
 
 // Stream hooks
 export const useStreams = () => {
+  const refetchInterval = useLiveRefetchInterval(30000);
   return useQuery('streams', async () => {
     const response = await apiEndpoints.getStreams();
     return response.data;
   }, {
     staleTime: 30000,
-    refetchInterval: 30000,
+    refetchInterval,
   });
 };
 
@@ -57,12 +63,24 @@ export const useStreamAnalytics = (streamId, hours = 24) => {
   );
 };
 
+export const useStreamAnalyticsBuckets = (streamId, hours = 24, resolution = null) => {
+  return useApiQuery(
+    ['streamAnalyticsBuckets', streamId, hours, resolution],
+    () => apiEndpoints.getStreamAnalyticsBuckets(streamId, hours, resolution),
+    {
+      enabled: !!streamId,
+    }
+  );
+};
+
 export const useStreamEvents = (streamId, eventType = null, hours = 24) => {
+  const refetchInterval = useLiveRefetchInterval(60000);
   return useApiQuery(
     ['streamEvents', streamId, eventType, hours],
     () => apiEndpoints.getStreamEvents(streamId, eventType, hours),
     {
       enabled: !!streamId,
+      refetchInterval,
     }
   );
 };
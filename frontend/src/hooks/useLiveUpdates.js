@@ -0,0 +1,119 @@
+import React, { createContext, useContext, useEffect, useState } from 'react';
+import { useQueryClient } from 'react-query';
+import { API_BASE_URL } from '../utils/api';
+
+const LiveUpdatesContext = createContext({ connected: false });
+
+const TOPICS = ['streams', 'events', 'analytics', 'metrics', 'summary'];
+
+// Length of the dashboard's recent events list
+const RECENT_EVENTS = 10;
+// Analytics charts show rollup buckets, which pushed rows cannot be merged
+// into; a stream's charts are refetched at most this often instead
+const ANALYTICS_REFRESH_MS = 10000;
+
+const byNewest = (a, b) => new Date(b.event_time) - new Date(a.event_time);
+
+// Adds pushed events to a cached list, newest first, skipping ones it already holds
+const mergeEvents = (cached, events, limit) => {
+  if (!cached || events.length === 0) return cached;
+  const known = new Set(cached.map((event) => event.event_id));
+  const added = events.filter((event) => !known.has(event.event_id));
+  if (added.length === 0) return cached;
+  const merged = [...added, ...cached].sort(byNewest);
+  return limit ? merged.slice(0, limit) : merged;
+};
+
+// Whether an event belongs in a list filtered by stream ('all' or an id) and type
+const matches = (event, streamId, eventType) =>
+  (streamId === undefined || streamId === 'all' || Number(streamId) === event.stream_id) &&
+  (!eventType || eventType === 'all' || eventType === event.event_type);
+
+// Keeps the react-query cache current from the server push channel, so
+// polling is only needed while the channel is down
+export const LiveUpdatesProvider = ({ children }) => {
+  const queryClient = useQueryClient();
+  const [connected, setConnected] = useState(false);
+
+  useEffect(() => {
+    if (typeof EventSource === 'undefined') return undefined;
+
+    const source = new EventSource(`${API_BASE_URL}/api/updates?topics=${TOPICS.join(',')}`);
+    let eventsTimer = null;
+    let pendingEvents = [];
+    const analyticsTimers = {};
+
+    const mergePendingEvents = () => {
+      eventsTimer = null;
+      const names = {};
+      (queryClient.getQueryData('streams') || []).forEach((stream) => {
+        names[stream.stream_id] = stream.stream_name;
+      });
+      const events = pendingEvents.map((event) => ({ ...event, stream_name: names[event.stream_id] }));
+      pendingEvents = [];
+
+      // Keys: ['recentEvents'], ['allEvents', stream, type, hours] and
+      // ['streamEvents', stream id, type, hours]; lists not loaded yet are left alone
+      [['recentEvents', RECENT_EVENTS], ['allEvents'], ['streamEvents']].forEach(([name, limit]) => {
+        queryClient.getQueryCache().findAll(name).forEach(({ queryKey, state }) => {
+          if (!state.data) return;
+          const [, streamId, eventType] = queryKey;
+          const wanted = events.filter((event) => matches(event, streamId, eventType));
+          queryClient.setQueryData(queryKey, mergeEvents(state.data, wanted, limit));
+        });
+      });
+    };
+
+    const queueEvent = (message) => {
+      pendingEvents.push(JSON.parse(message.data));
+      // Events arrive in bursts; merge them into the lists once per burst
+      if (!eventsTimer) eventsTimer = setTimeout(mergePendingEvents, 500);
+    };
+
+    const refreshAnalytics = (message) => {
+      const { stream_id: streamId } = JSON.parse(message.data);
+      if (analyticsTimers[streamId]) return;
+      analyticsTimers[streamId] = setTimeout(() => {
+        delete analyticsTimers[streamId];
+        queryClient.invalidateQueries(['streamAnalyticsBuckets', streamId]);
+        queryClient.invalidateQueries(['streamAnalytics', streamId]);
+      }, ANALYTICS_REFRESH_MS);
+    };
+
+    source.addEventListener('hello', () => setConnected(true));
+    source.addEventListener('streams', () => {
+      queryClient.invalidateQueries('streams');
+      queryClient.invalidateQueries('systemStatus');
+    });
+    source.addEventListener('events', queueEvent);
+    source.addEventListener('analytics', refreshAnalytics);
+    source.addEventListener('metrics', () => queryClient.invalidateQueries('systemMetrics'));
+    source.addEventListener('summary', (message) => {
+      const summary = JSON.parse(message.data);
+      queryClient.setQueryData('dashboardSummary', (previous) => ({ ...previous, ...summary }));
+    });
+    source.addEventListener('resync', () => queryClient.invalidateQueries());
+    // EventSource reconnects by itself; fall back to polling until it does
+    source.onerror = () => setConnected(false);
+
+    return () => {
+      if (eventsTimer) clearTimeout(eventsTimer);
+      Object.values(analyticsTimers).forEach(clearTimeout);
+      source.close();
+    };
+  }, [queryClient]);
+
+  return (
+    <LiveUpdatesContext.Provider value={{ connected }}>
+      {children}
+    </LiveUpdatesContext.Provider>
+  );
+};
+
+export const useLiveUpdates = () => useContext(LiveUpdatesContext);
+
+// Polling interval to use for data the push channel keeps current
+export const useLiveRefetchInterval = (interval) => {
+  const { connected } = useLiveUpdates();
+  return connected ? false : interval;
+};
@@ -1,5 +1,5 @@
 import React, { useState } from 'react';
-import { useStreams, useStreamAnalytics } from '../hooks/useApi';
+import { useStreams, useStreamAnalyticsBuckets } from '../hooks/useApi';
 import { LineChart, Line, XAxis, YAxis, CartesianGrid, Tooltip, Legend, ResponsiveContainer, BarChart, Bar } from 'recharts';
 
 const Analytics = () => {
@@ -7,7 +7,7 @@ const Analytics = () => {
   const [timeRange, setTimeRange] = useState(24);
 
   const { data: streams, isLoading: streamsLoading } = useStreams();
-  const { data: analytics, isLoading: analyticsLoading, error: analyticsError } = useStreamAnalytics(
+  const { data: analytics, isLoading: analyticsLoading, error: analyticsError } = useStreamAnalyticsBuckets(
     selectedStream ? parseInt(selectedStream) : null,
     timeRange
   );
@@ -22,25 +22,32 @@ const Analytics = () => {
   const processAnalyticsData = (data) => {
     if (!data || data.length === 0) return [];
     
+    // Buckets are hourly beyond 6 hours, so include the date
+    const formatTime = (date) => timeRange > 6 ? date.toLocaleString() : date.toLocaleTimeString();
+    
     return data.map(item => ({
-      time: new Date(item.timestamp).toLocaleTimeString(),
-      fps: item.fps || 0,
-      frameCount: item.frame_count || 0,
-      motionDetected: item.motion_detected ? 1 : 0,
+      time: formatTime(new Date(item.bucket_start)),
+      fps: item.avg_fps || 0,
+      frameCount: item.samples || 0,
+      motionDetected: item.motion_frames || 0,
       objectCount: item.object_count || 0,
-      qualityScore: item.quality_score || 0,
-      processingTime: item.processing_time_ms || 0
+      qualityScore: item.avg_quality || 0,
+      processingTime: item.avg_processing_ms || 0,
+      processingP95: item.p95_processing_ms || 0
     }));
   };
 
   const getStreamStats = (data) => {
     if (!data || data.length === 0) return null;
     
-    const totalFrames = data.reduce((sum, item) => sum + (item.frame_count || 0), 0);
-    const avgFps = data.reduce((sum, item) => sum + (item.fps || 0), 0) / data.length;
-    const avgQuality = data.reduce((sum, item) => sum + (item.quality_score || 0), 0) / data.length;
-    const avgProcessingTime = data.reduce((sum, item) => sum + (item.processing_time_ms || 0), 0) / data.length;
-    const motionEvents = data.filter(item => item.motion_detected).length;
+    // Weight bucket averages by the number of samples behind them
+    const totalFrames = data.reduce((sum, item) => sum + (item.samples || 0), 0);
+    if (totalFrames === 0) return null;
+    const weighted = (key) => data.reduce((sum, item) => sum + (item[key] || 0) * (item.samples || 0), 0) / totalFrames;
+    const avgFps = weighted('avg_fps');
+    const avgQuality = weighted('avg_quality');
+    const avgProcessingTime = weighted('avg_processing_ms');
+    const motionEvents = data.reduce((sum, item) => sum + (item.motion_frames || 0), 0);
     const totalObjects = data.reduce((sum, item) => sum + (item.object_count || 0), 0);
     
     return {
@@ -126,6 +133,7 @@ const Analytics = () => {
               <option value={6}>Last 6 Hours</option>
               <option value={24}>Last 24 Hours</option>
               <option value={168}>Last 7 Days</option>
+              <option value={720}>Last 30 Days</option>
             </select>
           </div>
         </div>
@@ -155,7 +163,7 @@ const Analytics = () => {
           <div className="stats-grid">
             <div className="stat-card">
               <div className="stat-number">{stats.totalFrames}</div>
-              <div className="stat-label">Total Frames</div>
+              <div className="stat-label">Analyzed Frames</div>
             </div>
             <div className="stat-card">
               <div className="stat-number">{stats.avgFps}</div>
@@ -171,7 +179,7 @@ const Analytics = () => {
             </div>
             <div className="stat-card">
               <div className="stat-number">{stats.motionEvents}</div>
-              <div className="stat-label">Motion Events</div>
+              <div className="stat-label">Motion Frames</div>
             </div>
             <div className="stat-card">
               <div className="stat-number">{stats.totalObjects}</div>
@@ -210,6 +218,13 @@ const Analytics = () => {
                     name="Processing Time (ms)" 
                     strokeWidth={2}
                   />
+                  <Line 
+                    type="monotone" 
+                    dataKey="processingP95" 
+                    stroke="#dc3545" 
+                    name="Processing Time p95 (ms)" 
+                    strokeWidth={2}
+                  />
                 </LineChart>
               </ResponsiveContainer>
             </div>
@@ -223,7 +238,7 @@ const Analytics = () => {
                   <YAxis />
                   <Tooltip />
                   <Legend />
-                  <Bar dataKey="motionDetected" fill="#ffc107" name="Motion Detected" />
+                  <Bar dataKey="motionDetected" fill="#ffc107" name="Motion Frames" />
                   <Bar dataKey="objectCount" fill="#17a2b8" name="Objects Detected" />
                 </BarChart>
               </ResponsiveContainer>
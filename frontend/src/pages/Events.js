@@ -2,6 +2,7 @@ import React, { useState } from 'react';
 import { useStreams } from '../hooks/useApi';
 import { useQuery } from 'react-query';
 import { apiEndpoints } from '../utils/api';
+import { useLiveRefetchInterval } from '../hooks/useLiveUpdates';
 
 const Events = () => {
   const [selectedStream, setSelectedStream] = useState('all');
@@ -9,6 +10,7 @@ const Events = () => {
   const [timeRange, setTimeRange] = useState(24);
 
   const { data: streams, isLoading: streamsLoading } = useStreams();
+  const eventsRefetchInterval = useLiveRefetchInterval(30000);
 
   const { data: events, isLoading: eventsLoading, error: eventsError } = useQuery(
     ['allEvents', selectedStream, selectedEventType, timeRange],
@@ -39,7 +41,7 @@ const Events = () => {
     },
     {
       enabled: !!streams,
-      refetchInterval: 30000,
+      refetchInterval: eventsRefetchInterval,
     }
   );
 
@@ -166,7 +168,7 @@ const Events = () => {
                   {event.clip_path ? (
                     <div className="event-thumbnail">
                       <img 
-                        src={`/api/clips/${event.clip_path}`} 
+                        src={`/api/clips/${event.clip_path}?w=320`} 
                         alt="Detected object"
                         onError={(e) => {
                           e.target.style.display = 'none';
@@ -181,7 +183,7 @@ const Events = () => {
                   ) : event.frame_path && (
                     <div className="event-thumbnail">
                       <img 
-                        src={`/api/frames/${event.frame_path}`} 
+                        src={`/api/frames/${event.frame_path}?w=320`} 
                         alt="Event frame"
                         onError={(e) => {
                           e.target.style.display = 'none';
@@ -217,6 +219,23 @@ const Events = () => {
                       ({event.bounding_box.w}×{event.bounding_box.h})
                     </div>
                   )}
+                  
+                  {event.event_metadata?.duration_s !== undefined && (
+                    <div className="event-location">
+                      ⏱ {event.event_metadata.duration_s}s
+                      {event.event_metadata.track_status === 'active' ? ' (ongoing)' : ''}
+                    </div>
+                  )}
+                  
+                  {event.video_path && (
+                    <video
+                      className="event-video"
+                      src={`/api/recordings/${event.video_path}`}
+                      controls
+                      muted
+                      preload="none"
+                    />
+                  )}
                 </div>
               </div>
             ))}
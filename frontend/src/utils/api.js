@@ -1,6 +1,6 @@
 import axios from 'axios';
 
-const API_BASE_URL = process.env.REACT_APP_API_URL || 'http://localhost:8000';
+export const API_BASE_URL = process.env.REACT_APP_API_URL || 'http://localhost:8000';
 
 const api = axios.create({
   baseURL: API_BASE_URL,
@@ -32,12 +32,21 @@ api.interceptors.response.use(
   }
 );
 
+// Lists are requested as {items, next_cursor} pages; callers get the items
+// as data, and the cursor of the next page as nextCursor
+const getPage = (url) =>
+  api.get(url).then((response) => ({
+    ...response,
+    data: response.data.items,
+    nextCursor: response.data.next_cursor,
+  }));
+
 // API endpoints
 export const apiEndpoints = {
   // System endpoints
   health: () => api.get('/health'),
   systemStatus: () => api.get('/system/status'),
-  systemMetrics: (hours = 24) => api.get(`/system/metrics?hours=${hours}`),
+  systemMetrics: (hours = 24) => getPage(`/system/metrics?hours=${hours}&paged=true`),
   dashboardSummary: () => api.get('/dashboard/summary'),
 
   // Stream endpoints
@@ -50,11 +59,16 @@ export const apiEndpoints = {
 
   // Analytics endpoints
   getStreamAnalytics: (streamId, hours = 24) => 
-    api.get(`/streams/${streamId}/analytics?hours=${hours}`),
-  getStreamEvents: (streamId, eventType = null, hours = 24) => {
+    getPage(`/streams/${streamId}/analytics?hours=${hours}&paged=true`),
+  getStreamAnalyticsBuckets: (streamId, hours = 24, resolution = null) => {
     const params = new URLSearchParams({ hours: hours.toString() });
+    if (resolution) params.append('resolution', resolution);
+    return api.get(`/streams/${streamId}/analytics/buckets?${params}`);
+  },
+  getStreamEvents: (streamId, eventType = null, hours = 24) => {
+    const params = new URLSearchParams({ hours: hours.toString(), paged: 'true' });
     if (eventType) params.append('event_type', eventType);
-    return api.get(`/streams/${streamId}/events?${params}`);
+    return getPage(`/streams/${streamId}/events?${params}`);
   },
 };
 
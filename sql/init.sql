@@ -8,6 +8,7 @@ CREATE TABLE video_streams (
     stream_url VARCHAR(500) NOT NULL,
     stream_type VARCHAR(50) NOT NULL DEFAULT 'rtsp',
     is_active BOOLEAN DEFAULT TRUE,
+    retention_days FLOAT,
     created_at TIMESTAMP DEFAULT NOW(),
     updated_at TIMESTAMP DEFAULT NOW()
 );
@@ -22,6 +23,9 @@ CREATE TABLE video_events (
     bounding_box JSONB,
     event_metadata JSONB,
     frame_path VARCHAR(500),
+    clip_path VARCHAR(500),
+    video_path VARCHAR(500),
+    track_id VARCHAR(64),
     created_at TIMESTAMP DEFAULT NOW()
 );
 
@@ -39,6 +43,8 @@ CREATE TABLE video_analytics (
     object_count INTEGER DEFAULT 0,
     quality_score FLOAT,
     processing_time_ms INTEGER,
+    analysis_fps FLOAT,
+    skip_ratio FLOAT,
     created_at TIMESTAMP DEFAULT NOW()
 );
 
@@ -63,22 +69,42 @@ SELECT create_hypertable('system_metrics', 'timestamp');
 -- Create indexes for better performance
 CREATE INDEX idx_video_events_stream_id ON video_events (stream_id);
 CREATE INDEX idx_video_events_event_type ON video_events (event_type);
+CREATE INDEX idx_video_events_track_id ON video_events (track_id);
+CREATE INDEX ix_video_events_stream_time ON video_events (stream_id, event_time);
 CREATE INDEX idx_video_analytics_stream_id ON video_analytics (stream_id);
+CREATE INDEX ix_video_analytics_stream_time ON video_analytics (stream_id, timestamp);
 CREATE INDEX idx_system_metrics_timestamp ON system_metrics (timestamp);
 
--- Create continuous aggregates for hourly analytics
-CREATE MATERIALIZED VIEW hourly_analytics
-WITH (timescaledb.continuous) AS
-SELECT 
-    stream_id,
-    time_bucket('1 hour', timestamp) AS hour,
-    AVG(fps) AS avg_fps,
-    SUM(frame_count) AS total_frames,
-    COUNT(*) FILTER (WHERE motion_detected = TRUE) AS motion_events,
-    AVG(quality_score) AS avg_quality,
-    AVG(processing_time_ms) AS avg_processing_time
-FROM video_analytics
-GROUP BY stream_id, hour;
+-- Analytics rollups, maintained by the application as analytics are written
+CREATE TABLE analytics_minutely (
+    stream_id INTEGER NOT NULL,
+    bucket_start TIMESTAMP NOT NULL,
+    samples INTEGER NOT NULL DEFAULT 0,
+    fps_sum FLOAT NOT NULL DEFAULT 0,
+    fps_max FLOAT NOT NULL DEFAULT 0,
+    motion_frames INTEGER NOT NULL DEFAULT 0,
+    object_count INTEGER NOT NULL DEFAULT 0,
+    max_objects INTEGER NOT NULL DEFAULT 0,
+    quality_sum FLOAT NOT NULL DEFAULT 0,
+    processing_sum FLOAT NOT NULL DEFAULT 0,
+    processing_histogram JSONB,
+    PRIMARY KEY (stream_id, bucket_start)
+);
+
+CREATE TABLE analytics_hourly (
+    stream_id INTEGER NOT NULL,
+    bucket_start TIMESTAMP NOT NULL,
+    samples INTEGER NOT NULL DEFAULT 0,
+    fps_sum FLOAT NOT NULL DEFAULT 0,
+    fps_max FLOAT NOT NULL DEFAULT 0,
+    motion_frames INTEGER NOT NULL DEFAULT 0,
+    object_count INTEGER NOT NULL DEFAULT 0,
+    max_objects INTEGER NOT NULL DEFAULT 0,
+    quality_sum FLOAT NOT NULL DEFAULT 0,
+    processing_sum FLOAT NOT NULL DEFAULT 0,
+    processing_histogram JSONB,
+    PRIMARY KEY (stream_id, bucket_start)
+);
 
 -- Create retention policies
 SELECT add_retention_policy('video_events', INTERVAL '30 days');
@@ -0,0 +1,168 @@
+import os
+import hashlib
+import threading
+import weakref
+import logging
+from collections import Counter, OrderedDict
+from typing import Callable, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from .image_writer import ImageWriter, store_image
+from .packs import remove_packs, split_pack_entry
+
+logger = logging.getLogger(__name__)
+
+# Recently saved crops remembered for deduplication, per store
+ARTIFACT_CACHE_ENTRIES = int(os.getenv("ARTIFACT_CACHE_ENTRIES", "512"))
+
+
+class ArtifactStore:
+    """Saves each distinct frame or crop of a stream once and shares its path.
+
+    Frames are matched by identity: motion sessions and object tracks keep
+    references to the arrays capture produced, so the same frame reaching
+    both handlers is the same object. The entry lives as long as the array
+    does. Crops are copies, so they are matched by a digest of their pixels
+    instead. Artifacts are only shared within one stream.
+    """
+
+    def __init__(self, image_writer: Optional[ImageWriter] = None, max_entries: int = ARTIFACT_CACHE_ENTRIES):
+        self.image_writer = image_writer
+        self.max_entries = max_entries
+        self._frames: Dict[tuple, tuple] = {}
+        self._crops: OrderedDict = OrderedDict()
+        # Keys of frames that have been freed; weakref callbacks can run in
+        # the middle of any allocation, so they only note the key here
+        self._freed: List[tuple] = []
+        self._lock = threading.Lock()
+        self.saved = 0
+        self.shared = 0
+
+    def save(self, stream_id: int, path: str, image: np.ndarray,
+             on_written: Optional[Callable[[str], None]] = None, by_content: bool = False) -> Optional[str]:
+        """Path of ``image``, writing it to ``path`` unless it was saved before.
+
+        None if the image writer dropped it; it is then forgotten, so no
+        other event is handed its path either.
+        """
+        if by_content:
+            digest = hashlib.blake2b(np.ascontiguousarray(image).data, digest_size=16).hexdigest()
+            key = (stream_id, image.shape, digest)
+        else:
+            key = (stream_id, id(image))
+
+        with self._lock:
+            self._purge_freed()
+            existing = self._lookup(key, image, by_content)
+            if existing:
+                self.shared += 1
+                return existing
+            self._remember(key, image, path, by_content)
+            self.saved += 1
+
+        if self.image_writer:
+            written = self.image_writer.submit(path, image, on_written, stream_id)
+            if written is None:
+                with self._lock:
+                    self._forget(key, by_content)
+                    self.saved -= 1
+            return written
+        store_image(path, image)
+        if on_written:
+            on_written(path)
+        return path
+
+    def _lookup(self, key: tuple, image: np.ndarray, by_content: bool) -> Optional[str]:
+        if by_content:
+            path = self._crops.get(key)
+            if path:
+                self._crops.move_to_end(key)
+            return path
+        entry = self._frames.get(key)
+        # id() values are reused once an array is freed; the weakref tells
+        if entry and entry[0]() is image:
+            return entry[1]
+        return None
+
+    def _remember(self, key: tuple, image: np.ndarray, path: str, by_content: bool):
+        if by_content:
+            self._crops[key] = path
+            while len(self._crops) > self.max_entries:
+                self._crops.popitem(last=False)
+            return
+        self._frames[key] = (weakref.ref(image, lambda _, key=key: self._freed.append(key)), path)
+
+    def _forget(self, key: tuple, by_content: bool):
+        if by_content:
+            self._crops.pop(key, None)
+        else:
+            self._frames.pop(key, None)
+
+    def _purge_freed(self):
+        while self._freed:
+            key = self._freed.pop()
+            entry = self._frames.get(key)
+            if entry and entry[0]() is None:
+                del self._frames[key]
+
+    def release_stream(self, stream_id: int):
+        """Forget a removed stream's artifacts"""
+        with self._lock:
+            self._purge_freed()
+            for key in [k for k in list(self._frames) if k[0] == stream_id]:
+                del self._frames[key]
+            for key in [k for k in self._crops if k[0] == stream_id]:
+                del self._crops[key]
+
+    def get_status(self) -> Dict:
+        with self._lock:
+            self._purge_freed()
+            return {
+                'saved': self.saved,
+                'shared': self.shared,
+                'tracked_frames': len(self._frames),
+                'tracked_crops': len(self._crops)
+            }
+
+
+def event_files(event) -> Dict[str, List[str]]:
+    """Frame, clip and video paths an event row refers to"""
+    frames = [event.frame_path] if event.frame_path else []
+    metadata = event.event_metadata or {}
+    frames += [p for p in metadata.get('frame_paths', []) if p and p not in frames]
+    return {
+        'frames': frames,
+        'clips': [event.clip_path] if event.clip_path else [],
+        'videos': [event.video_path] if event.video_path else []
+    }
+
+
+def remove_event_files(events: Iterable, keep: Iterable[str] = ()) -> Dict[str, int]:
+    """Delete the frames, clips and videos of ``events`` whose rows are being removed.
+
+    Events share artifacts, so references are counted first and every
+    file is removed exactly once; packed clips are removed a pack file at a
+    time. Paths in ``keep`` are still referenced by rows that stay and are
+    left alone, along with any pack holding one of them.
+    """
+    references = {'frames': Counter(), 'clips': Counter(), 'videos': Counter()}
+    for event in events:
+        for kind, paths in event_files(event).items():
+            references[kind].update(paths)
+
+    keep = set(keep)
+    deleted = {'frames': 0, 'clips': 0, 'videos': 0}
+    # Clips in packs go with their whole pack file
+    packed = [path for path in references['clips'] if split_pack_entry(path)]
+    deleted['clips'] += remove_packs(packed, keep)
+    for kind, counts in references.items():
+        for path in counts:
+            if path in keep or split_pack_entry(path) or not os.path.exists(path):
+                continue
+            try:
+                os.remove(path)
+                deleted[kind] += 1
+            except Exception as e:
+                logger.warning(f"Failed to delete {kind[:-1]} file {path}: {e}")
+    return deleted
@@ -0,0 +1,118 @@
+import os
+import threading
+import time
+import logging
+from collections import deque
+from typing import Callable, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+FRAME_BUFFER_SIZE = int(os.getenv("FRAME_BUFFER_SIZE", "3"))
+
+
+class FrameRingBuffer:
+    """Bounded buffer that only ever holds the newest decoded frames"""
+
+    def __init__(self, capacity: int = FRAME_BUFFER_SIZE):
+        self.capacity = max(1, capacity)
+        self._frames = deque(maxlen=self.capacity)
+        self._condition = threading.Condition()
+        self._sequence = 0
+        self._last_read = 0
+        self.captured_frames = 0
+        self.dropped_frames = 0
+
+    def put(self, frame: np.ndarray, captured_at: float):
+        with self._condition:
+            self._sequence += 1
+            self.captured_frames += 1
+            self._frames.append((self._sequence, captured_at, frame))
+            self._condition.notify_all()
+
+    def get_latest(self, timeout: float = 1.0) -> Optional[Tuple[int, float, np.ndarray]]:
+        """Return the newest unread frame, counting any older unread frames as dropped"""
+        with self._condition:
+            has_new = self._condition.wait_for(
+                lambda: self._frames and self._frames[-1][0] > self._last_read,
+                timeout=timeout
+            )
+            if not has_new:
+                return None
+
+            sequence, captured_at, frame = self._frames[-1]
+            self.dropped_frames += sequence - self._last_read - 1
+            self._last_read = sequence
+            return sequence, captured_at, frame
+
+    def clear(self):
+        with self._condition:
+            self._frames.clear()
+
+
+class CaptureThread(threading.Thread):
+    """Continuously reads frames from a VideoProcessor into a FrameRingBuffer"""
+
+    def __init__(self, processor, buffer: FrameRingBuffer,
+                 on_frame: Optional[Callable[[np.ndarray], None]] = None,
+                 scheduler=None,
+                 wants_frames: Optional[Callable[[], bool]] = None):
+        super().__init__(daemon=True)
+        self.processor = processor
+        self.buffer = buffer
+        self.on_frame = on_frame
+        self.scheduler = scheduler
+        self.wants_frames = wants_frames
+        self.running = True
+        self.read_failures = 0
+
+    def run(self):
+        stream_id = self.processor.stream_id
+
+        # File sources return frames as fast as they decode, so pace them at
+        # their nominal rate. Live sources are read as fast as frames arrive:
+        # read() blocks until the next one, and sleeping on top of that would
+        # fall behind a camera whose real rate is above its reported fps.
+        fps = self.processor.fps
+        paced = self.processor.is_file and 0 < fps <= 120
+        frame_interval = 1.0 / fps if paced else 0
+
+        logger.info(f"Capture started for stream {stream_id}")
+        while self.running:
+            started = time.time()
+            try:
+                # Frames the scheduler skips are only grabbed, never decoded,
+                # unless someone downstream (live viewers) needs every frame
+                analyze = self.scheduler is None or self.scheduler.should_decode()
+                if analyze or (self.wants_frames and self.wants_frames()):
+                    ret, frame = self.processor.read_frame()
+                else:
+                    ret, frame = self.processor.grab_frame(), None
+
+                if not ret:
+                    self.read_failures += 1
+                    logger.warning(f"Failed to read frame from stream {stream_id}")
+                    time.sleep(1)
+                    continue
+
+                if frame is not None:
+                    if analyze:
+                        self.buffer.put(frame, time.time())
+                    if self.on_frame:
+                        self.on_frame(frame)
+            except Exception as e:
+                logger.error(f"Error capturing stream {stream_id}: {e}")
+                time.sleep(1)
+                continue
+
+            remaining = frame_interval - (time.time() - started)
+            if remaining > 0:
+                time.sleep(remaining)
+
+        logger.info(f"Capture stopped for stream {stream_id}")
+
+    def stop(self, timeout: float = 5):
+        self.running = False
+        if self.is_alive():
+            self.join(timeout=timeout)
@@ -0,0 +1,173 @@
+import threading
+import time
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import Integer, cast, func
+
+from .database import SessionLocal
+from .models import VideoAnalytics, VideoEvent, VideoStream
+from .partitions import analytics_partitions
+
+logger = logging.getLogger(__name__)
+
+
+def _epoch(timestamp: Optional[datetime]) -> float:
+    """Seconds since the epoch for the naive UTC datetimes stored in the DB"""
+    if timestamp is None:
+        return time.time()
+    return (timestamp - datetime(1970, 1, 1)).total_seconds()
+
+
+class SlidingWindowCounter:
+    """Count of items in the last ``window`` seconds, in ``resolution``-second buckets.
+
+    Buckets live in a fixed ring and a running total is kept alongside it;
+    expired buckets are subtracted lazily when time moves on, so both
+    ``add`` and ``total`` are O(1) amortized. Counts are exact to within one
+    bucket at the trailing edge of the window.
+    """
+
+    def __init__(self, window: float, resolution: float):
+        self.window = window
+        self.resolution = resolution
+        self.size = int(window // resolution)
+        self._buckets = [0] * self.size
+        self._head = int(time.time() // resolution)
+        self._total = 0
+        self._lock = threading.Lock()
+
+    def _advance(self, now: float):
+        current = int(now // self.resolution)
+        if current - self._head >= self.size:
+            self._buckets = [0] * self.size
+            self._total = 0
+        else:
+            for index in range(self._head + 1, current + 1):
+                slot = index % self.size
+                self._total -= self._buckets[slot]
+                self._buckets[slot] = 0
+        self._head = max(self._head, current)
+
+    def add(self, timestamp: Optional[float] = None, count: int = 1):
+        now = time.time()
+        timestamp = now if timestamp is None else timestamp
+        with self._lock:
+            self._advance(now)
+            index = int(timestamp // self.resolution)
+            # Rows older than the window (or from the future) do not count
+            if index <= self._head - self.size or index > self._head:
+                return
+            self._buckets[index % self.size] += count
+            self._total += count
+
+    def total(self) -> int:
+        with self._lock:
+            self._advance(time.time())
+            return self._total
+
+    def clear(self):
+        with self._lock:
+            self._buckets = [0] * self.size
+            self._total = 0
+
+
+class DashboardCounters:
+    """In-memory counters behind /dashboard/summary.
+
+    Seeded from the database once at startup and then kept current by
+    listening to the write-behind queue, so reading them never touches the
+    database.
+    """
+
+    def __init__(self):
+        self.recent_events = SlidingWindowCounter(24 * 3600, 60)
+        self.recent_analytics = SlidingWindowCounter(3600, 10)
+        self.total_streams = 0
+        self.active_streams = 0
+        self.seeded_at: Optional[datetime] = None
+        # Stream workers do not serve the dashboard; they collect what they
+        # write here and hand it to the API process with their status reports
+        self.forwarding = False
+        self._pending = {'events': {}, 'analytics': {}}
+        self._pending_lock = threading.Lock()
+
+    def __call__(self, inserted: List[tuple]):
+        for model, values in inserted:
+            if model is VideoEvent:
+                self._count('events', self.recent_events, _epoch(values.get('event_time')))
+            elif model is VideoAnalytics:
+                self._count('analytics', self.recent_analytics, _epoch(values.get('timestamp')))
+
+    def _count(self, name: str, counter: SlidingWindowCounter, timestamp: float):
+        if not self.forwarding:
+            counter.add(timestamp)
+            return
+        bucket = int(timestamp // counter.resolution) * counter.resolution
+        with self._pending_lock:
+            self._pending[name][bucket] = self._pending[name].get(bucket, 0) + 1
+
+    def take_pending(self) -> Dict[str, Dict[float, int]]:
+        """Counts collected while forwarding since the previous call"""
+        with self._pending_lock:
+            pending, self._pending = self._pending, {'events': {}, 'analytics': {}}
+        return pending
+
+    def apply_pending(self, pending: Dict[str, Dict[float, int]]):
+        for timestamp, count in pending.get('events', {}).items():
+            self.recent_events.add(timestamp, count)
+        for timestamp, count in pending.get('analytics', {}).items():
+            self.recent_analytics.add(timestamp, count)
+
+    def seed(self):
+        """Load window contents and stream counts from the database"""
+        db = SessionLocal()
+        try:
+            self.recent_events.clear()
+            self.recent_analytics.clear()
+            self._seed_window(db, self.recent_events, VideoEvent.event_time)
+            since = datetime.utcnow() - timedelta(seconds=self.recent_analytics.window)
+            for table in analytics_partitions.tables(start=since):
+                self._seed_window(db, self.recent_analytics, table.c.timestamp)
+            self._count_streams(db)
+            self.seeded_at = datetime.utcnow()
+        except Exception as e:
+            logger.error(f"Error seeding dashboard counters: {e}")
+        finally:
+            db.close()
+
+    def _seed_window(self, db, counter: SlidingWindowCounter, time_column):
+        since = datetime.utcnow() - timedelta(seconds=counter.window)
+        # Group in the database at the counter's resolution so seeding
+        # returns one row per bucket rather than one per record
+        if db.bind.dialect.name == 'sqlite':
+            epoch = cast(func.strftime('%s', time_column), Integer)
+        else:
+            epoch = cast(func.extract('epoch', time_column), Integer)
+        bucket = epoch // int(counter.resolution)
+        rows = db.query(bucket, func.count()).filter(time_column >= since).group_by(bucket).all()
+        for index, count in rows:
+            counter.add(float(index) * counter.resolution, count)
+
+    def _count_streams(self, db):
+        self.total_streams = db.query(VideoStream).count()
+        self.active_streams = db.query(VideoStream).filter(VideoStream.is_active == True).count()
+
+    def refresh_streams(self):
+        """Recount streams after one is created or deleted"""
+        db = SessionLocal()
+        try:
+            self._count_streams(db)
+        except Exception as e:
+            logger.error(f"Error counting streams: {e}")
+        finally:
+            db.close()
+
+    def get_summary(self) -> Dict:
+        return {
+            "total_streams": self.total_streams,
+            "active_streams": self.active_streams,
+            "recent_events_24h": self.recent_events.total(),
+            "recent_analytics_1h": self.recent_analytics.total(),
+        }
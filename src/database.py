@@ -1,24 +1,102 @@
 import os
-from sqlalchemy import create_engine, MetaData
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, TypeVar
+from sqlalchemy import Column, DateTime, Integer, String, Table, create_engine, event, MetaData, inspect, text
+from sqlalchemy.engine import Engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy.pool import StaticPool
+from sqlalchemy.pool import QueuePool, StaticPool
 import logging
 
 logger = logging.getLogger(__name__)
 
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///video_monitoring.db")
 
-engine = create_engine(
-    DATABASE_URL,
-    poolclass=StaticPool,
-    connect_args={"check_same_thread": False} if "sqlite" in DATABASE_URL else {},
-    echo=False
-)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", str(64 * 1024)))
+# Threads running database work for async request handlers; more than the
+# pool can serve would only queue on connections
+DB_EXECUTOR_THREADS = int(os.getenv("DB_EXECUTOR_THREADS", str(DB_POOL_SIZE)))
+
+T = TypeVar("T")
+
+
+def _is_sqlite_memory(url: str) -> bool:
+    return url in ("sqlite://", "sqlite:///:memory:") or "mode=memory" in url
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    # WAL lets readers run alongside the single writer instead of blocking on it
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+    # Negative cache_size is in KiB rather than pages
+    cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
+
+
+def build_engine(url: str = DATABASE_URL) -> Engine:
+    """Create the engine with the connection profile for the URL's backend.
+
+    File-backed SQLite gets a pool of connections (one per concurrently
+    active thread) in WAL mode; in-memory SQLite has to share a single
+    connection; anything else gets a sized QueuePool.
+    """
+    if url.startswith("sqlite"):
+        if _is_sqlite_memory(url):
+            return create_engine(
+                url,
+                poolclass=StaticPool,
+                connect_args={"check_same_thread": False},
+                echo=False
+            )
+        sqlite_engine = create_engine(
+            url,
+            poolclass=QueuePool,
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+            # Pooled connections move between threads; each is only used by
+            # one thread at a time
+            connect_args={"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000},
+            echo=False
+        )
+        event.listen(sqlite_engine, "connect", _set_sqlite_pragmas)
+        return sqlite_engine
+
+    return create_engine(
+        url,
+        poolclass=QueuePool,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_pre_ping=True,
+        echo=False
+    )
+
+
+engine = build_engine(DATABASE_URL)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+# One row per one-off migration applied to this database
+schema_migrations = Table(
+    "schema_migrations", Base.metadata,
+    Column("version", Integer, primary_key=True, autoincrement=False),
+    Column("name", String(255), nullable=False),
+    Column("applied_at", DateTime, default=datetime.utcnow),
+)
+
 def get_db():
     db = SessionLocal()
     try:
@@ -33,9 +111,113 @@ def get_db():
         except Exception as e:
             logger.error(f"Error closing database connection: {e}")
 
+db_executor = ThreadPoolExecutor(max_workers=DB_EXECUTOR_THREADS, thread_name_prefix="db")
+
+async def run_in_db(fn: Callable[..., T], *args) -> T:
+    """Run ``fn(db, *args)`` with its own session on the database executor.
+
+    Async handlers use this instead of querying on the event loop. Sessions
+    expire objects on commit, so ``fn`` should return plain data after
+    committing.
+    """
+    def call():
+        db = SessionLocal()
+        try:
+            return fn(db, *args)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+    
+    return await asyncio.get_running_loop().run_in_executor(db_executor, call)
+
+def _add_missing_columns():
+    """Add nullable columns and indexes introduced after a table was first created"""
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {col['name'] for col in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing or not column.nullable:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+                logger.info(f"Added column {table.name}.{column.name}")
+            
+            existing_indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in existing_indexes:
+                    index.create(bind=conn)
+                    logger.info(f"Created index {index.name}")
+
+def _enable_sqlite_autoincrement(conn):
+    """Rebuild SQLite tables created before their model asked for AUTOINCREMENT"""
+    if conn.dialect.name != "sqlite":
+        return
+    for table in Base.metadata.sorted_tables:
+        if not table.dialect_options["sqlite"].get("autoincrement"):
+            continue
+        sql = conn.execute(
+            text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"),
+            {"name": table.name}
+        ).scalar()
+        if not sql or "AUTOINCREMENT" in sql.upper():
+            continue
+        
+        old_name = f"{table.name}_old"
+        # Leave foreign keys in other tables naming this table as they are
+        conn.exec_driver_sql("PRAGMA legacy_alter_table=ON")
+        conn.exec_driver_sql(f"ALTER TABLE {table.name} RENAME TO {old_name}")
+        for index in inspect(conn).get_indexes(old_name):
+            conn.exec_driver_sql(f"DROP INDEX {index['name']}")
+        table.create(bind=conn)
+        columns = ", ".join(column.name for column in table.columns)
+        conn.exec_driver_sql(f"INSERT INTO {table.name} ({columns}) SELECT {columns} FROM {old_name}")
+        conn.exec_driver_sql(f"DROP TABLE {old_name}")
+        conn.exec_driver_sql("PRAGMA legacy_alter_table=OFF")
+        
+        # Ids of deleted rows still referenced elsewhere are not handed out again either
+        key = table.primary_key.columns.values()[0].name
+        last_id = conn.exec_driver_sql(f"SELECT MAX({key}) FROM {table.name}").scalar() or 0
+        for other in Base.metadata.sorted_tables:
+            for fk in other.foreign_keys:
+                if fk.column.table is table:
+                    referenced = conn.exec_driver_sql(f"SELECT MAX({fk.parent.name}) FROM {other.name}").scalar()
+                    last_id = max(last_id, referenced or 0)
+        conn.execute(text("DELETE FROM sqlite_sequence WHERE name = :name"), {"name": table.name})
+        conn.execute(text("INSERT INTO sqlite_sequence (name, seq) VALUES (:name, :seq)"),
+                     {"name": table.name, "seq": last_id})
+        logger.info(f"Rebuilt {table.name} with AUTOINCREMENT ids")
+
+# (version, name, migration) in the order they are applied. Each runs once
+# per database, in the transaction that records it, and still checks that
+# it is needed: a database created after it was written has nothing to do.
+MIGRATIONS = [
+    (1, "sqlite_autoincrement_ids", _enable_sqlite_autoincrement),
+]
+
+def _run_migrations():
+    with engine.begin() as conn:
+        applied = {version for version, in conn.execute(schema_migrations.select().with_only_columns(
+            schema_migrations.c.version))}
+    for version, name, migrate in MIGRATIONS:
+        if version in applied:
+            continue
+        with engine.begin() as conn:
+            migrate(conn)
+            conn.execute(schema_migrations.insert().values(version=version, name=name))
+        logger.info(f"Applied migration {version} ({name})")
+
 def init_db():
     try:
+        # Register models on Base before creating tables
+        from . import models  # noqa: F401
         Base.metadata.create_all(bind=engine)
+        _add_missing_columns()
+        _run_migrations()
         logger.info("Database initialized successfully")
     except Exception as e:
         logger.error(f"Database initialization failed: {e}")
@@ -0,0 +1,271 @@
+import os
+import time
+import threading
+import logging
+from collections import deque
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import insert
+
+from .database import SessionLocal
+from .partitions import analytics_partitions
+
+logger = logging.getLogger(__name__)
+
+WRITE_QUEUE_SIZE = int(os.getenv("WRITE_QUEUE_SIZE", "10000"))
+WRITE_BATCH_SIZE = int(os.getenv("WRITE_BATCH_SIZE", "500"))
+WRITE_FLUSH_INTERVAL = float(os.getenv("WRITE_FLUSH_INTERVAL", "1.0"))
+# What happens to droppable rows (analytics, metrics) when the queue is full:
+# block, drop_newest or drop_oldest. Events always block until there is room.
+WRITE_QUEUE_POLICY = os.getenv("WRITE_QUEUE_POLICY", "drop_oldest")
+# A batch that fails to commit is written again one operation at a time:
+# events and updates get this many attempts each, droppable rows are given up
+WRITE_RETRIES = int(os.getenv("WRITE_RETRIES", "3"))
+WRITE_RETRY_DELAY = 0.5
+
+
+class DatabaseWriter:
+    """Write-behind queue that batches inserts and updates on one thread.
+
+    Producers enqueue plain dicts and return immediately; the writer thread
+    flushes when ``batch_size`` operations are pending or ``flush_interval``
+    seconds have passed, inserting rows of the same model with a single
+    executemany. Within a flush all inserts run before updates, so an update
+    never overtakes the insert of the row it targets.
+    """
+
+    def __init__(self, max_size: int = WRITE_QUEUE_SIZE, batch_size: int = WRITE_BATCH_SIZE,
+                 flush_interval: float = WRITE_FLUSH_INTERVAL, policy: str = WRITE_QUEUE_POLICY):
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.policy = policy
+        self.running = False
+        self._queue = deque()
+        self._condition = threading.Condition()
+        self._thread = None
+        self._listeners: List[Callable] = []
+        # Sequence number of the last operation queued, and whether the
+        # writer thread is in the middle of a flush; drain() waits on these
+        self._sequence = 0
+        self._flushing = False
+
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.flushes = 0
+        self.last_flush_ms = 0.0
+        self.avg_flush_ms = 0.0
+        self.rows_per_sec = 0.0
+        self._rate_window_start = time.time()
+        self._rate_window_rows = 0
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self.running = True
+        self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+        self._thread.start()
+        logger.info("Database writer started")
+
+    def stop(self, timeout: float = 30):
+        """Stop accepting work and drain everything still queued"""
+        with self._condition:
+            self.running = False
+            self._condition.notify_all()
+        if self._thread:
+            self._thread.join(timeout=timeout)
+        logger.info(f"Database writer stopped ({len(self._queue)} operations left unwritten)")
+
+    def drain(self, timeout: float = 30) -> bool:
+        """Wait until every operation queued before the call is flushed; False on timeout"""
+        deadline = time.time() + timeout
+        with self._condition:
+            target = self._sequence
+            # Flush now rather than at the next interval
+            self._condition.notify_all()
+            while (self._queue and self._queue[0][5] <= target) or self._flushing:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return False
+                self._condition.wait(timeout=min(remaining, 1.0))
+        return True
+
+    def add_listener(self, callback: Callable[[List[tuple]], None]):
+        """Call ``callback(inserted)`` with the (model, values) pairs of every committed flush.
+
+        Rows of mapped models carry the primary key the database assigned.
+        """
+        self._listeners.append(callback)
+
+    def insert(self, model, values: Dict, droppable: bool = False):
+        self._enqueue(('insert', model, values, None), droppable)
+
+    def update(self, model, filters: Dict, values: Dict):
+        self._enqueue(('update', model, values, filters), False)
+
+    def _enqueue(self, operation: tuple, droppable: bool):
+        with self._condition:
+            while self.running and len(self._queue) >= self.max_size:
+                if droppable and self.policy == 'drop_newest':
+                    self.dropped += 1
+                    return
+                if droppable and self.policy == 'drop_oldest' and self._drop_oldest():
+                    break
+                # Backpressure: wait for the writer to make room
+                self._condition.wait(timeout=1.0)
+
+            if self.running:
+                self._sequence += 1
+                self._queue.append(operation + (droppable, self._sequence))
+                self.enqueued += 1
+                if len(self._queue) >= self.batch_size:
+                    self._condition.notify_all()
+                return
+
+        # Not started, or stopped (possibly while this waited for room):
+        # nothing drains the queue any more, so write straight through
+        self._flush([operation + (droppable, 0)])
+
+    def _drop_oldest(self) -> bool:
+        for index, queued in enumerate(self._queue):
+            if queued[4]:
+                del self._queue[index]
+                self.dropped += 1
+                return True
+        return False
+
+    def _run(self):
+        while True:
+            with self._condition:
+                if self.running and len(self._queue) < self.batch_size:
+                    self._condition.wait(timeout=self.flush_interval)
+                batch = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+                self._flushing = bool(batch)
+                # Wake producers blocked on a full queue
+                self._condition.notify_all()
+                done = not self.running and not self._queue
+
+            if batch:
+                try:
+                    self._flush(batch)
+                finally:
+                    with self._condition:
+                        self._flushing = False
+                        self._condition.notify_all()
+            if done:
+                break
+
+    def _flush(self, batch: List[tuple]):
+        started = time.time()
+        inserts, updates = self._group(batch)
+        try:
+            inserted = self._execute(inserts, updates)
+        except Exception as e:
+            logger.error(f"Error flushing {len(batch)} queued writes: {e}")
+            self._flush_individually(batch)
+            return
+
+        elapsed_ms = (time.time() - started) * 1000
+        self.flushes += 1
+        self.last_flush_ms = round(elapsed_ms, 1)
+        self.avg_flush_ms = round(elapsed_ms if self.flushes == 1 else 0.9 * self.avg_flush_ms + 0.1 * elapsed_ms, 1)
+        self._record_written(len(batch))
+        self._notify(inserted)
+
+    def _flush_individually(self, batch: List[tuple]):
+        """Write what a failed batch must not lose, one operation per transaction.
+
+        Events and updates are retried, in queue order, up to ``WRITE_RETRIES``
+        times each, so one bad row or a transient error does not take the
+        rest with it. Droppable rows in the batch are given up.
+        """
+        kept = [operation for operation in batch if not operation[4]]
+        self.failed += len(batch) - len(kept)
+        for operation in kept:
+            inserts, updates = self._group([operation])
+            for attempt in range(1, WRITE_RETRIES + 1):
+                try:
+                    inserted = self._execute(inserts, updates)
+                except Exception as e:
+                    if attempt < WRITE_RETRIES:
+                        time.sleep(WRITE_RETRY_DELAY * attempt)
+                        continue
+                    self.failed += 1
+                    logger.error(f"Giving up on queued {operation[0]} of {operation[1].__tablename__}: {e}")
+                else:
+                    self._record_written(1)
+                    self._notify(inserted)
+                break
+
+    @staticmethod
+    def _group(batch: List[tuple]) -> tuple:
+        inserts: Dict[tuple, List[Dict]] = {}
+        updates = []
+        for kind, model, values, filters, *_ in batch:
+            if kind == 'insert':
+                # executemany needs identical keys across rows
+                inserts.setdefault((model, tuple(sorted(values))), []).append(values)
+            else:
+                updates.append((model, filters, values))
+        return inserts, updates
+
+    def _execute(self, inserts: Dict[tuple, List[Dict]], updates: List[tuple]) -> List[tuple]:
+        """Run the inserts, then the updates, in one transaction; returns the inserted (model, row) pairs"""
+        db = SessionLocal()
+        inserted = []
+        try:
+            for (model, _), rows in inserts.items():
+                for target, target_rows in analytics_partitions.route(db, model, rows):
+                    if target is model:
+                        # Still one round trip per batch (insertmanyvalues),
+                        # and listeners get the ids the rows were given
+                        key = model.__mapper__.primary_key[0]
+                        ids = db.execute(insert(model).returning(key, sort_by_parameter_order=True),
+                                         target_rows).scalars().all()
+                        inserted += [(model, dict(row, **{key.name: row_id})) for row, row_id in zip(target_rows, ids)]
+                    else:
+                        db.execute(insert(target), target_rows)
+                        inserted += [(model, row) for row in target_rows]
+            for model, filters, values in updates:
+                db.query(model).filter_by(**filters).update(values, synchronize_session=False)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+        return inserted
+
+    def _record_written(self, count: int):
+        self.written += count
+        self._rate_window_rows += count
+        window = time.time() - self._rate_window_start
+        if window >= 5:
+            self.rows_per_sec = round(self._rate_window_rows / window, 1)
+            self._rate_window_start = time.time()
+            self._rate_window_rows = 0
+
+    def _notify(self, inserted: List[tuple]):
+        if self._listeners and inserted:
+            for listener in self._listeners:
+                try:
+                    listener(inserted)
+                except Exception as e:
+                    logger.error(f"Database writer listener failed: {e}")
+
+    def get_status(self) -> Dict:
+        return {
+            'queue_depth': len(self._queue),
+            'max_queue_size': self.max_size,
+            'policy': self.policy,
+            'enqueued': self.enqueued,
+            'written': self.written,
+            'dropped': self.dropped,
+            'failed': self.failed,
+            'flushes': self.flushes,
+            'last_flush_ms': self.last_flush_ms,
+            'avg_flush_ms': self.avg_flush_ms,
+            'rows_per_sec': self.rows_per_sec
+        }
@@ -0,0 +1,172 @@
+import os
+import stat
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Optional, Tuple
+
+import anyio
+from fastapi import HTTPException, Request
+from fastapi.responses import FileResponse, Response
+
+from .packs import lookup_entry, split_pack_entry
+
+# Saved frames and clips are never rewritten; a new capture gets a new name
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+def resolve_media_path(requested: str, root: str) -> str:
+    """Absolute path of ``requested`` if it lies inside ``root``, else 404.
+
+    Accepts the stored form ("videos/x.jpg", relative to the working
+    directory) as well as a path relative to the root ("x.jpg"). Symlinks and
+    ``..`` are resolved before the check, so nothing outside the root can be
+    reached.
+    """
+    root = os.path.realpath(root)
+    for candidate in (requested, os.path.join(root, requested)):
+        path = os.path.realpath(candidate)
+        if os.path.commonpath([root, path]) == root and path != root:
+            return path
+    raise HTTPException(status_code=404, detail="File not found")
+
+
+def _etag(stat_result: os.stat_result) -> str:
+    return f'"{stat_result.st_mtime_ns:x}-{stat_result.st_size:x}"'
+
+
+def _not_modified(request: Request, etag: str, stat_result: Optional[os.stat_result]) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # If-None-Match takes precedence; weak comparison is fine for GET
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or etag in tags
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and stat_result is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return int(stat_result.st_mtime) <= since
+    return False
+
+
+def _parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """(start, end) inclusive for a single ``bytes=`` range.
+
+    Returns None when the header should be ignored (malformed or several
+    ranges; the full file is served then) and raises ValueError when the
+    range cannot be satisfied.
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, sep, last = spec.strip().partition("-")
+    if not sep:
+        return None
+    first, last = first.strip(), last.strip()
+    if (first and not first.isdigit()) or (last and not last.isdigit()) or not (first or last):
+        return None
+    if first:
+        start = int(first)
+        if start >= size:
+            raise ValueError("Range starts past the end of the file")
+        end = int(last) if last else size - 1
+        if start > end:
+            return None
+    else:
+        # Suffix range: the last N bytes
+        if int(last) == 0:
+            raise ValueError("Empty suffix range")
+        start, end = max(0, size - int(last)), size - 1
+    return start, min(end, size - 1)
+
+
+class FileRangeResponse(Response):
+    """Sends ``length`` bytes of a file starting at ``offset``, with positioned reads"""
+
+    chunk_size = 64 * 1024
+
+    def __init__(self, path: str, offset: int, length: int, headers: dict, media_type: str,
+                 status_code: int = 206):
+        super().__init__(status_code=status_code, headers=headers, media_type=media_type)
+        self.path = path
+        self.offset = offset
+        self.length = length
+        self.headers["content-length"] = str(length)
+
+    async def __call__(self, scope, receive, send):
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        fd = await anyio.to_thread.run_sync(os.open, self.path, os.O_RDONLY)
+        try:
+            position, remaining = self.offset, self.length
+            while remaining > 0:
+                chunk = await anyio.to_thread.run_sync(os.pread, fd, min(self.chunk_size, remaining), position)
+                if not chunk:
+                    break
+                position += len(chunk)
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+        finally:
+            os.close(fd)
+        if remaining > 0:
+            # File shrank underneath us; end the body rather than hang
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+async def media_file_response(request: Request, path: str, media_type: str = "image/jpeg") -> Response:
+    """Serve a saved frame or clip with validators, 304s, ranges and long caching.
+
+    ``path`` may also name a clip inside a pack file; it is then served
+    from its offset in the pack.
+    """
+    entry = None
+    pack_entry = split_pack_entry(path)
+    if pack_entry:
+        entry = await anyio.to_thread.run_sync(lookup_entry, *pack_entry)
+        if entry is None:
+            raise HTTPException(status_code=404, detail="File not found")
+        path = pack_entry[0]
+
+    try:
+        stat_result = await anyio.to_thread.run_sync(os.stat, path)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="File not found")
+    if not stat.S_ISREG(stat_result.st_mode):
+        raise HTTPException(status_code=404, detail="File not found")
+
+    if entry:
+        # The pack keeps growing, but an entry in it never changes
+        base, size = entry
+        etag = f'"{stat_result.st_ino:x}-{base:x}-{size:x}"'
+        last_modified = None
+    else:
+        base, size = 0, stat_result.st_size
+        etag = _etag(stat_result)
+        last_modified = formatdate(stat_result.st_mtime, usegmt=True)
+
+    headers = {
+        "etag": etag,
+        "cache-control": IMMUTABLE_CACHE_CONTROL,
+        "accept-ranges": "bytes",
+    }
+    if last_modified:
+        headers["last-modified"] = last_modified
+    if _not_modified(request, etag, stat_result if last_modified else None):
+        return Response(status_code=304, headers=headers)
+
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (if_range is None or if_range.strip() in (etag, last_modified)):
+        try:
+            byte_range = _parse_range(range_header, size)
+        except ValueError:
+            return Response(status_code=416, headers={**headers, "content-range": f"bytes */{size}"})
+        if byte_range is not None:
+            start, end = byte_range
+            headers["content-range"] = f"bytes {start}-{end}/{size}"
+            return FileRangeResponse(path, base + start, end - start + 1, headers, media_type)
+
+    if entry:
+        return FileRangeResponse(path, base, size, headers, media_type, status_code=200)
+    return FileResponse(path, headers=headers, media_type=media_type,
+                        stat_result=stat_result, method=request.method)
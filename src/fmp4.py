@@ -0,0 +1,143 @@
+import struct
+from typing import List, Tuple
+
+# Boxes whose payload is a list of child boxes, as far as remuxing needs
+CONTAINERS = {b'moov', b'trak', b'mdia', b'minf', b'stbl', b'dinf', b'edts', b'mvex'}
+
+# trun sample flags: sync samples depend on nothing, the rest are non-sync
+SYNC_SAMPLE = 0x02000000
+NON_SYNC_SAMPLE = 0x01010000
+
+
+def _boxes(data: bytes, start: int, end: int):
+    """(type, payload start, box end) of each box between ``start`` and ``end``"""
+    while start + 8 <= end:
+        size, kind = struct.unpack_from('>I4s', data, start)
+        header = 8
+        if size == 1:
+            size = struct.unpack_from('>Q', data, start + 8)[0]
+            header = 16
+        elif size == 0:
+            size = end - start
+        if size < header:
+            raise ValueError(f"Corrupt {kind!r} box")
+        yield kind, start + header, start + size
+        start += size
+
+
+def _parse(data: bytes, start: int, end: int) -> List[list]:
+    return [
+        [kind, _parse(data, body, stop) if kind in CONTAINERS else data[body:stop]]
+        for kind, body, stop in _boxes(data, start, end)
+    ]
+
+
+def _box(kind: bytes, payload: bytes) -> bytes:
+    return struct.pack('>I4s', 8 + len(payload), kind) + payload
+
+
+def _serialize(nodes: List[list]) -> bytes:
+    return b''.join(_box(kind, _serialize(body) if isinstance(body, list) else body) for kind, body in nodes)
+
+
+def _child(nodes: List[list], kind: bytes):
+    for node in nodes:
+        if node[0] == kind:
+            return node[1]
+    raise ValueError(f"Missing {kind!r} box")
+
+
+def _table(payload: bytes, fields: str) -> List[tuple]:
+    """Entries of a full box holding an entry count and ``fields``-shaped entries"""
+    count = struct.unpack_from('>I', payload, 4)[0]
+    size = struct.calcsize('>' + fields)
+    return [struct.unpack_from('>' + fields, payload, 8 + index * size) for index in range(count)]
+
+
+def _samples(data: bytes, stbl: List[list]) -> List[Tuple[int, int, int, bool]]:
+    """(offset, size, duration, sync) of every sample of a track, in decode order"""
+    sample_size, count = struct.unpack_from('>II', _child(stbl, b'stsz'), 4)
+    sizes = [sample_size] * count if sample_size else [
+        struct.unpack_from('>I', _child(stbl, b'stsz'), 12 + index * 4)[0] for index in range(count)]
+    durations = [delta for run, delta in _table(_child(stbl, b'stts'), 'II') for _ in range(run)]
+    kinds = {kind for kind, _ in stbl}
+    chunk_offsets = [offset for offset, in (
+        _table(_child(stbl, b'co64'), 'Q') if b'co64' in kinds else _table(_child(stbl, b'stco'), 'I'))]
+    # Without an stss box every sample is a sync sample
+    sync = {number for number, in _table(_child(stbl, b'stss'), 'I')} if b'stss' in kinds else None
+
+    runs = _table(_child(stbl, b'stsc'), 'III')
+    samples, index = [], 0
+    for chunk, offset in enumerate(chunk_offsets, start=1):
+        per_chunk = next(per for first, per, _ in reversed(runs) if first <= chunk)
+        for _ in range(per_chunk):
+            if index >= count:
+                break
+            samples.append((offset, sizes[index], durations[index] if index < len(durations) else 0,
+                            sync is None or index + 1 in sync))
+            offset += sizes[index]
+            index += 1
+    return samples
+
+
+def fragment(data: bytes, sequence: int = 1) -> Tuple[bytes, bytes]:
+    """Split a single-track MP4 into an fMP4 init segment and one media segment.
+
+    OpenCV can only write ordinary MP4 files, with one ``moov`` describing
+    every sample. HLS needs fragmented MP4: an init segment whose ``moov``
+    lists no samples, and media segments that carry their own sample tables
+    in a ``moof``. The samples themselves are copied as they are.
+    """
+    top = list(_boxes(data, 0, len(data)))
+    moov_box = next(((body, stop) for kind, body, stop in top if kind == b'moov'), None)
+    if moov_box is None:
+        raise ValueError("No moov box")
+    moov = _parse(data, *moov_box)
+    trak = _child(moov, b'trak')
+    tkhd = _child(trak, b'tkhd')
+    track_id = struct.unpack_from('>I', tkhd, 20 if tkhd[0] == 1 else 12)[0]
+    stbl = _child(_child(_child(trak, b'mdia'), b'minf'), b'stbl')
+    samples = _samples(data, stbl)
+
+    # Init segment: the same track with empty sample tables, plus mvex
+    empty_stbl = [
+        [b'stsd', _child(stbl, b'stsd')],
+        [b'stts', bytes(8)],
+        [b'stsc', bytes(8)],
+        [b'stsz', bytes(12)],
+        [b'stco', bytes(8)],
+    ]
+    for node in trak:
+        if node[0] == b'mdia':
+            minf = _child(node[1], b'minf')
+            for child in minf:
+                if child[0] == b'stbl':
+                    child[1] = empty_stbl
+    init_moov = [node for node in moov if node[0] != b'mvex'] + [
+        [b'mvex', [[b'trex', struct.pack('>IIIIII', 0, track_id, 1, 0, 0, 0)]]]]
+    for node in init_moov:
+        if node[0] == b'trak':
+            # Edit lists describe the unfragmented timeline
+            node[1] = [child for child in node[1] if child[0] != b'edts']
+    ftyp = _box(b'ftyp', b'iso5' + struct.pack('>I', 512) + b'iso5iso6mp41')
+    init = ftyp + _serialize([[b'moov', init_moov]])
+
+    # Media segment: one moof describing every sample, then the samples
+    def moof(data_offset: int) -> bytes:
+        trun = struct.pack('>IIi', 0x000701, len(samples), data_offset) + b''.join(
+            struct.pack('>III', duration, size, SYNC_SAMPLE if sync else NON_SYNC_SAMPLE)
+            for _, size, duration, sync in samples)
+        return _serialize([[b'moof', [
+            [b'mfhd', struct.pack('>II', 0, sequence)],
+            [b'traf', [
+                # default-base-is-moof: trun's data offset counts from the moof
+                [b'tfhd', struct.pack('>II', 0x020000, track_id)],
+                [b'tfdt', struct.pack('>IQ', 0x01000000, 0)],
+                [b'trun', trun],
+            ]],
+        ]]])
+
+    header_size = len(moof(0))
+    mdat = b''.join(data[offset:offset + size] for offset, size, _, _ in samples)
+    media = moof(header_size + 8) + _box(b'mdat', mdat)
+    return init, media
@@ -0,0 +1,442 @@
+import os
+import re
+import math
+import time
+import shutil
+import tempfile
+import threading
+import subprocess
+import logging
+from collections import deque
+from typing import Dict, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from .fmp4 import fragment
+from .recorder import can_encode
+
+logger = logging.getLogger(__name__)
+
+# Segments and playlists are scratch data, rebuilt whenever a stream is watched
+HLS_DIR = os.getenv("HLS_DIR", os.path.join(tempfile.gettempdir(), "video_monitoring_hls"))
+HLS_SEGMENT_SECONDS = float(os.getenv("HLS_SEGMENT_SECONDS", "2"))
+# Segments listed in the live playlist
+HLS_WINDOW_SEGMENTS = int(os.getenv("HLS_WINDOW_SEGMENTS", "6"))
+HLS_FPS = float(os.getenv("HLS_FPS", "15"))
+# Frames wider than this are downscaled before encoding; 0 keeps them
+HLS_WIDTH = int(os.getenv("HLS_WIDTH", "1280"))
+# auto: ffmpeg when the binary is found, OpenCV otherwise
+HLS_ENCODER = os.getenv("HLS_ENCODER", "auto")
+# Segments are H.264 from ffmpeg, which every HLS player decodes
+HLS_FFMPEG = os.getenv("HLS_FFMPEG", "ffmpeg")
+# OpenCV's VP9 encoder is several times slower than x264, so frames it
+# encodes are downscaled further to keep up with HLS_FPS; 0 disables
+HLS_OPENCV_WIDTH = int(os.getenv("HLS_OPENCV_WIDTH", "640"))
+# A stream's segmenter stops when no playlist or segment was requested for this long
+HLS_IDLE_SECONDS = float(os.getenv("HLS_IDLE_SECONDS", "30"))
+
+PLAYLIST_NAME = "playlist.m3u8"
+SEGMENT_NAME = re.compile(r"^[0-9a-f]+_\d{6}\.(ts|m4s|mp4)$")
+SEGMENT_TYPES = {'.ts': 'video/mp2t', '.m4s': 'video/mp4', '.mp4': 'video/mp4'}
+# Codecs OpenCV may write segments with, in order of preference; browsers
+# play H.264 everywhere and VP9 in fMP4 through Media Source Extensions
+OPENCV_CODECS = ['avc1', 'VP90']
+# Segments that slid out of the playlist are kept this many more, for
+# clients still fetching the previous playlist
+STALE_SEGMENTS = 2
+# Frames waiting for the encoder; the oldest are dropped if it falls behind
+QUEUE_FRAMES = 30
+
+
+def _session() -> str:
+    """Segment name prefix; names never repeat across restarts, so cached immutable copies stay valid"""
+    return format(int(time.time() * 1000), 'x')
+
+
+def _write_atomic(path: str, data: bytes):
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "wb") as f:
+        f.write(data)
+    os.replace(temp_path, path)
+
+
+class _OpenCvSegments:
+    """Writes each segment with its own cv2.VideoWriter and keeps the playlist itself.
+
+    OpenCV only writes ordinary MP4 files, so each finished file is remuxed
+    into an fMP4 init segment (``.mp4``) and media segment (``.m4s``), the
+    fragmented form HLS players accept. Frames are laid on a constant-rate
+    timeline by their capture time, repeated to fill gaps, so segment
+    durations stay honest when the source or the encoder is slower than
+    ``fps``. Segments are independent files, so every one is marked as a
+    discontinuity with its own init segment.
+    """
+
+    name = 'opencv'
+
+    def __init__(self, directory: str, session: str, fps: float, segment_seconds: float, window: int,
+                 codec: str):
+        self.directory = directory
+        self.session = session
+        self.fps = fps
+        self.frames_per_segment = max(1, round(fps * segment_seconds))
+        self.window = window
+        self.codec = codec
+        self.width = HLS_WIDTH
+        if codec == 'VP90':
+            self.width = min([width for width in (HLS_WIDTH, HLS_OPENCV_WIDTH) if width], default=0)
+        self.sequence = 0
+        self.segments: deque = deque()
+        self._writer: Optional[cv2.VideoWriter] = None
+        self._size = None
+        self._start = 0.0
+        self._written = 0
+        self._temp_path = None
+
+    def write(self, timestamp: float, frame: np.ndarray):
+        size = (frame.shape[1], frame.shape[0])
+        if self._writer is not None and size != self._size:
+            self._finish()
+        if self._writer is None:
+            self._open(timestamp, size)
+
+        # The epsilon keeps a frame arriving exactly on time from rounding down a slot
+        due = min(self.frames_per_segment, int((timestamp - self._start) * self.fps + 1e-6) + 1)
+        while self._written < due:
+            self._writer.write(frame)
+            self._written += 1
+        if self._written >= self.frames_per_segment:
+            self._finish()
+
+    def _open(self, timestamp: float, size: tuple):
+        self._temp_path = os.path.join(self.directory, f"{self.session}_{self.sequence:06d}.part.mp4")
+        writer = cv2.VideoWriter(self._temp_path, cv2.VideoWriter_fourcc(*self.codec), self.fps, size)
+        if not writer.isOpened():
+            raise RuntimeError(f"OpenCV could not open a {self.codec} MP4 writer")
+        self._writer = writer
+        self._size = size
+        self._start = timestamp
+        self._written = 0
+
+    def _finish(self):
+        writer, self._writer = self._writer, None
+        writer.release()
+        try:
+            if self._written == 0:
+                return
+            with open(self._temp_path, "rb") as f:
+                init, media = fragment(f.read(), self.sequence + 1)
+        finally:
+            os.remove(self._temp_path)
+        name = f"{self.session}_{self.sequence:06d}"
+        # The init segment first, so a listed media segment always has one
+        _write_atomic(os.path.join(self.directory, f"{name}.mp4"), init)
+        _write_atomic(os.path.join(self.directory, f"{name}.m4s"), media)
+        self.segments.append((self.sequence, name, self._written / self.fps))
+        self.sequence += 1
+
+        while len(self.segments) > self.window + STALE_SEGMENTS:
+            stale = self.segments.popleft()[1]
+            for extension in ('.mp4', '.m4s'):
+                try:
+                    os.remove(os.path.join(self.directory, stale + extension))
+                except FileNotFoundError:
+                    pass
+        self._write_playlist()
+
+    def _write_playlist(self):
+        listed = list(self.segments)[-self.window:]
+        first = listed[0][0]
+        lines = [
+            "#EXTM3U",
+            "#EXT-X-VERSION:7",
+            f"#EXT-X-TARGETDURATION:{math.ceil(max(s[2] for s in listed))}",
+            f"#EXT-X-MEDIA-SEQUENCE:{first}",
+            # One discontinuity per segment boundary, so the count equals the sequence
+            f"#EXT-X-DISCONTINUITY-SEQUENCE:{first}",
+            "#EXT-X-INDEPENDENT-SEGMENTS",
+        ]
+        for index, (_, name, duration) in enumerate(listed):
+            if index:
+                lines.append("#EXT-X-DISCONTINUITY")
+            lines += [f'#EXT-X-MAP:URI="{name}.mp4"', f"#EXTINF:{duration:.3f},", f"{name}.m4s"]
+        _write_atomic(os.path.join(self.directory, PLAYLIST_NAME), ("\n".join(lines) + "\n").encode())
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.release()
+            self._writer = None
+            try:
+                os.remove(self._temp_path)
+            except OSError:
+                pass
+
+
+class _FfmpegSegments:
+    """Pipes raw frames to an ffmpeg process running the H.264 HLS muxer"""
+
+    name = 'ffmpeg'
+
+    def __init__(self, directory: str, session: str, fps: float, segment_seconds: float, window: int,
+                 binary: str):
+        self.directory = directory
+        self.session = session
+        self.fps = fps
+        self.segment_seconds = segment_seconds
+        self.window = window
+        self.binary = binary
+        self.width = HLS_WIDTH
+        self._process: Optional[subprocess.Popen] = None
+        self._size = None
+
+    def write(self, timestamp: float, frame: np.ndarray):
+        size = (frame.shape[1], frame.shape[0])
+        if self._process is None or size != self._size:
+            if self._size is not None:
+                # A new process numbers segments from 0 again
+                self.session = _session()
+            self.close()
+            self._open(size)
+        self._process.stdin.write(np.ascontiguousarray(frame).tobytes())
+
+    def _open(self, size: tuple):
+        gop = max(1, round(self.fps * self.segment_seconds))
+        command = [
+            self.binary, "-hide_banner", "-loglevel", "error",
+            "-f", "rawvideo", "-pix_fmt", "bgr24", "-s", f"{size[0]}x{size[1]}",
+            # Frames arrive at the source's pace; stamp them as they come
+            "-use_wallclock_as_timestamps", "1", "-i", "pipe:0",
+            "-an", "-r", str(self.fps), "-c:v", "libx264", "-preset", "veryfast", "-tune", "zerolatency",
+            "-pix_fmt", "yuv420p", "-g", str(gop), "-keyint_min", str(gop), "-sc_threshold", "0",
+            "-f", "hls", "-hls_time", str(self.segment_seconds), "-hls_list_size", str(self.window),
+            "-hls_delete_threshold", str(STALE_SEGMENTS),
+            "-hls_flags", "delete_segments+independent_segments+temp_file",
+            "-hls_segment_filename", os.path.join(self.directory, f"{self.session}_%06d.ts"),
+            os.path.join(self.directory, PLAYLIST_NAME),
+        ]
+        self._process = subprocess.Popen(command, stdin=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        self._size = size
+
+    def close(self):
+        process, self._process = self._process, None
+        if process is None:
+            return
+        try:
+            process.stdin.close()
+        except OSError:
+            pass
+        try:
+            process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+
+class HlsSegmenter:
+    """Encodes one stream's published frames into rolling HLS segments.
+
+    ``push`` is the frame hub sink: it samples at ``fps`` and queues the
+    frame for the encoder thread, so capture never waits on encoding.
+    """
+
+    def __init__(self, stream_id: int, directory: str, encoder: Tuple[str, str]):
+        self.stream_id = stream_id
+        self.directory = directory
+        name, option = encoder
+        args = (directory, _session(), HLS_FPS, HLS_SEGMENT_SECONDS, HLS_WINDOW_SEGMENTS)
+        self.backend = _FfmpegSegments(*args, binary=option) if name == 'ffmpeg' else _OpenCvSegments(*args, codec=option)
+        self.interval = 0.9 / HLS_FPS if HLS_FPS > 0 else 0.0
+        self.last_access = time.time()
+        self._queue: deque = deque(maxlen=QUEUE_FRAMES)
+        self._condition = threading.Condition()
+        self._last_push = 0.0
+        # After an encoder failure, frames are dropped until this time
+        self._retry_at = 0.0
+        self._running = True
+        self.frames_encoded = 0
+        self.dropped_frames = 0
+        self.failed = 0
+        self.avg_encode_ms = 0.0
+        self._thread = threading.Thread(target=self._run, name=f"hls-{stream_id}", daemon=True)
+        self._thread.start()
+
+    def push(self, frame: np.ndarray):
+        now = time.time()
+        if now - self._last_push < self.interval:
+            return
+        self._last_push = now
+        with self._condition:
+            if len(self._queue) == self._queue.maxlen:
+                self.dropped_frames += 1
+            self._queue.append((now, frame))
+            self._condition.notify()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._running and not self._queue:
+                    self._condition.wait()
+                if not self._running:
+                    break
+                timestamp, frame = self._queue.popleft()
+            if timestamp < self._retry_at:
+                continue
+
+            started = time.perf_counter()
+            try:
+                self.backend.write(timestamp, self._scale(frame, self.backend.width))
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"HLS {self.backend.name} encoder failed for stream {self.stream_id}: {e}")
+                # The next frame starts a new process or writer; neither
+                # reuses a segment name already listed
+                self.backend.close()
+                self._retry_at = time.time() + HLS_SEGMENT_SECONDS
+                continue
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            self.frames_encoded += 1
+            self.avg_encode_ms = elapsed_ms if self.frames_encoded == 1 else 0.95 * self.avg_encode_ms + 0.05 * elapsed_ms
+        self.backend.close()
+
+    @staticmethod
+    def _scale(frame: np.ndarray, max_width: int) -> np.ndarray:
+        height, width = frame.shape[:2]
+        if max_width and width > max_width:
+            # Even dimensions, as 4:2:0 encoders require
+            scaled_height = max(2, round(height * max_width / width) // 2 * 2)
+            return cv2.resize(frame, (max_width, scaled_height), interpolation=cv2.INTER_AREA)
+        if width % 2 or height % 2:
+            return frame[:height // 2 * 2, :width // 2 * 2]
+        return frame
+
+    def stop(self):
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        self._thread.join(timeout=10)
+
+    def get_status(self) -> Dict:
+        return {
+            'encoder': self.backend.name,
+            'frames_encoded': self.frames_encoded,
+            'dropped_frames': self.dropped_frames,
+            'failed': self.failed,
+            'avg_encode_ms': round(self.avg_encode_ms, 2),
+            'idle_seconds': round(time.time() - self.last_access, 1)
+        }
+
+
+class HlsHub:
+    """Live HLS for running streams, one encoder per stream however many clients watch.
+
+    A stream's segmenter starts on its first playlist request and is fed by
+    the frame hub like an MJPEG viewer, so worker processes send it frames
+    too. It stops, and its directory is removed, once no client has asked
+    for the playlist or a segment for ``idle_seconds``.
+    """
+
+    def __init__(self, frame_hub, root: str = HLS_DIR, idle_seconds: float = HLS_IDLE_SECONDS):
+        self.frame_hub = frame_hub
+        self.root = root
+        self.idle_seconds = idle_seconds
+        self.encoder = self._pick_encoder()
+        self._segmenters: Dict[int, HlsSegmenter] = {}
+        self._lock = threading.Lock()
+        self._reaper: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+    @staticmethod
+    def _pick_encoder() -> Optional[Tuple[str, str]]:
+        """('ffmpeg', binary path) or ('opencv', codec), or None when live HLS is unavailable"""
+        if HLS_ENCODER != 'opencv':
+            binary = shutil.which(HLS_FFMPEG)
+            if binary:
+                return 'ffmpeg', binary
+            if HLS_ENCODER == 'ffmpeg':
+                logger.warning(f"{HLS_FFMPEG} was not found; live HLS is disabled")
+                return None
+        codec = next((codec for codec in OPENCV_CODECS if can_encode('.mp4', codec)), None)
+        if codec is None:
+            logger.warning("Neither ffmpeg nor an OpenCV H.264/VP9 encoder was found; live HLS is disabled")
+            return None
+        if HLS_ENCODER != 'opencv':
+            logger.warning(f"{HLS_FFMPEG} was not found; live HLS falls back to OpenCV {codec} fMP4 segments")
+        return 'opencv', codec
+
+    @property
+    def available(self) -> bool:
+        return self.encoder is not None
+
+    def stream_dir(self, stream_id: int) -> str:
+        return os.path.join(self.root, f"stream_{stream_id}")
+
+    def touch(self, stream_id: int) -> str:
+        """Start (or keep alive) the stream's segmenter; returns its playlist path"""
+        if not self.available:
+            raise RuntimeError("Live HLS is disabled: no usable encoder was found")
+        with self._lock:
+            segmenter = self._segmenters.get(stream_id)
+            if segmenter is None:
+                directory = self.stream_dir(stream_id)
+                shutil.rmtree(directory, ignore_errors=True)
+                os.makedirs(directory, exist_ok=True)
+                segmenter = HlsSegmenter(stream_id, directory, self.encoder)
+                self._segmenters[stream_id] = segmenter
+                logger.info(f"HLS segmenter started for stream {stream_id} ({segmenter.backend.name})")
+            if self._reaper is None:
+                self._reaper = threading.Thread(target=self._reap, name="hls-reaper", daemon=True)
+                self._reaper.start()
+            segmenter.last_access = time.time()
+        # The frame hub replaces a stream's channel when it restarts; adding is idempotent
+        self.frame_hub.add_sink(stream_id, segmenter.push)
+        return os.path.join(segmenter.directory, PLAYLIST_NAME)
+
+    @staticmethod
+    def media_type(name: str) -> str:
+        return SEGMENT_TYPES[os.path.splitext(name)[1]]
+
+    def segment_path(self, stream_id: int, name: str) -> Optional[str]:
+        """Path of a segment of an active segmenter, or None; counts as client activity"""
+        if not SEGMENT_NAME.match(name):
+            return None
+        with self._lock:
+            segmenter = self._segmenters.get(stream_id)
+            if segmenter is None:
+                return None
+            segmenter.last_access = time.time()
+        return os.path.join(segmenter.directory, name)
+
+    def close_stream(self, stream_id: int):
+        with self._lock:
+            segmenter = self._segmenters.pop(stream_id, None)
+        if segmenter:
+            self._close(segmenter)
+
+    def _close(self, segmenter: HlsSegmenter):
+        self.frame_hub.remove_sink(segmenter.stream_id, segmenter.push)
+        segmenter.stop()
+        shutil.rmtree(segmenter.directory, ignore_errors=True)
+        logger.info(f"HLS segmenter stopped for stream {segmenter.stream_id}")
+
+    def _reap(self):
+        while not self._stopped.wait(min(5.0, self.idle_seconds)):
+            now = time.time()
+            with self._lock:
+                idle = [sid for sid, s in self._segmenters.items() if now - s.last_access > self.idle_seconds]
+                segmenters = [self._segmenters.pop(sid) for sid in idle]
+            for segmenter in segmenters:
+                self._close(segmenter)
+
+    def stop(self):
+        self._stopped.set()
+        with self._lock:
+            segmenters = list(self._segmenters.values())
+            self._segmenters.clear()
+        for segmenter in segmenters:
+            self._close(segmenter)
+
+    def get_status(self) -> Dict:
+        with self._lock:
+            segmenters = dict(self._segmenters)
+        return {stream_id: segmenter.get_status() for stream_id, segmenter in segmenters.items()}
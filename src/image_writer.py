@@ -0,0 +1,223 @@
+import os
+import time
+import threading
+import logging
+from collections import Counter, deque
+from typing import Callable, Dict, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from .packs import append_entry, split_pack_entry
+
+logger = logging.getLogger(__name__)
+
+IMAGE_WRITE_THREADS = int(os.getenv("IMAGE_WRITE_THREADS", "2"))
+IMAGE_WRITE_QUEUE_SIZE = int(os.getenv("IMAGE_WRITE_QUEUE_SIZE", "64"))
+# What happens when the queue is full: block (the stream thread waits for
+# room), drop_newest (the new image is not written and its event is saved
+# without it) or lower_quality (past half full images are encoded at
+# IMAGE_REDUCED_QUALITY, and a full queue blocks). Queued images are never
+# dropped: their paths have already been handed out to events.
+IMAGE_WRITE_POLICY = os.getenv("IMAGE_WRITE_POLICY", "lower_quality")
+IMAGE_JPEG_QUALITY = int(os.getenv("IMAGE_JPEG_QUALITY", "95"))
+IMAGE_REDUCED_QUALITY = int(os.getenv("IMAGE_REDUCED_QUALITY", "70"))
+
+
+def store_image(path: str, image: np.ndarray, quality: int = IMAGE_JPEG_QUALITY) -> Tuple[float, float]:
+    """JPEG-encode ``image`` and store it at ``path``, a file or a clip pack entry.
+
+    Returns the encode and write times in milliseconds.
+    """
+    started = time.perf_counter()
+    ok, encoded = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        raise ValueError("JPEG encoding failed")
+    encoded_at = time.perf_counter()
+
+    if split_pack_entry(path):
+        append_entry(path, encoded.tobytes())
+    else:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # Write aside and rename so the file endpoints never serve a partial image
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(encoded.tobytes())
+        os.replace(temp_path, path)
+    return (encoded_at - started) * 1000, (time.perf_counter() - encoded_at) * 1000
+
+
+class ImageWriter:
+    """Bounded pool that JPEG-encodes and writes event images off the stream threads.
+
+    ``submit`` returns the destination path straight away; the file appears
+    there (atomically, via rename) once a worker gets to it. Images must not
+    be modified after they are submitted.
+    """
+
+    def __init__(self, threads: int = IMAGE_WRITE_THREADS, max_size: int = IMAGE_WRITE_QUEUE_SIZE,
+                 policy: str = IMAGE_WRITE_POLICY, quality: int = IMAGE_JPEG_QUALITY,
+                 reduced_quality: int = IMAGE_REDUCED_QUALITY):
+        self.threads = threads
+        self.max_size = max_size
+        self.policy = policy
+        self.quality = quality
+        self.reduced_quality = reduced_quality
+        if policy == 'drop_oldest':
+            # Dropping a queued image would leave its event pointing at a
+            # file that never appears, so the new one is dropped instead
+            logger.warning("IMAGE_WRITE_POLICY drop_oldest is no longer supported; using drop_newest")
+            self.policy = 'drop_newest'
+        self.running = False
+        self._queue = deque()
+        self._condition = threading.Condition()
+        self._workers = []
+        # Images of each stream queued or being written
+        self._pending: Counter = Counter()
+
+        self.submitted = 0
+        self.written = 0
+        self.dropped = 0
+        self.reduced = 0
+        self.failed = 0
+        self.max_depth = 0
+        self.avg_encode_ms = 0.0
+        self.max_encode_ms = 0.0
+        self.avg_write_ms = 0.0
+        self.max_write_ms = 0.0
+        self.blocked_ms = 0.0
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self._workers = [
+            threading.Thread(target=self._run, name=f"image-writer-{index}", daemon=True)
+            for index in range(self.threads)
+        ]
+        for worker in self._workers:
+            worker.start()
+        logger.info(f"Image writer started ({self.threads} threads)")
+
+    def stop(self, timeout: float = 30):
+        """Stop accepting work and write everything still queued"""
+        with self._condition:
+            self.running = False
+            self._condition.notify_all()
+        deadline = time.time() + timeout
+        for worker in self._workers:
+            worker.join(timeout=max(0.0, deadline - time.time()))
+        self._workers = []
+        logger.info(f"Image writer stopped ({len(self._queue)} images left unwritten)")
+
+    def submit(self, path: str, image: np.ndarray,
+               on_written: Optional[Callable[[str], None]] = None,
+               stream_id: Optional[int] = None) -> Optional[str]:
+        """Queue ``image`` to be written to ``path`` and return ``path``, or None if it was dropped"""
+        quality = self.quality
+        if not self.running:
+            # Not started (or already stopped): write on the caller's thread
+            self._write(path, image, quality, on_written)
+            return path
+
+        with self._condition:
+            if self.policy == 'lower_quality' and len(self._queue) >= self.max_size // 2:
+                quality = min(quality, self.reduced_quality)
+                self.reduced += 1
+            blocked_since = None
+            while len(self._queue) >= self.max_size and self.running:
+                if self.policy == 'drop_newest':
+                    self.dropped += 1
+                    if self.dropped == 1:
+                        logger.warning("Image write queue full; dropping new images")
+                    return None
+                # Backpressure: wait for a worker to make room
+                blocked_since = blocked_since or time.perf_counter()
+                self._condition.wait(timeout=1.0)
+            if blocked_since is not None:
+                self.blocked_ms += (time.perf_counter() - blocked_since) * 1000
+
+            self._queue.append((path, image, quality, on_written, stream_id))
+            self._pending[stream_id] += 1
+            self.submitted += 1
+            self.max_depth = max(self.max_depth, len(self._queue))
+            self._condition.notify_all()
+        return path
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self.running and not self._queue:
+                    self._condition.wait(timeout=1.0)
+                if not self._queue:
+                    break
+                path, image, quality, on_written, stream_id = self._queue.popleft()
+                # Wake producers blocked on a full queue
+                self._condition.notify_all()
+            try:
+                self._write(path, image, quality, on_written)
+            finally:
+                with self._condition:
+                    self._done(stream_id)
+
+    def _done(self, stream_id: Optional[int]):
+        """Count a stream's image as written or dropped; caller holds the condition"""
+        self._pending[stream_id] -= 1
+        if self._pending[stream_id] <= 0:
+            del self._pending[stream_id]
+            self._condition.notify_all()
+
+    def drain_stream(self, stream_id: int, timeout: float = 30) -> bool:
+        """Wait until every image queued for a stream is written; False on timeout"""
+        deadline = time.time() + timeout
+        with self._condition:
+            while self._pending.get(stream_id):
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return False
+                self._condition.wait(timeout=min(remaining, 1.0))
+        return True
+
+    def _write(self, path: str, image: np.ndarray, quality: int,
+               on_written: Optional[Callable[[str], None]]):
+        try:
+            encode_ms, write_ms = store_image(path, image, quality)
+            self._record(encode_ms, write_ms)
+        except Exception as e:
+            self.failed += 1
+            logger.error(f"Error writing image {path}: {e}")
+            return
+
+        if on_written:
+            try:
+                on_written(path)
+            except Exception as e:
+                logger.error(f"Image written callback failed for {path}: {e}")
+
+    def _record(self, encode_ms: float, write_ms: float):
+        with self._condition:
+            self.written += 1
+            weight = 1.0 if self.written == 1 else 0.1
+            self.avg_encode_ms += weight * (encode_ms - self.avg_encode_ms)
+            self.avg_write_ms += weight * (write_ms - self.avg_write_ms)
+            self.max_encode_ms = max(self.max_encode_ms, encode_ms)
+            self.max_write_ms = max(self.max_write_ms, write_ms)
+
+    def get_status(self) -> Dict:
+        return {
+            'queue_depth': len(self._queue),
+            'max_queue_size': self.max_size,
+            'max_depth': self.max_depth,
+            'policy': self.policy,
+            'threads': self.threads,
+            'submitted': self.submitted,
+            'written': self.written,
+            'dropped': self.dropped,
+            'reduced_quality': self.reduced,
+            'failed': self.failed,
+            'avg_encode_ms': round(self.avg_encode_ms, 2),
+            'max_encode_ms': round(self.max_encode_ms, 2),
+            'avg_write_ms': round(self.avg_write_ms, 2),
+            'max_write_ms': round(self.max_write_ms, 2),
+            'blocked_ms': round(self.blocked_ms, 1)
+        }
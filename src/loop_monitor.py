@@ -0,0 +1,58 @@
+import asyncio
+import time
+import logging
+from collections import deque
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+LOOP_LAG_WARN_MS = 250
+
+
+class EventLoopMonitor:
+    """Measures how late the event loop runs a callback scheduled every ``interval`` seconds.
+
+    Lag is the time between when the sleep should have ended and when the
+    loop got back to it; anything blocking the loop (a synchronous query, a
+    camera open) shows up here directly.
+    """
+
+    def __init__(self, interval: float = 0.5, window: int = 120):
+        self.interval = interval
+        self.samples = deque(maxlen=window)
+        self.max_lag_ms = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            expected = time.perf_counter() + self.interval
+            await asyncio.sleep(self.interval)
+            lag_ms = max(0.0, (time.perf_counter() - expected) * 1000)
+            self.samples.append(lag_ms)
+            self.max_lag_ms = max(self.max_lag_ms, lag_ms)
+            if lag_ms >= LOOP_LAG_WARN_MS:
+                logger.warning(f"Event loop blocked for {lag_ms:.0f} ms")
+
+    def get_status(self) -> Dict:
+        samples = sorted(self.samples)
+        if not samples:
+            return {'lag_ms': 0.0, 'avg_lag_ms': 0.0, 'p99_lag_ms': 0.0, 'max_lag_ms': 0.0}
+        return {
+            'lag_ms': round(self.samples[-1], 2),
+            'avg_lag_ms': round(sum(samples) / len(samples), 2),
+            'p99_lag_ms': round(samples[min(len(samples) - 1, int(len(samples) * 0.99))], 2),
+            'max_lag_ms': round(self.max_lag_ms, 2)
+        }
@@ -0,0 +1,266 @@
+import os
+import time
+import asyncio
+import threading
+import logging
+from typing import AsyncIterator, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class MjpegProfile(NamedTuple):
+    name: str
+    # 0 keeps the source width
+    width: int
+    fps: float
+    quality: int
+
+
+def _parse_profiles(spec: str) -> List[MjpegProfile]:
+    profiles = []
+    for item in spec.split(","):
+        if item.strip():
+            name, width, fps, quality = item.strip().split(":")
+            profiles.append(MjpegProfile(name, int(width), float(fps), int(quality)))
+    return profiles
+
+
+# name:max_width:fps:quality, smallest first. Viewers are snapped to one of
+# these, and each profile in use is encoded once per frame for all its viewers
+MJPEG_PROFILES = _parse_profiles(os.getenv(
+    "MJPEG_PROFILES", "preview:320:5:50,standard:640:15:60,full:0:30:70"))
+
+
+def snap_profile(width: Optional[int] = None, fps: Optional[float] = None,
+                 quality: Optional[int] = None) -> MjpegProfile:
+    """Smallest profile at least as wide, fast and good as asked (the largest if none is).
+
+    A missing width asks for the source width.
+    """
+    for profile in MJPEG_PROFILES:
+        wide_enough = profile.width == 0 or (width and profile.width >= width)
+        if wide_enough and profile.fps >= (fps or 0) and profile.quality >= (quality or 0):
+            return profile
+    return MJPEG_PROFILES[-1]
+
+
+def get_profile(name: str) -> Optional[MjpegProfile]:
+    return next((profile for profile in MJPEG_PROFILES if profile.name == name), None)
+
+
+def encode_frame(frame: np.ndarray, profile: MjpegProfile) -> Optional[bytes]:
+    """JPEG bytes of a frame downscaled to the profile's width"""
+    height, width = frame.shape[:2]
+    if profile.width and width > profile.width:
+        frame = cv2.resize(frame, (profile.width, max(1, round(height * profile.width / width))),
+                           interpolation=cv2.INTER_AREA)
+    ret, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, profile.quality])
+    return buffer.tobytes() if ret else None
+
+
+def multipart_frame(jpeg_bytes: bytes) -> bytes:
+    return (b'--frame\r\n'
+            b'Content-Type: image/jpeg\r\n\r\n' + jpeg_bytes + b'\r\n')
+
+
+class _StreamChannel:
+    """Latest frame of one stream plus its encoded variants and subscribers"""
+
+    def __init__(self, stream_id: int):
+        self.stream_id = stream_id
+        self.closed = False
+        self._lock = threading.Lock()
+        # One per profile, so a full-size encode never holds up previews
+        self._encode_locks: Dict[str, threading.Lock] = {}
+        self._frame: Optional[np.ndarray] = None
+        self._sequence = 0
+        # profile name -> (sequence, encoded at, chunk)
+        self._encoded: Dict[str, Tuple[int, float, bytes]] = {}
+        self.encodes: Dict[str, int] = {}
+        # (loop, event, profile name)
+        self._subscribers = set()
+        # Callables fed every published frame (e.g. the HLS segmenter)
+        self._sinks = set()
+
+    @property
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return len(self._subscribers)
+
+    def profile_counts(self) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        with self._lock:
+            for subscriber in self._subscribers:
+                counts[subscriber[2]] = counts.get(subscriber[2], 0) + 1
+        return counts
+
+    @property
+    def active(self) -> bool:
+        with self._lock:
+            return bool(self._subscribers or self._sinks)
+
+    def add_sink(self, sink: Callable[[np.ndarray], None]):
+        with self._lock:
+            self._sinks.add(sink)
+
+    def remove_sink(self, sink: Callable[[np.ndarray], None]):
+        with self._lock:
+            self._sinks.discard(sink)
+
+    def add_subscriber(self, subscriber):
+        with self._lock:
+            self._subscribers.add(subscriber)
+
+    def remove_subscriber(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def publish(self, frame: np.ndarray):
+        with self._lock:
+            self._frame = frame
+            self._sequence += 1
+            subscribers = list(self._subscribers)
+            sinks = list(self._sinks)
+        self._wake(subscribers)
+        for sink in sinks:
+            try:
+                sink(frame)
+            except Exception as e:
+                logger.error(f"Frame sink failed for stream {self.stream_id}: {e}")
+
+    def close(self):
+        with self._lock:
+            self.closed = True
+            subscribers = list(self._subscribers)
+        self._wake(subscribers)
+
+    def _wake(self, subscribers):
+        # Setting an already-set event is a no-op, so a subscriber that has not
+        # caught up yet simply skips to whatever frame is newest when it does.
+        for loop, event, _ in subscribers:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                # Event loop already closed; the subscriber is gone
+                pass
+
+    def encode(self, profile: MjpegProfile) -> Tuple[int, Optional[bytes]]:
+        """Return the newest frame as a multipart chunk in ``profile``.
+
+        Each profile encodes at most once per frame and at most ``fps``
+        times a second: viewers asking sooner get the chunk already made,
+        so every viewer of a profile shares its encodes.
+        """
+        with self._lock:
+            encode_lock = self._encode_locks.setdefault(profile.name, threading.Lock())
+        with encode_lock:
+            with self._lock:
+                sequence, frame = self._sequence, self._frame
+            if frame is None:
+                return sequence, None
+
+            cached = self._encoded.get(profile.name)
+            # Slightly under the interval, so viewers paced to it still share
+            if cached and (cached[0] == sequence or time.monotonic() - cached[1] < 0.9 / profile.fps):
+                return cached[0], cached[2]
+
+            jpeg_bytes = encode_frame(frame, profile)
+            if jpeg_bytes is None:
+                return sequence, None
+
+            chunk = multipart_frame(jpeg_bytes)
+            self._encoded[profile.name] = (sequence, time.monotonic(), chunk)
+            self.encodes[profile.name] = self.encodes.get(profile.name, 0) + 1
+            return sequence, chunk
+
+
+class MjpegHub:
+    """Broadcasts frames already decoded by the stream manager to MJPEG viewers"""
+
+    def __init__(self):
+        self._channels: Dict[int, _StreamChannel] = {}
+        self._lock = threading.Lock()
+
+    def _channel(self, stream_id: int) -> _StreamChannel:
+        with self._lock:
+            channel = self._channels.get(stream_id)
+            if channel is None or channel.closed:
+                channel = _StreamChannel(stream_id)
+                self._channels[stream_id] = channel
+            return channel
+
+    def has_subscribers(self, stream_id: int) -> bool:
+        channel = self._channels.get(stream_id)
+        return channel is not None and channel.active
+
+    def publish(self, stream_id: int, frame: np.ndarray):
+        """Called from capture threads; cheap when nobody is watching"""
+        channel = self._channels.get(stream_id)
+        if channel is None or not channel.active:
+            return
+        channel.publish(frame)
+
+    def add_sink(self, stream_id: int, sink: Callable[[np.ndarray], None]):
+        """Feed every frame of a stream to ``sink`` on the publishing thread; idempotent"""
+        self._channel(stream_id).add_sink(sink)
+
+    def remove_sink(self, stream_id: int, sink: Callable[[np.ndarray], None]):
+        channel = self._channels.get(stream_id)
+        if channel:
+            channel.remove_sink(sink)
+
+    def close_stream(self, stream_id: int):
+        """End all viewer generators for a stream that stopped producing frames"""
+        with self._lock:
+            channel = self._channels.pop(stream_id, None)
+        if channel:
+            channel.close()
+
+    def get_status(self) -> Dict:
+        with self._lock:
+            channels = list(self._channels.values())
+        status = {}
+        for channel in channels:
+            profiles = channel.profile_counts()
+            status[channel.stream_id] = {
+                'viewers': sum(profiles.values()),
+                'profiles': profiles,
+                'encodes': dict(channel.encodes)
+            }
+        return status
+
+    async def subscribe(self, stream_id: int, profile: MjpegProfile) -> AsyncIterator[bytes]:
+        """Yield multipart JPEG chunks in ``profile`` until the stream closes or the client leaves"""
+        channel = self._channel(stream_id)
+        loop = asyncio.get_running_loop()
+        subscriber = (loop, asyncio.Event(), profile.name)
+        channel.add_subscriber(subscriber)
+        logger.info(f"Viewer joined stream {stream_id} on profile {profile.name} "
+                    f"({channel.subscriber_count} watching)")
+
+        interval = 1.0 / profile.fps
+        last_sequence = 0
+        next_due = 0.0
+        try:
+            while not channel.closed:
+                await subscriber[1].wait()
+                subscriber[1].clear()
+                delay = next_due - loop.time()
+                if delay > 0:
+                    # Faster sources are sampled down to the profile's rate
+                    await asyncio.sleep(delay)
+                if channel.closed:
+                    break
+
+                sequence, chunk = await asyncio.to_thread(channel.encode, profile)
+                if chunk is None or sequence == last_sequence:
+                    continue
+                last_sequence = sequence
+                next_due = loop.time() + interval
+                yield chunk
+        finally:
+            channel.remove_subscriber(subscriber)
+            logger.info(f"Viewer left stream {stream_id}")
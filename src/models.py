@@ -1,18 +1,23 @@
-from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, ForeignKey, JSON
-from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, ForeignKey, Index, JSON
 from sqlalchemy.orm import relationship
 from datetime import datetime
 
-Base = declarative_base()
+from .database import Base
 
 class VideoStream(Base):
     __tablename__ = "video_streams"
+    # Ids of deleted streams are never handed out again, so late writes or
+    # cached URLs for them cannot land on a new stream
+    __table_args__ = {'sqlite_autoincrement': True}
     
     stream_id = Column(Integer, primary_key=True, index=True)
     stream_name = Column(String(255), nullable=False)
     stream_url = Column(String(500), nullable=False)
     stream_type = Column(String(50), default="rtsp")
     is_active = Column(Boolean, default=True)
+    # Days of events and analytics kept for this stream; null uses the
+    # global retention windows
+    retention_days = Column(Float)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -21,6 +26,10 @@ class VideoStream(Base):
 
 class VideoEvent(Base):
     __tablename__ = "video_events"
+    __table_args__ = (
+        # Keyset pagination walks this index newest-first per stream
+        Index("ix_video_events_stream_time", "stream_id", "event_time"),
+    )
     
     event_id = Column(Integer, primary_key=True, index=True)
     stream_id = Column(Integer, ForeignKey("video_streams.stream_id"))
@@ -31,12 +40,18 @@ class VideoEvent(Base):
     event_metadata = Column(JSON)
     frame_path = Column(String(500))
     clip_path = Column(String(500))
+    # Pre/post-roll video recorded around the event
+    video_path = Column(String(500))
+    track_id = Column(String(64), index=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     
     stream = relationship("VideoStream", back_populates="events")
 
 class VideoAnalytics(Base):
     __tablename__ = "video_analytics"
+    __table_args__ = (
+        Index("ix_video_analytics_stream_time", "stream_id", "timestamp"),
+    )
     
     analytics_id = Column(Integer, primary_key=True, index=True)
     stream_id = Column(Integer, ForeignKey("video_streams.stream_id"))
@@ -47,18 +62,56 @@ class VideoAnalytics(Base):
     object_count = Column(Integer, default=0)
     quality_score = Column(Float)
     processing_time_ms = Column(Integer)
+    analysis_fps = Column(Float)
+    skip_ratio = Column(Float)
     created_at = Column(DateTime, default=datetime.utcnow)
     
     stream = relationship("VideoStream", back_populates="analytics")
 
+class PurgeJob(Base):
+    """A stream deletion, kept so one cut short by a restart is resumed"""
+    __tablename__ = "purge_jobs"
+    
+    job_id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String(50), nullable=False)
+    stream_id = Column(Integer, index=True)
+    # queued, running, interrupted, done or failed
+    status = Column(String(20), nullable=False, index=True)
+    total = Column(JSON)
+    deleted = Column(JSON)
+    error = Column(String(1000))
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+
 class SystemMetrics(Base):
     __tablename__ = "system_metrics"
     
     metric_id = Column(Integer, primary_key=True, index=True)
-    timestamp = Column(DateTime, default=datetime.utcnow)
+    timestamp = Column(DateTime, default=datetime.utcnow, index=True)
     cpu_usage = Column(Float)
     memory_usage = Column(Float)
     disk_usage = Column(Float)
     network_usage = Column(Float)
     active_streams = Column(Integer)
-    created_at = Column(DateTime, default=datetime.utcnow)
\ No newline at end of file
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class AnalyticsRollupMixin:
+    """Columns shared by the analytics rollup tables, one row per stream and bucket"""
+    stream_id = Column(Integer, primary_key=True)
+    bucket_start = Column(DateTime, primary_key=True)
+    samples = Column(Integer, nullable=False, default=0)
+    fps_sum = Column(Float, nullable=False, default=0.0)
+    fps_max = Column(Float, nullable=False, default=0.0)
+    motion_frames = Column(Integer, nullable=False, default=0)
+    object_count = Column(Integer, nullable=False, default=0)
+    max_objects = Column(Integer, nullable=False, default=0)
+    quality_sum = Column(Float, nullable=False, default=0.0)
+    processing_sum = Column(Float, nullable=False, default=0.0)
+    processing_histogram = Column(JSON)
+
+class AnalyticsMinutely(AnalyticsRollupMixin, Base):
+    __tablename__ = "analytics_minutely"
+
+class AnalyticsHourly(AnalyticsRollupMixin, Base):
+    __tablename__ = "analytics_hourly"
@@ -0,0 +1,120 @@
+import os
+import time
+import logging
+from typing import Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+MOTION_START_FRAMES = int(os.getenv("MOTION_START_FRAMES", "2"))
+MOTION_COOLDOWN = float(os.getenv("MOTION_COOLDOWN", "5"))
+MOTION_MAX_SESSION = float(os.getenv("MOTION_MAX_SESSION", "300"))
+MOTION_SESSION_FRAMES = int(os.getenv("MOTION_SESSION_FRAMES", "3"))
+
+
+class MotionSession:
+    def __init__(self, timestamp: float):
+        self.start_time = timestamp
+        self.last_motion = timestamp
+        self.end_time = timestamp
+        self.peak_motion_area = 0
+        self.peak_time = timestamp
+        self.motion_frames = 0
+        # role -> (timestamp, frame); frames are not copied, capture
+        # allocates a new array for every decoded frame
+        self.frames: Dict[str, tuple] = {}
+        # Clip recorded around the session, if recording is on
+        self.video_path: Optional[str] = None
+        # track_id of the event row written when the session opened, and
+        # the frame saved for it
+        self.event_key: Optional[str] = None
+        self.frame_path: Optional[str] = None
+
+    @property
+    def duration(self) -> float:
+        return self.end_time - self.start_time
+
+    def observe(self, motion_area: int, frame: np.ndarray, timestamp: float):
+        self.last_motion = timestamp
+        self.end_time = timestamp
+        self.motion_frames += 1
+        if 'first' not in self.frames:
+            self.frames['first'] = (timestamp, frame)
+        if motion_area > self.peak_motion_area:
+            self.peak_motion_area = motion_area
+            self.peak_time = timestamp
+            self.frames['peak'] = (timestamp, frame)
+        self.frames['last'] = (timestamp, frame)
+
+    def representative_frames(self, limit: int) -> List[tuple]:
+        """Distinct (role, timestamp, frame) picks, peak first"""
+        picked, seen = [], set()
+        for role in ('peak', 'first', 'last'):
+            if role in self.frames and id(self.frames[role][1]) not in seen:
+                seen.add(id(self.frames[role][1]))
+                picked.append((role,) + self.frames[role])
+        return picked[:limit]
+
+
+class MotionSessionTracker:
+    """Groups per-frame motion detections of one stream into sessions.
+
+    A session opens after ``start_frames`` consecutive frames above the
+    motion threshold, stays open while motion stays above the lower
+    ``release_ratio`` threshold and closes after ``cooldown`` seconds
+    without it. Sessions longer than ``max_session`` are split, so the
+    number of events written stays bounded however long motion lasts.
+    """
+
+    def __init__(self, start_frames: int = MOTION_START_FRAMES, cooldown: float = MOTION_COOLDOWN,
+                 max_session: float = MOTION_MAX_SESSION, release_ratio: float = 0.5):
+        self.start_frames = max(1, start_frames)
+        self.cooldown = cooldown
+        self.max_session = max_session
+        self.release_ratio = release_ratio
+        self.session: Optional[MotionSession] = None
+        self._pending: List[tuple] = []
+
+    def update(self, motion_area: int, motion_threshold: float, frame: np.ndarray,
+               timestamp: Optional[float] = None) -> Optional[MotionSession]:
+        """Feed one analyzed frame; returns a session when it closes"""
+        timestamp = timestamp if timestamp is not None else time.time()
+
+        if self.session is None:
+            if motion_area > motion_threshold:
+                self._pending.append((motion_area, frame, timestamp))
+                if len(self._pending) >= self.start_frames:
+                    self.session = MotionSession(self._pending[0][2])
+                    for area, pending_frame, pending_time in self._pending:
+                        self.session.observe(area, pending_frame, pending_time)
+                    self._pending = []
+            else:
+                self._pending = []
+            return None
+
+        finished = None
+        if motion_area > motion_threshold * self.release_ratio:
+            if timestamp - self.session.start_time >= self.max_session:
+                finished = self.session
+                self.session = MotionSession(timestamp)
+            self.session.observe(motion_area, frame, timestamp)
+        elif timestamp - self.session.last_motion >= self.cooldown:
+            finished = self.session
+            self.session = None
+        return finished
+
+    def tick(self, timestamp: Optional[float] = None) -> Optional[MotionSession]:
+        """Advance the clock when no frame arrived; returns a session whose cooldown ran out"""
+        timestamp = timestamp if timestamp is not None else time.time()
+        self._pending = []
+        if self.session is not None and timestamp - self.session.last_motion >= self.cooldown:
+            finished, self.session = self.session, None
+            return finished
+        return None
+
+    def close(self) -> Optional[MotionSession]:
+        """End the open session, e.g. when the stream stops"""
+        finished, self.session = self.session, None
+        self._pending = []
+        return finished
@@ -0,0 +1,142 @@
+import os
+import threading
+import logging
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# files: one JPEG per object clip; pack: clips are appended to per-stream,
+# per-hour pack files
+CLIP_STORAGE = os.getenv("CLIP_STORAGE", "files")
+PACK_SUFFIX = ".pack"
+INDEX_SUFFIX = ".idx"
+# Pack indexes kept parsed in memory for serving
+PACK_INDEX_CACHE = 64
+
+_append_lock = threading.Lock()
+_index_lock = threading.Lock()
+_indexes: OrderedDict = OrderedDict()
+
+
+def pack_entry_path(clips_dir: str, stream_id: int, name: str, when: Optional[datetime] = None) -> str:
+    """Path a clip stored in a pack is referred to by, e.g.
+    ``clips/packs/stream_1/2024010112.pack/<name>.jpg``"""
+    hour = (when or datetime.utcnow()).strftime("%Y%m%d%H")
+    return os.path.join(clips_dir, "packs", f"stream_{stream_id}", f"{hour}{PACK_SUFFIX}", name)
+
+
+def split_pack_entry(path: str) -> Optional[Tuple[str, str]]:
+    """(pack file, entry name) if ``path`` names a clip inside a pack"""
+    pack, name = os.path.split(path)
+    if pack.endswith(PACK_SUFFIX) and name:
+        return pack, name
+    return None
+
+
+def append_entry(path: str, data: bytes):
+    """Append ``data`` to its pack, then record it in the pack's index.
+
+    The index line is written after the data, so readers never find an
+    entry whose bytes are not there yet. Each stream is written by a single
+    process, so a lock in this process is enough to keep appends ordered.
+    """
+    pack, name = split_pack_entry(path)
+    with _append_lock:
+        os.makedirs(os.path.dirname(pack), exist_ok=True)
+        fd = os.open(pack, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        try:
+            offset = os.fstat(fd).st_size
+            os.write(fd, data)
+        finally:
+            os.close(fd)
+        with open(pack + INDEX_SUFFIX, "a") as index:
+            index.write(f"{name}\t{offset}\t{len(data)}\n")
+
+
+def lookup_entry(pack: str, name: str) -> Optional[Tuple[int, int]]:
+    """(offset, length) of ``name`` in ``pack``, from the pack's index"""
+    index_path = pack + INDEX_SUFFIX
+    try:
+        index_size = os.path.getsize(index_path)
+    except FileNotFoundError:
+        return None
+
+    with _index_lock:
+        cached = _indexes.get(index_path)
+        if cached:
+            _indexes.move_to_end(index_path)
+            if name in cached[1] or cached[0] == index_size:
+                return cached[1].get(name)
+
+    # Missing or stale (the index grew since it was read)
+    entries: Dict[str, Tuple[int, int]] = {}
+    with open(index_path) as index:
+        for line in index:
+            parts = line.rstrip("\n").split("\t")
+            if len(parts) == 3:
+                entries[parts[0]] = (int(parts[1]), int(parts[2]))
+    with _index_lock:
+        _indexes[index_path] = (index_size, entries)
+        while len(_indexes) > PACK_INDEX_CACHE:
+            _indexes.popitem(last=False)
+    return entries.get(name)
+
+
+def read_entry(pack: str, offset: int, length: int) -> bytes:
+    fd = os.open(pack, os.O_RDONLY)
+    try:
+        return os.pread(fd, length, offset)
+    finally:
+        os.close(fd)
+
+
+def list_packs(clips_dir: str) -> Iterator[Tuple[int, datetime, str]]:
+    """(stream_id, hour, pack path) of every pack under ``clips_dir``"""
+    root = os.path.join(clips_dir, "packs")
+    if not os.path.isdir(root):
+        return
+    for stream_dir in os.scandir(root):
+        if not (stream_dir.is_dir() and stream_dir.name.startswith("stream_")):
+            continue
+        try:
+            stream_id = int(stream_dir.name[len("stream_"):])
+        except ValueError:
+            continue
+        for entry in os.scandir(stream_dir.path):
+            if not entry.name.endswith(PACK_SUFFIX):
+                continue
+            try:
+                hour = datetime.strptime(entry.name[:-len(PACK_SUFFIX)], "%Y%m%d%H")
+            except ValueError:
+                continue
+            yield stream_id, hour, entry.path
+
+
+def remove_pack(pack: str) -> bool:
+    """Delete a pack and its index; True if the pack was there"""
+    removed = False
+    for path in (pack, pack + INDEX_SUFFIX):
+        try:
+            os.remove(path)
+            removed = removed or path == pack
+        except FileNotFoundError:
+            continue
+        except Exception as e:
+            logger.warning(f"Failed to delete pack file {path}: {e}")
+    with _index_lock:
+        _indexes.pop(pack + INDEX_SUFFIX, None)
+    try:
+        # Drop the stream's pack directory once its last pack is gone
+        os.rmdir(os.path.dirname(pack))
+    except OSError:
+        pass
+    return removed
+
+
+def remove_packs(paths: Iterable[str], keep: Iterable[str] = ()) -> int:
+    """Delete the packs holding ``paths`` whole, unless a path in ``keep`` is in them"""
+    packs = {entry[0] for entry in map(split_pack_entry, paths) if entry}
+    packs -= {entry[0] for entry in map(split_pack_entry, keep) if entry}
+    return sum(remove_pack(pack) for pack in packs)
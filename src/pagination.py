@@ -0,0 +1,57 @@
+import base64
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from sqlalchemy import and_, or_
+
+MAX_PAGE_SIZE = 1000
+
+
+def encode_cursor(timestamp: datetime, row_id: int) -> str:
+    raw = f"{timestamp.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Inverse of encode_cursor; raises ValueError for anything it did not produce"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        timestamp, row_id = base64.urlsafe_b64decode(padded.encode()).decode().split("|")
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except Exception:
+        raise ValueError(f"Invalid cursor: {cursor}")
+
+
+def after_cursor(query, time_column, id_column, cursor: Optional[str]):
+    """``query`` narrowed to rows strictly older than the cursor position"""
+    if not cursor:
+        return query
+    cursor_time, cursor_id = decode_cursor(cursor)
+    return query.filter(or_(
+        time_column < cursor_time,
+        and_(time_column == cursor_time, id_column < cursor_id)
+    ))
+
+
+def page_of(rows: List, limit: int, time_key: str, id_key: str) -> Tuple[List, Optional[str]]:
+    """First ``limit`` of ``rows`` (newest first, up to one extra) and the next cursor"""
+    if len(rows) <= limit:
+        return rows, None
+
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(getattr(last, time_key), getattr(last, id_key))
+
+
+def paginate(query, time_column, id_column, cursor: Optional[str] = None,
+             limit: int = MAX_PAGE_SIZE) -> Tuple[List, Optional[str]]:
+    """Newest-first keyset page of ``query`` ordered by (time, id).
+
+    Rows strictly older than the cursor position are returned, so a page
+    costs one index seek however deep it is. Returns the rows and the cursor
+    of the next page, or None when this was the last one.
+    """
+    query = after_cursor(query, time_column, id_column, cursor)
+    # Fetch one extra row to know whether another page exists
+    rows = query.order_by(time_column.desc(), id_column.desc()).limit(limit + 1).all()
+    return page_of(rows, limit, time_column.key, id_column.key)
@@ -0,0 +1,152 @@
+import os
+import threading
+import logging
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import Column, Index, MetaData, Table, inspect
+from sqlalchemy.schema import CreateIndex, CreateTable
+
+from .database import engine
+from .models import VideoAnalytics
+from .pagination import after_cursor, decode_cursor, page_of
+
+logger = logging.getLogger(__name__)
+
+# none: analytics rows go to video_analytics. daily: they go to one table per
+# UTC day, so reads only touch the days they cover and retention drops whole
+# tables instead of deleting rows
+ANALYTICS_PARTITIONING = os.getenv("ANALYTICS_PARTITIONING", "none")
+PARTITION_PREFIX = f"{VideoAnalytics.__tablename__}_p"
+
+
+def partition_name(day: date) -> str:
+    return f"{PARTITION_PREFIX}{day:%Y%m%d}"
+
+
+def day_bounds(day: date) -> Tuple[datetime, datetime]:
+    start = datetime(day.year, day.month, day.day)
+    return start, start + timedelta(days=1)
+
+
+class AnalyticsPartitions:
+    """Per-day tables holding raw analytics rows.
+
+    Partitions have the columns and the (stream_id, timestamp) index of
+    ``video_analytics`` and are created by the writer as rows for a new day
+    arrive. Reads always cover ``video_analytics`` too, so rows written
+    before partitioning was turned on (or after it was turned off) are
+    still found. ``analytics_id`` is unique within a partition; rows with
+    equal timestamps share a partition, so (timestamp, analytics_id) still
+    orders and pages every row.
+    """
+
+    def __init__(self, enabled: bool = ANALYTICS_PARTITIONING == 'daily'):
+        self.enabled = enabled
+        self.base = VideoAnalytics.__table__
+        self._metadata = MetaData()
+        self._tables: Dict[date, Table] = {}
+        self._lock = threading.Lock()
+
+    def table(self, day: date) -> Table:
+        """Table definition of the day's partition, whether or not it exists yet"""
+        with self._lock:
+            table = self._tables.get(day)
+            if table is None:
+                name = partition_name(day)
+                columns = [
+                    Column(column.name, column.type, primary_key=column.primary_key,
+                           default=column.default.arg if column.default is not None else None)
+                    for column in self.base.columns
+                ]
+                table = Table(name, self._metadata, *columns,
+                              Index(f"ix_{name}_stream_time", "stream_id", "timestamp"))
+                self._tables[day] = table
+            return table
+
+    def days(self) -> List[date]:
+        """Days with a partition in the database, oldest first"""
+        days = []
+        for name in inspect(engine).get_table_names():
+            if not name.startswith(PARTITION_PREFIX):
+                continue
+            try:
+                days.append(datetime.strptime(name[len(PARTITION_PREFIX):], "%Y%m%d").date())
+            except ValueError:
+                continue
+        return sorted(days)
+
+    def tables(self, start: Optional[datetime] = None, end: Optional[datetime] = None) -> List[Table]:
+        """Partitions overlapping [start, end], newest first, then ``video_analytics``"""
+        tables = []
+        for day in reversed(self.days()):
+            day_start, day_end = day_bounds(day)
+            if (start is None or day_end > start) and (end is None or day_start <= end):
+                tables.append(self.table(day))
+        return tables + [self.base]
+
+    def route(self, db, model, rows: List[Dict]) -> List[tuple]:
+        """(table, rows) to insert for queued rows of ``model``, creating partitions as needed.
+
+        Runs in the writer's transaction, so a partition is created together
+        with its first rows.
+        """
+        if not self.enabled or model is not VideoAnalytics:
+            return [(model, rows)]
+
+        by_day: Dict[date, List[Dict]] = {}
+        now = datetime.utcnow()
+        for row in rows:
+            by_day.setdefault((row.get('timestamp') or now).date(), []).append(row)
+
+        routed = []
+        for day, day_rows in by_day.items():
+            table = self.table(day)
+            # IF NOT EXISTS: several worker processes may reach a new day together
+            db.execute(CreateTable(table, if_not_exists=True))
+            for index in table.indexes:
+                db.execute(CreateIndex(index, if_not_exists=True))
+            routed.append((table, day_rows))
+        return routed
+
+    def drop(self, day: date):
+        """Drop a whole day of analytics at once"""
+        table = self.table(day)
+        table.drop(bind=engine, checkfirst=True)
+        with self._lock:
+            self._tables.pop(day, None)
+            self._metadata.remove(table)
+        logger.info(f"Dropped analytics partition {table.name}")
+
+    def page(self, db, stream_id: int, start_time: datetime, cursor: Optional[str],
+             limit: int) -> Tuple[List, Optional[str]]:
+        """Newest-first keyset page of a stream's analytics since ``start_time``.
+
+        Only partitions overlapping the window (and not newer than the
+        cursor) are queried, newest first, stopping once a page is full;
+        ``video_analytics`` is always merged in.
+        """
+        cursor_time = decode_cursor(cursor)[0] if cursor else None
+        rows = []
+        for table in self.tables(start_time, cursor_time):
+            if table is not self.base and len(rows) > limit:
+                # Every remaining partition is older than the rows already found
+                continue
+            query = db.query(table).filter(table.c.stream_id == stream_id, table.c.timestamp >= start_time)
+            query = after_cursor(query, table.c.timestamp, table.c.analytics_id, cursor)
+            rows += query.order_by(table.c.timestamp.desc(), table.c.analytics_id.desc()).limit(limit + 1).all()
+
+        rows.sort(key=lambda row: (row.timestamp, row.analytics_id), reverse=True)
+        return page_of(rows[:limit + 1], limit, 'timestamp', 'analytics_id')
+
+    def get_status(self) -> Dict:
+        days = self.days()
+        return {
+            'mode': 'daily' if self.enabled else 'none',
+            'partitions': len(days),
+            'oldest': days[0].isoformat() if days else None,
+            'newest': days[-1].isoformat() if days else None
+        }
+
+
+analytics_partitions = AnalyticsPartitions()
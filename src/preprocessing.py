@@ -0,0 +1,82 @@
+import os
+from typing import Dict, List, Union
+
+import cv2
+import numpy as np
+
+ANALYSIS_WIDTH = int(os.getenv("ANALYSIS_WIDTH", "640"))
+PYRAMID_LEVELS = 3
+
+
+class PreprocessedFrame:
+    """Per-frame cache of the derived images the detectors work on.
+
+    Everything is computed lazily, at most once per frame: the analysis-size
+    copy (frame downscaled to ``analysis_width``), its grayscale version and a
+    small grayscale pyramid below it. Detectors report coordinates and areas
+    at analysis scale; ``to_source_box`` and ``to_source_area`` map them back.
+    """
+
+    def __init__(self, frame: np.ndarray, analysis_width: int = ANALYSIS_WIDTH):
+        self.frame = frame
+        self.height, self.width = frame.shape[:2]
+        if analysis_width and self.width > analysis_width:
+            self.scale = analysis_width / self.width
+        else:
+            self.scale = 1.0
+        self._cache: Dict[str, object] = {}
+
+    @property
+    def analysis(self) -> np.ndarray:
+        """BGR frame at analysis resolution"""
+        if 'analysis' not in self._cache:
+            if self.scale == 1.0:
+                self._cache['analysis'] = self.frame
+            else:
+                size = (int(round(self.width * self.scale)), int(round(self.height * self.scale)))
+                self._cache['analysis'] = cv2.resize(self.frame, size, interpolation=cv2.INTER_AREA)
+        return self._cache['analysis']
+
+    @property
+    def analysis_gray(self) -> np.ndarray:
+        """Grayscale frame at analysis resolution"""
+        if 'analysis_gray' not in self._cache:
+            self._cache['analysis_gray'] = cv2.cvtColor(self.analysis, cv2.COLOR_BGR2GRAY)
+        return self._cache['analysis_gray']
+
+    @property
+    def pyramid(self) -> List[np.ndarray]:
+        """Grayscale pyramid starting at analysis resolution, each level half the previous"""
+        if 'pyramid' not in self._cache:
+            levels = [self.analysis_gray]
+            for _ in range(PYRAMID_LEVELS - 1):
+                if min(levels[-1].shape[:2]) < 64:
+                    break
+                levels.append(cv2.pyrDown(levels[-1]))
+            self._cache['pyramid'] = levels
+        return self._cache['pyramid']
+
+    def level_scale(self, level: int) -> float:
+        """Scale of a pyramid level relative to the source frame"""
+        return self.scale / (2 ** level)
+
+    def to_source_box(self, x, y, w, h, level: int = 0) -> Dict[str, int]:
+        scale = self.level_scale(level)
+        sx = int(round(x / scale))
+        sy = int(round(y / scale))
+        sw = int(round(w / scale))
+        sh = int(round(h / scale))
+        # Keep the box inside the source frame after rounding
+        sw = max(1, min(sw, self.width - sx))
+        sh = max(1, min(sh, self.height - sy))
+        return {'x': sx, 'y': sy, 'w': sw, 'h': sh}
+
+    def to_source_area(self, area: float, level: int = 0) -> int:
+        scale = self.level_scale(level)
+        return int(area / (scale * scale))
+
+
+def preprocess(frame: Union[np.ndarray, PreprocessedFrame], analysis_width: int = ANALYSIS_WIDTH) -> PreprocessedFrame:
+    if isinstance(frame, PreprocessedFrame):
+        return frame
+    return PreprocessedFrame(frame, analysis_width)
@@ -0,0 +1,141 @@
+import asyncio
+import itertools
+import json
+import threading
+import logging
+from collections import OrderedDict
+from datetime import datetime
+from typing import AsyncIterator, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+TOPICS = ('streams', 'events', 'analytics', 'metrics', 'summary')
+MAX_PENDING_MESSAGES = 500
+HEARTBEAT_INTERVAL = 15.0
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def sse_message(topic: str, data) -> bytes:
+    return f"event: {topic}\ndata: {json.dumps(data, default=_json_default)}\n\n".encode()
+
+
+class _Subscriber:
+    """Pending messages of one client, coalesced while it is not reading.
+
+    Messages published with a key replace the undelivered message with the
+    same (topic, key), so a slow client only ever gets the newest state.
+    Keyless messages (new events) queue up to ``max_pending``; beyond that
+    the oldest are dropped and the client is told to resync.
+    """
+
+    def __init__(self, topics: Iterable[str], max_pending: int):
+        self.topics = set(topics)
+        self.max_pending = max_pending
+        self.loop = asyncio.get_running_loop()
+        self.event = asyncio.Event()
+        self.dropped = 0
+        self._pending: OrderedDict = OrderedDict()
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+
+    def offer(self, topic: str, data, key=None):
+        with self._lock:
+            if key is not None:
+                slot = (topic, key)
+                self._pending.pop(slot, None)
+            else:
+                slot = (topic, None, next(self._sequence))
+            self._pending[slot] = (topic, data)
+            while len(self._pending) > self.max_pending:
+                self._pending.popitem(last=False)
+                self.dropped += 1
+        self.wake()
+
+    def wake(self):
+        try:
+            self.loop.call_soon_threadsafe(self.event.set)
+        except RuntimeError:
+            # Event loop already closed; the subscriber is gone
+            pass
+
+    def drain(self):
+        with self._lock:
+            messages = list(self._pending.values())
+            self._pending.clear()
+            dropped, self.dropped = self.dropped, 0
+        return messages, dropped
+
+
+class PubSubHub:
+    """In-process topic hub pushing stream state, events, analytics and metrics to clients.
+
+    ``publish`` may be called from any thread and never blocks on clients;
+    delivery happens on each subscriber's event loop.
+    """
+
+    def __init__(self, max_pending: int = MAX_PENDING_MESSAGES):
+        self.max_pending = max_pending
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self.published = 0
+        self.closed = False
+
+    def has_subscribers(self, topic: Optional[str] = None) -> bool:
+        with self._lock:
+            return any(topic is None or topic in s.topics for s in self._subscribers)
+
+    def publish(self, topic: str, data, key=None):
+        with self._lock:
+            subscribers = [s for s in self._subscribers if topic in s.topics]
+        self.published += 1
+        for subscriber in subscribers:
+            subscriber.offer(topic, data, key)
+
+    def close(self):
+        """End every subscription, e.g. on shutdown so open connections do not hold it up"""
+        with self._lock:
+            self.closed = True
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            subscriber.wake()
+
+    def get_status(self) -> Dict:
+        with self._lock:
+            subscribers = list(self._subscribers)
+        topics = {topic: len([s for s in subscribers if topic in s.topics]) for topic in TOPICS}
+        return {'subscribers': len(subscribers), 'topics': topics, 'published': self.published}
+
+    async def subscribe(self, topics: Iterable[str], heartbeat: float = HEARTBEAT_INTERVAL) -> AsyncIterator[bytes]:
+        """Yield server-sent event chunks for the given topics until the client leaves"""
+        subscriber = _Subscriber(topics, self.max_pending)
+        with self._lock:
+            self._subscribers.add(subscriber)
+        logger.info(f"Push subscriber joined ({', '.join(sorted(subscriber.topics))})")
+
+        try:
+            yield sse_message('hello', {'topics': sorted(subscriber.topics)})
+            while not self.closed:
+                try:
+                    await asyncio.wait_for(subscriber.event.wait(), timeout=heartbeat)
+                except asyncio.TimeoutError:
+                    # Comment line; keeps proxies from closing an idle connection
+                    yield b": keepalive\n\n"
+                    continue
+                subscriber.event.clear()
+                if self.closed:
+                    break
+
+                messages, dropped = subscriber.drain()
+                if dropped:
+                    yield sse_message('resync', {'dropped': dropped})
+                for topic, data in messages:
+                    yield sse_message(topic, data)
+        finally:
+            with self._lock:
+                self._subscribers.discard(subscriber)
+            logger.info("Push subscriber left")
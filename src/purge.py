@@ -0,0 +1,432 @@
+import os
+import threading
+import time
+import logging
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import delete, func, select, tuple_
+
+from .database import SessionLocal
+from .models import (
+    VideoStream, VideoEvent, VideoAnalytics, SystemMetrics, AnalyticsMinutely, AnalyticsHourly, PurgeJob
+)
+from .artifacts import event_files, remove_event_files
+from .packs import list_packs, remove_pack, split_pack_entry
+from .partitions import analytics_partitions, day_bounds
+from .motion_session import MOTION_COOLDOWN, MOTION_MAX_SESSION
+from .recorder import RECORDING_MAX_SECONDS
+from .video_processor import CLIPS_DIR
+
+logger = logging.getLogger(__name__)
+
+# Days of data kept per table; 0 keeps it forever. A stream's own
+# retention_days replaces the events and analytics windows for that stream.
+RETENTION_DAYS = {
+    'events': float(os.getenv("RETENTION_EVENTS_DAYS", "30")),
+    'analytics': float(os.getenv("RETENTION_ANALYTICS_DAYS", "90")),
+    'analytics_minutely': float(os.getenv("RETENTION_MINUTELY_DAYS", "30")),
+    'analytics_hourly': float(os.getenv("RETENTION_HOURLY_DAYS", "365")),
+    'system_metrics': float(os.getenv("RETENTION_METRICS_DAYS", "7")),
+}
+PURGE_INTERVAL = float(os.getenv("PURGE_INTERVAL", "600"))
+PURGE_BATCH_SIZE = int(os.getenv("PURGE_BATCH_SIZE", "500"))
+# I/O budget: the purge thread sleeps between chunks to stay under these
+PURGE_ROWS_PER_SEC = float(os.getenv("PURGE_ROWS_PER_SEC", "5000"))
+PURGE_FILES_PER_SEC = float(os.getenv("PURGE_FILES_PER_SEC", "200"))
+MAX_FINISHED_JOBS = 50
+# Jobs still to run; an interrupted one resumes where the deletes left off
+UNFINISHED = ('queued', 'running', 'interrupted')
+JOB_FIELDS = ('job_id', 'kind', 'stream_id', 'status', 'total', 'deleted', 'error',
+              'created_at', 'started_at', 'finished_at')
+# Events this far apart can share a saved frame (a motion session and the
+# object tracks that started during it) or a recorded clip
+ARTIFACT_SHARING_WINDOW = timedelta(seconds=max(MOTION_MAX_SESSION + MOTION_COOLDOWN, RECORDING_MAX_SECONDS))
+
+# name -> (model, time column, follows per-stream retention)
+TABLES = OrderedDict([
+    ('events', (VideoEvent, VideoEvent.event_time, True)),
+    ('analytics', (VideoAnalytics, VideoAnalytics.timestamp, True)),
+    ('analytics_minutely', (AnalyticsMinutely, AnalyticsMinutely.bucket_start, False)),
+    ('analytics_hourly', (AnalyticsHourly, AnalyticsHourly.bucket_start, False)),
+    ('system_metrics', (SystemMetrics, SystemMetrics.timestamp, False)),
+])
+
+
+class PurgeInterrupted(Exception):
+    pass
+
+
+class PurgeEngine:
+    """Background thread that deletes old rows and their files in small chunks.
+
+    Runs queued stream deletions first and a retention pass every
+    ``interval`` seconds otherwise. Every chunk is its own transaction, and
+    the thread sleeps between chunks to stay within the rows-per-second and
+    files-per-second budget, so neither the database nor the disk is tied
+    up for long. Deletion jobs are kept in ``purge_jobs``; ``start`` queues
+    again any that a restart cut short, so a half-deleted stream stays
+    hidden and is finished off.
+    """
+
+    def __init__(self, on_stream_deleted: Optional[Callable[[int], None]] = None,
+                 interval: float = PURGE_INTERVAL, batch_size: int = PURGE_BATCH_SIZE,
+                 prepare_stream: Optional[Callable[[int], None]] = None):
+        # Called before a stream's rows are counted; stops the stream and
+        # waits until its queued events, images and clips are written
+        self.prepare_stream = prepare_stream
+        self.on_stream_deleted = on_stream_deleted
+        self.interval = interval
+        self.batch_size = batch_size
+        self.running = False
+        self._thread = None
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+        self._queue = deque()
+        self._jobs: OrderedDict = OrderedDict()
+        self._next_pass = time.time() + 60
+        self.last_pass: Optional[Dict] = None
+        self.deleted_rows = 0
+        self.deleted_files = 0
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._load_jobs()
+        self.running = True
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="purge", daemon=True)
+        self._thread.start()
+        logger.info("Purge engine started")
+
+    def stop(self, timeout: float = 10):
+        self.running = False
+        self._stopping.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout=timeout)
+        logger.info("Purge engine stopped")
+
+    def delete_stream(self, stream_id: int) -> Dict:
+        """Queue deletion of a stream with all its rows and files"""
+        with self._lock:
+            for job in self._jobs.values():
+                if job['stream_id'] == stream_id and job['status'] in UNFINISHED:
+                    return dict(job)
+            # Stored before it is queued, so the stream stays hidden across a restart
+            db = SessionLocal()
+            try:
+                row = PurgeJob(kind='delete_stream', stream_id=stream_id, status='queued',
+                               total={}, deleted={}, created_at=datetime.utcnow())
+                db.add(row)
+                db.commit()
+                job = {field: getattr(row, field) for field in JOB_FIELDS}
+            finally:
+                db.close()
+            self._jobs[job['job_id']] = job
+            self._queue.append(job)
+            self._trim_jobs()
+        self._wake.set()
+        return dict(job)
+
+    def run_retention_now(self):
+        self._next_pass = 0
+        self._wake.set()
+
+    def deleting_streams(self) -> List[int]:
+        with self._lock:
+            return [job['stream_id'] for job in self._jobs.values() if job['status'] in UNFINISHED]
+
+    def get_job(self, job_id: int) -> Optional[Dict]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job, total=dict(job['total']), deleted=dict(job['deleted'])) if job else None
+
+    def list_jobs(self) -> List[Dict]:
+        with self._lock:
+            ids = list(self._jobs)
+        return [job for job in map(self.get_job, reversed(ids)) if job]
+
+    def get_status(self) -> Dict:
+        with self._lock:
+            queued = len(self._queue)
+        return {
+            'running': self.running,
+            'retention_days': RETENTION_DAYS,
+            'interval_s': self.interval,
+            'batch_size': self.batch_size,
+            'rows_per_sec_budget': PURGE_ROWS_PER_SEC,
+            'files_per_sec_budget': PURGE_FILES_PER_SEC,
+            'queued_jobs': queued,
+            'deleted_rows': self.deleted_rows,
+            'deleted_files': self.deleted_files,
+            'last_pass': self.last_pass
+        }
+
+    def _trim_jobs(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job['status'] not in UNFINISHED]
+        for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self._jobs[job_id]
+
+    def _load_jobs(self):
+        """Reload stored jobs, queueing the unfinished ones again in their original order"""
+        db = SessionLocal()
+        try:
+            unfinished = db.query(PurgeJob).filter(PurgeJob.status.in_(UNFINISHED))
+            finished = db.query(PurgeJob).filter(PurgeJob.status.notin_(UNFINISHED)).order_by(
+                PurgeJob.job_id.desc()).limit(MAX_FINISHED_JOBS)
+            rows = sorted(list(unfinished) + list(finished), key=lambda row: row.job_id)
+            jobs = [{field: getattr(row, field) for field in JOB_FIELDS} for row in rows]
+        finally:
+            db.close()
+        for job in jobs:
+            job['total'] = dict(job['total'] or {})
+            job['deleted'] = dict(job['deleted'] or {})
+
+        with self._lock:
+            self._jobs = OrderedDict((job['job_id'], job) for job in jobs)
+            self._queue = deque(job for job in jobs if job['status'] in UNFINISHED)
+            for job in self._queue:
+                job['status'] = 'queued'
+                logger.info(f"Resuming purge job {job['job_id']} (delete stream {job['stream_id']})")
+
+    def _save_job(self, job: Dict):
+        db = SessionLocal()
+        try:
+            db.query(PurgeJob).filter(PurgeJob.job_id == job['job_id']).update({
+                field: dict(job[field]) if field in ('total', 'deleted') else job[field]
+                for field in JOB_FIELDS if field != 'job_id'
+            }, synchronize_session=False)
+            if job['status'] not in UNFINISHED:
+                kept = select(PurgeJob.job_id).where(PurgeJob.status.notin_(UNFINISHED)).order_by(
+                    PurgeJob.job_id.desc()).limit(MAX_FINISHED_JOBS)
+                db.query(PurgeJob).filter(PurgeJob.status.notin_(UNFINISHED), PurgeJob.job_id.notin_(kept)).delete(
+                    synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+    def _run(self):
+        while self.running:
+            with self._lock:
+                job = self._queue.popleft() if self._queue else None
+            try:
+                if job:
+                    self._run_job(job)
+                elif time.time() >= self._next_pass:
+                    self._retention_pass()
+                    self._next_pass = time.time() + self.interval
+                else:
+                    self._wake.wait(timeout=max(0.1, min(self._next_pass - time.time(), 5.0)))
+                    self._wake.clear()
+            except PurgeInterrupted:
+                break
+            except Exception as e:
+                logger.error(f"Purge engine error: {e}")
+                self._next_pass = time.time() + self.interval
+
+    def _run_job(self, job: Dict):
+        stream_id = job['stream_id']
+        job['status'] = 'running'
+        job['started_at'] = job['started_at'] or datetime.utcnow()
+        self._save_job(job)
+        try:
+            if self.prepare_stream:
+                self.prepare_stream(stream_id)
+            self._check_running()
+            db = SessionLocal()
+            try:
+                for name in ('events', 'analytics', 'analytics_minutely', 'analytics_hourly'):
+                    # A resumed job adds what it deleted before the restart
+                    job['total'][name] = job['deleted'].get(name, 0) + sum(
+                        db.query(func.count()).select_from(table).filter(table.c.stream_id == stream_id).scalar()
+                        for table in self._tables(name)
+                    )
+            finally:
+                db.close()
+            self._save_job(job)
+
+            progress = job['deleted']
+            # The whole stream goes, so no row outside the job can share its files
+            self._purge_events([VideoEvent.stream_id == stream_id], progress, keep_shared=False)
+            for name in ('analytics', 'analytics_minutely', 'analytics_hourly'):
+                for table in self._tables(name):
+                    self._purge_rows(name, table, [table.c.stream_id == stream_id], progress)
+            # Crops no event row pointed at any more
+            for pack_stream, _, pack in list(list_packs(CLIPS_DIR)):
+                if pack_stream == stream_id and remove_pack(pack):
+                    progress['clips'] = progress.get('clips', 0) + 1
+
+            db = SessionLocal()
+            try:
+                db.query(VideoStream).filter(VideoStream.stream_id == stream_id).delete()
+                db.commit()
+            finally:
+                db.close()
+
+            job['status'] = 'done'
+            logger.info(f"Stream {stream_id} deleted: {progress}")
+            if self.on_stream_deleted:
+                self.on_stream_deleted(stream_id)
+        except PurgeInterrupted:
+            job['status'] = 'interrupted'
+            raise
+        except Exception as e:
+            job['status'] = 'failed'
+            job['error'] = str(e)
+            logger.error(f"Error deleting stream {stream_id}: {e}")
+        finally:
+            if job['status'] != 'interrupted':
+                job['finished_at'] = datetime.utcnow()
+            self._save_job(job)
+            with self._lock:
+                self._trim_jobs()
+
+    def _retention_pass(self):
+        started = time.time()
+        progress: Dict[str, int] = {}
+        db = SessionLocal()
+        try:
+            overrides = dict(db.query(VideoStream.stream_id, VideoStream.retention_days).filter(
+                VideoStream.retention_days.isnot(None)
+            ).all())
+        finally:
+            db.close()
+
+        now = datetime.utcnow()
+        self._drop_partitions(overrides, now, progress)
+        for name, (_, time_column, per_stream) in TABLES.items():
+            days_by_stream = overrides if per_stream else {}
+            windows = [days for days in [RETENTION_DAYS[name], *days_by_stream.values()] if days and days > 0]
+            if not windows:
+                continue
+            # Only tables (partitions) holding rows past the shortest window
+            for table in self._tables(name, end=now - timedelta(days=min(windows))):
+                filtered = [(days, [table.c.stream_id == stream_id]) for stream_id, days in days_by_stream.items()]
+                others = [table.c.stream_id.notin_(list(days_by_stream))] if days_by_stream else []
+                filtered.append((RETENTION_DAYS[name], others))
+
+                for days, filters in filtered:
+                    if not days or days <= 0:
+                        continue
+                    filters = filters + [table.c[time_column.key] < now - timedelta(days=days)]
+                    if name == 'events':
+                        self._purge_events(filters, progress, keep_shared=True)
+                    else:
+                        self._purge_rows(name, table, filters, progress)
+
+        # Packed crops go a whole hour at a time, once the hour has expired
+        for stream_id, hour, pack in list(list_packs(CLIPS_DIR)):
+            days = overrides.get(stream_id, RETENTION_DAYS['events'])
+            if days and days > 0 and hour + timedelta(hours=1) < now - timedelta(days=days):
+                if remove_pack(pack):
+                    progress['clips'] = progress.get('clips', 0) + 1
+
+        self.last_pass = {
+            'finished_at': datetime.utcnow(),
+            'duration_s': round(time.time() - started, 1),
+            'deleted': progress
+        }
+        if any(progress.values()):
+            logger.info(f"Retention pass deleted {progress}")
+
+    def _tables(self, name: str, end: Optional[datetime] = None) -> List:
+        """Tables holding a kind of row; analytics may be split into day partitions"""
+        if name == 'analytics':
+            return analytics_partitions.tables(end=end)
+        return [TABLES[name][0].__table__]
+
+    def _drop_partitions(self, overrides: Dict[int, float], now: datetime, progress: Dict[str, int]):
+        """Drop analytics partitions that every stream's retention window has passed"""
+        windows = [RETENTION_DAYS['analytics'], *overrides.values()]
+        if not all(days and days > 0 for days in windows):
+            return
+        cutoff = now - timedelta(days=max(windows))
+        for day in analytics_partitions.days():
+            self._check_running()
+            if day_bounds(day)[1] <= cutoff:
+                analytics_partitions.drop(day)
+                progress['analytics_partitions'] = progress.get('analytics_partitions', 0) + 1
+
+    def _purge_rows(self, name: str, table, filters: List, progress: Dict[str, int]):
+        """Delete matching rows ``batch_size`` at a time"""
+        primary_key = list(table.primary_key.columns)
+        while True:
+            self._check_running()
+            started = time.time()
+            db = SessionLocal()
+            try:
+                keys = db.execute(select(*primary_key).where(*filters).limit(self.batch_size)).all()
+                if not keys:
+                    return
+                if len(primary_key) == 1:
+                    condition = primary_key[0].in_([key[0] for key in keys])
+                else:
+                    condition = tuple_(*primary_key).in_([tuple(key) for key in keys])
+                db.execute(delete(table).where(condition))
+                db.commit()
+            finally:
+                db.close()
+            progress[name] = progress.get(name, 0) + len(keys)
+            self.deleted_rows += len(keys)
+            self._throttle(started, len(keys), 0)
+
+    def _purge_events(self, filters: List, progress: Dict[str, int], keep_shared: bool):
+        """Delete matching events oldest first, with the files only they reference"""
+        while True:
+            self._check_running()
+            started = time.time()
+            db = SessionLocal()
+            try:
+                events = db.query(
+                    VideoEvent.event_id, VideoEvent.stream_id, VideoEvent.event_time,
+                    VideoEvent.frame_path, VideoEvent.clip_path, VideoEvent.video_path, VideoEvent.event_metadata
+                ).filter(*filters).order_by(VideoEvent.event_time).limit(self.batch_size).all()
+                if not events:
+                    return
+                event_ids = [event.event_id for event in events]
+                keep = self._shared_files(db, events, event_ids) if keep_shared else set()
+                db.query(VideoEvent).filter(VideoEvent.event_id.in_(event_ids)).delete(synchronize_session=False)
+                db.commit()
+            finally:
+                db.close()
+
+            # Rows go first: a file left behind by a failure is only wasted
+            # space, a row pointing at a deleted file is a broken event
+            deleted = remove_event_files(events, keep)
+            for kind, count in deleted.items():
+                progress[kind] = progress.get(kind, 0) + count
+            progress['events'] = progress.get('events', 0) + len(events)
+            self.deleted_rows += len(events)
+            self.deleted_files += sum(deleted.values())
+            self._throttle(started, len(events), sum(deleted.values()))
+
+    def _shared_files(self, db, events, event_ids: List[int]) -> set:
+        """Files of ``events`` that surviving events still reference"""
+        stream_ids = {event.stream_id for event in events}
+        times = [event.event_time for event in events if event.event_time]
+        neighbours = db.query(
+            VideoEvent.frame_path, VideoEvent.clip_path, VideoEvent.video_path, VideoEvent.event_metadata
+        ).filter(
+            VideoEvent.stream_id.in_(stream_ids),
+            VideoEvent.event_time >= min(times) - ARTIFACT_SHARING_WINDOW,
+            VideoEvent.event_time <= max(times) + ARTIFACT_SHARING_WINDOW,
+            VideoEvent.event_id.notin_(event_ids)
+        ).all() if times else []
+        keep = {path for row in neighbours for paths in event_files(row).values() for path in paths}
+        # Packed crops expire with their pack file, by age
+        keep.update(event.clip_path for event in events if event.clip_path and split_pack_entry(event.clip_path))
+        return keep
+
+    def _throttle(self, started: float, rows: int, files: int):
+        budget = rows / PURGE_ROWS_PER_SEC + files / PURGE_FILES_PER_SEC
+        remaining = budget - (time.time() - started)
+        if remaining > 0:
+            self._stopping.wait(timeout=remaining)
+            self._check_running()
+
+    def _check_running(self):
+        if not self.running:
+            raise PurgeInterrupted()
@@ -0,0 +1,317 @@
+import os
+import time
+import tempfile
+import threading
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Seconds of video recorded before and after an event; both 0 disables recording
+RECORDING_PRE_SECONDS = float(os.getenv("RECORDING_PRE_SECONDS", "5"))
+RECORDING_POST_SECONDS = float(os.getenv("RECORDING_POST_SECONDS", "5"))
+# Events during a recording extend it, up to this length
+RECORDING_MAX_SECONDS = float(os.getenv("RECORDING_MAX_SECONDS", "60"))
+RECORDING_FPS = float(os.getenv("RECORDING_FPS", "10"))
+# Frames wider than this are downscaled before they are buffered; 0 keeps them
+RECORDING_WIDTH = int(os.getenv("RECORDING_WIDTH", "640"))
+RECORDING_JPEG_QUALITY = int(os.getenv("RECORDING_JPEG_QUALITY", "70"))
+# Encoded frames held in memory per stream, pre-roll and recording in progress together
+RECORDING_BUFFER_MB = float(os.getenv("RECORDING_BUFFER_MB", "32"))
+# auto (H.264 MP4 when OpenCV can encode it, VP8 WebM otherwise), mp4, webm or avi (MJPEG)
+RECORDING_FORMAT = os.getenv("RECORDING_FORMAT", "auto")
+RECORDING_THREADS = int(os.getenv("RECORDING_THREADS", "1"))
+RECORDINGS_DIR = os.getenv("RECORDINGS_DIR", "recordings")
+
+# format -> (extension, codecs to try in order). Browsers play H.264 MP4 and
+# VP8 WebM; with mp4, OpenCV builds without an H.264 encoder (the pip wheels)
+# fall back to MPEG-4 part 2, which browsers do not play
+FORMATS = {
+    'mp4': ('.mp4', ['avc1', 'mp4v']),
+    'webm': ('.webm', ['VP80']),
+    'avi': ('.avi', ['MJPG']),
+}
+
+
+def can_encode(extension: str, codec: str) -> bool:
+    """Whether this OpenCV build can write ``codec`` into a ``extension`` file"""
+    fd, path = tempfile.mkstemp(suffix=extension)
+    os.close(fd)
+    try:
+        writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*codec), 10, (64, 64))
+        opened = writer.isOpened()
+        writer.release()
+        return opened
+    finally:
+        os.remove(path)
+
+
+def resolve_format(fmt: str) -> str:
+    """The configured format, with ``auto`` resolved to one browsers can play"""
+    if fmt in FORMATS:
+        return fmt
+    if fmt != 'auto':
+        logger.warning(f"Unknown RECORDING_FORMAT {fmt}; choosing one automatically")
+    return 'mp4' if can_encode('.mp4', 'avc1') else 'webm'
+
+
+class _StreamBuffer:
+    """Encoded recent frames of one stream and the recording being cut from them"""
+
+    def __init__(self, stream_id: int):
+        self.stream_id = stream_id
+        self.frames = deque()
+        self.bytes = 0
+        self.last_time = 0.0
+        # {'path', 'start', 'end'} while a clip is being recorded
+        self.recording: Optional[Dict] = None
+
+
+class ClipRecorder:
+    """Pre/post-event video clips cut from a per-stream ring buffer of JPEG frames.
+
+    Capture hands every stream's frames to ``add_frame``, which keeps up to
+    ``fps`` of them per second, downscaled and JPEG-encoded, for the last
+    ``pre_seconds``. ``trigger`` starts a clip reaching back over that
+    pre-roll and returns its path at once; the clip is written on a
+    background thread ``post_seconds`` after the last trigger (or at
+    ``max_seconds``), to a temporary name renamed into place. Triggers
+    during a clip extend it and share its path. Each stream's buffer,
+    recording in progress included, stays under ``max_bytes``; a clip that
+    would need more is cut short.
+    """
+
+    def __init__(self, root: str = RECORDINGS_DIR, pre_seconds: float = RECORDING_PRE_SECONDS,
+                 post_seconds: float = RECORDING_POST_SECONDS, max_seconds: float = RECORDING_MAX_SECONDS,
+                 fps: float = RECORDING_FPS, max_bytes: int = int(RECORDING_BUFFER_MB * 1024 * 1024),
+                 fmt: str = RECORDING_FORMAT, threads: int = RECORDING_THREADS):
+        self.root = root
+        self.pre_seconds = pre_seconds
+        self.post_seconds = post_seconds
+        self.max_seconds = max_seconds
+        self.fps = fps
+        # Slightly under the nominal interval, so jitter in capture times
+        # does not skip every other frame that is due
+        self.interval = 0.9 / fps if fps > 0 else 0.0
+        self.max_bytes = max_bytes
+        self.enabled = fps > 0 and (pre_seconds > 0 or post_seconds > 0)
+        self.format = resolve_format(fmt) if self.enabled else fmt
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="recorder")
+        self._streams: Dict[int, _StreamBuffer] = {}
+        # stream id -> clip writes submitted and not finished yet
+        self._writes: Dict[int, set] = {}
+        self._lock = threading.Lock()
+        self._codec: Optional[str] = None
+
+        self.clips_started = 0
+        self.clips_written = 0
+        self.clips_truncated = 0
+        self.failed = 0
+        self.avg_write_ms = 0.0
+
+    def wants_frame(self, stream_id: int) -> bool:
+        """Whether capture should decode a frame it would otherwise skip"""
+        if not self.enabled:
+            return False
+        state = self._streams.get(stream_id)
+        return state is None or time.time() - state.last_time >= self.interval
+
+    def add_frame(self, stream_id: int, frame: np.ndarray, timestamp: Optional[float] = None):
+        """Buffer a captured frame, at most ``fps`` per second"""
+        if not self.enabled:
+            return
+        timestamp = timestamp if timestamp is not None else time.time()
+        with self._lock:
+            state = self._streams.setdefault(stream_id, _StreamBuffer(stream_id))
+            if timestamp - state.last_time < self.interval:
+                return
+            # Claim the slot before encoding, outside the lock
+            state.last_time = timestamp
+
+        data = self._encode(frame)
+        if data is None:
+            return
+        with self._lock:
+            state = self._streams.get(stream_id)
+            if state is None:
+                return
+            state.frames.append((timestamp, data))
+            state.bytes += len(data)
+            recording = state.recording
+            if recording and (timestamp >= recording['end'] or timestamp - recording['start'] >= self.max_seconds):
+                self._finish(state)
+            self._trim(state, timestamp)
+
+    def trigger(self, stream_id: int, timestamp: Optional[float] = None) -> Optional[str]:
+        """Record from ``pre_seconds`` ago until ``post_seconds`` from now; returns the clip's path"""
+        if not self.enabled:
+            return None
+        timestamp = timestamp if timestamp is not None else time.time()
+        with self._lock:
+            state = self._streams.setdefault(stream_id, _StreamBuffer(stream_id))
+            recording = state.recording
+            if recording is None:
+                extension = FORMATS[self.format][0]
+                name = f"{datetime.utcfromtimestamp(timestamp):%Y%m%d_%H%M%S_%f}{extension}"
+                recording = state.recording = {
+                    'path': os.path.join(self.root, f"stream_{stream_id}", name),
+                    'start': timestamp - self.pre_seconds,
+                    'end': timestamp
+                }
+                self.clips_started += 1
+            recording['end'] = max(recording['end'], min(timestamp + self.post_seconds,
+                                                         recording['start'] + self.max_seconds))
+            return recording['path']
+
+    def tick(self, stream_id: int, timestamp: Optional[float] = None):
+        """Finish a clip whose post-roll has passed when no frame arrives to do it"""
+        timestamp = timestamp if timestamp is not None else time.time()
+        with self._lock:
+            state = self._streams.get(stream_id)
+            recording = state.recording if state else None
+            if recording and (timestamp >= recording['end'] or timestamp - recording['start'] >= self.max_seconds):
+                self._finish(state)
+
+    def flush_stream(self, stream_id: int):
+        """Write the stream's clip in progress with what it has and drop its buffer"""
+        with self._lock:
+            state = self._streams.pop(stream_id, None)
+            if state and state.recording:
+                self._finish(state)
+
+    def drain_stream(self, stream_id: int, timeout: float = 30) -> bool:
+        """Flush the stream and wait until its clips are on disk; False on timeout"""
+        self.flush_stream(stream_id)
+        with self._lock:
+            writes = list(self._writes.get(stream_id, ()))
+        done = not wait(writes, timeout=timeout).not_done
+        with self._lock:
+            if not self._writes.get(stream_id):
+                self._writes.pop(stream_id, None)
+        return done
+
+    def _encode(self, frame: np.ndarray) -> Optional[bytes]:
+        try:
+            height, width = frame.shape[:2]
+            if RECORDING_WIDTH and width > RECORDING_WIDTH:
+                frame = cv2.resize(frame, (RECORDING_WIDTH, max(1, round(height * RECORDING_WIDTH / width))),
+                                   interpolation=cv2.INTER_AREA)
+            ok, encoded = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, RECORDING_JPEG_QUALITY])
+            return encoded.tobytes() if ok else None
+        except Exception as e:
+            logger.error(f"Error buffering frame for recording: {e}")
+            return None
+
+    def _trim(self, state: _StreamBuffer, now: float):
+        """Drop frames nothing needs any more; caller holds the lock"""
+        keep_from = now - self.pre_seconds
+        if state.recording:
+            keep_from = min(keep_from, state.recording['start'])
+        while state.frames and state.frames[0][0] < keep_from:
+            state.bytes -= len(state.frames.popleft()[1])
+        while state.frames and state.bytes > self.max_bytes:
+            if state.recording:
+                # Over budget mid-clip: keep what was recorded rather than lose its start
+                self.clips_truncated += 1
+                logger.warning(f"Recording {state.recording['path']} cut short at the buffer limit")
+                self._finish(state)
+            state.bytes -= len(state.frames.popleft()[1])
+
+    def _finish(self, state: _StreamBuffer):
+        """Hand the clip in progress to a writer thread; caller holds the lock"""
+        recording, state.recording = state.recording, None
+        frames = [(t, data) for t, data in state.frames if recording['start'] <= t <= recording['end']]
+        try:
+            future = self.executor.submit(self._write, recording['path'], frames)
+            writes = self._writes.setdefault(state.stream_id, set())
+            writes.add(future)
+            future.add_done_callback(lambda f, stream_id=state.stream_id: self._written(stream_id, f))
+        except RuntimeError:
+            # Shutting down: write on this thread rather than lose the clip
+            self._write(recording['path'], frames)
+
+    def _written(self, stream_id: int, future):
+        # Runs on the writer thread, or at once if the write already finished
+        # (while _finish still holds the lock), so it must not take the lock
+        self._writes.get(stream_id, set()).discard(future)
+
+    def _write(self, path: str, frames: List[tuple]):
+        if not frames:
+            logger.warning(f"No frames buffered for recording {path}")
+            return
+        started = time.perf_counter()
+        base, extension = os.path.splitext(path)
+        # The container is picked from the extension, so keep it on the temp name
+        temp_path = f"{base}.part{extension}"
+        try:
+            first = cv2.imdecode(np.frombuffer(frames[0][1], np.uint8), cv2.IMREAD_COLOR)
+            height, width = first.shape[:2]
+            span = frames[-1][0] - frames[0][0]
+            fps = min(self.fps, (len(frames) - 1) / span) if span > 0 else self.fps
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            writer = self._open_writer(temp_path, max(1.0, fps), (width, height))
+            try:
+                for _, data in frames:
+                    image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+                    if image.shape[:2] != (height, width):
+                        image = cv2.resize(image, (width, height))
+                    writer.write(image)
+            finally:
+                writer.release()
+            os.replace(temp_path, path)
+        except Exception as e:
+            self.failed += 1
+            logger.error(f"Error writing recording {path}: {e}")
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            return
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self.clips_written += 1
+        self.avg_write_ms = elapsed_ms if self.clips_written == 1 else 0.9 * self.avg_write_ms + 0.1 * elapsed_ms
+
+    def _open_writer(self, path: str, fps: float, size: tuple) -> cv2.VideoWriter:
+        codecs = [self._codec] if self._codec else FORMATS[self.format][1]
+        for codec in codecs:
+            writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*codec), fps, size)
+            if writer.isOpened():
+                if self._codec is None:
+                    self._codec = codec
+                    logger.info(f"Recording {self.format} clips with codec {codec}")
+                return writer
+            writer.release()
+        raise RuntimeError(f"No usable {self.format} encoder (tried {', '.join(codecs)})")
+
+    def stop(self):
+        """Write every clip in progress and wait for the writers"""
+        with self._lock:
+            for state in self._streams.values():
+                if state.recording:
+                    self._finish(state)
+            self._streams.clear()
+        self.executor.shutdown(wait=True)
+
+    def get_status(self) -> Dict:
+        with self._lock:
+            buffered = sum(state.bytes for state in self._streams.values())
+            recording = sum(1 for state in self._streams.values() if state.recording)
+        return {
+            'enabled': self.enabled,
+            'format': self.format,
+            'codec': self._codec,
+            'buffered_bytes': buffered,
+            'recording': recording,
+            'clips_started': self.clips_started,
+            'clips_written': self.clips_written,
+            'clips_truncated': self.clips_truncated,
+            'failed': self.failed,
+            'avg_write_ms': round(self.avg_write_ms, 1)
+        }
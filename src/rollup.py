@@ -0,0 +1,143 @@
+import bisect
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from .database import SessionLocal
+from .models import AnalyticsHourly, AnalyticsMinutely, VideoAnalytics
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (ms) of the processing-time histogram kept per bucket; the
+# last bin is open-ended. Histograms merge by addition, which is what makes
+# percentiles maintainable incrementally and across resolutions.
+PROCESSING_BINS = [5, 10, 20, 30, 50, 75, 100, 150, 200, 300, 500, 750, 1000, 2000, 5000]
+
+RESOLUTIONS = {
+    'minute': (AnalyticsMinutely, timedelta(minutes=1)),
+    'hour': (AnalyticsHourly, timedelta(hours=1)),
+}
+
+
+def bucket_start(timestamp: datetime, resolution: str) -> datetime:
+    if resolution == 'minute':
+        return timestamp.replace(second=0, microsecond=0)
+    return timestamp.replace(minute=0, second=0, microsecond=0)
+
+
+def histogram_percentile(histogram: List[int], fraction: float) -> Optional[float]:
+    """Upper bound of the bin holding the given fraction of samples"""
+    total = sum(histogram)
+    if not total:
+        return None
+    threshold = fraction * total
+    seen = 0
+    for index, count in enumerate(histogram):
+        seen += count
+        if seen >= threshold:
+            return float(PROCESSING_BINS[index]) if index < len(PROCESSING_BINS) else float(PROCESSING_BINS[-1])
+    return float(PROCESSING_BINS[-1])
+
+
+class AnalyticsRollup:
+    """Keeps the minute and hour analytics rollups up to date.
+
+    Registered as a DatabaseWriter listener: every committed batch of raw
+    VideoAnalytics rows is folded into per-bucket partial aggregates and
+    merged into the rollup tables in one transaction. Only the writer thread
+    of the process running a stream touches that stream's buckets, so the
+    read-modify-write needs no locking.
+    """
+
+    def __call__(self, inserted: List[tuple]):
+        rows = [values for model, values in inserted if model is VideoAnalytics]
+        if rows:
+            self.apply(rows)
+
+    def apply(self, rows: List[Dict]):
+        partials: Dict[tuple, Dict] = {}
+        for row in rows:
+            timestamp = row.get('timestamp') or datetime.utcnow()
+            for resolution in RESOLUTIONS:
+                key = (resolution, row['stream_id'], bucket_start(timestamp, resolution))
+                partial = partials.get(key)
+                if partial is None:
+                    partial = partials[key] = self._empty()
+                self._add(partial, row)
+
+        db = SessionLocal()
+        try:
+            for (resolution, stream_id, start), partial in partials.items():
+                model = RESOLUTIONS[resolution][0]
+                bucket = db.get(model, (stream_id, start))
+                if bucket is None:
+                    db.add(model(stream_id=stream_id, bucket_start=start, **partial))
+                else:
+                    self._merge(bucket, partial)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Error updating analytics rollups: {e}")
+        finally:
+            db.close()
+
+    @staticmethod
+    def _empty() -> Dict:
+        return {
+            'samples': 0,
+            'fps_sum': 0.0,
+            'fps_max': 0.0,
+            'motion_frames': 0,
+            'object_count': 0,
+            'max_objects': 0,
+            'quality_sum': 0.0,
+            'processing_sum': 0.0,
+            'processing_histogram': [0] * (len(PROCESSING_BINS) + 1),
+        }
+
+    @staticmethod
+    def _add(partial: Dict, row: Dict):
+        fps = row.get('fps') or 0.0
+        objects = row.get('object_count') or 0
+        processing = row.get('processing_time_ms') or 0
+        partial['samples'] += 1
+        partial['fps_sum'] += fps
+        partial['fps_max'] = max(partial['fps_max'], fps)
+        partial['motion_frames'] += 1 if row.get('motion_detected') else 0
+        partial['object_count'] += objects
+        partial['max_objects'] = max(partial['max_objects'], objects)
+        partial['quality_sum'] += row.get('quality_score') or 0.0
+        partial['processing_sum'] += processing
+        partial['processing_histogram'][bisect.bisect_left(PROCESSING_BINS, processing)] += 1
+
+    @staticmethod
+    def _merge(bucket, partial: Dict):
+        bucket.samples += partial['samples']
+        bucket.fps_sum += partial['fps_sum']
+        bucket.fps_max = max(bucket.fps_max, partial['fps_max'])
+        bucket.motion_frames += partial['motion_frames']
+        bucket.object_count += partial['object_count']
+        bucket.max_objects = max(bucket.max_objects, partial['max_objects'])
+        bucket.quality_sum += partial['quality_sum']
+        bucket.processing_sum += partial['processing_sum']
+        # Assign a new list so the JSON column is flagged as changed
+        bucket.processing_histogram = [
+            a + b for a, b in zip(bucket.processing_histogram, partial['processing_histogram'])
+        ]
+
+
+def bucket_to_dict(bucket) -> Dict:
+    samples = bucket.samples or 1
+    return {
+        'bucket_start': bucket.bucket_start,
+        'samples': bucket.samples,
+        'avg_fps': round(bucket.fps_sum / samples, 2),
+        'max_fps': bucket.fps_max,
+        'motion_frames': bucket.motion_frames,
+        'object_count': bucket.object_count,
+        'max_objects': bucket.max_objects,
+        'avg_quality': round(bucket.quality_sum / samples, 4),
+        'avg_processing_ms': round(bucket.processing_sum / samples, 1),
+        'p50_processing_ms': histogram_percentile(bucket.processing_histogram, 0.5),
+        'p95_processing_ms': histogram_percentile(bucket.processing_histogram, 0.95),
+    }
@@ -0,0 +1,116 @@
+import os
+import math
+import time
+import logging
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+TARGET_ANALYSIS_FPS = float(os.getenv("TARGET_ANALYSIS_FPS", "10"))
+MAX_ANALYSIS_MS_PER_SEC = float(os.getenv("MAX_ANALYSIS_MS_PER_SEC", "500"))
+
+
+class AnalysisScheduler:
+    """Decides which source frames get decoded and analyzed under a per-stream budget.
+
+    The budget is the lower of a target analysis rate and a cap on analysis
+    time spent per wall-clock second. Observed ``processing_time_ms`` turns
+    that budget into an analysis rate, and the measured source rate turns the
+    analysis rate into a number of frames to skip between analyzed frames.
+    """
+
+    def __init__(self, source_fps: float = 0, target_fps: float = TARGET_ANALYSIS_FPS,
+                 max_cpu_ms_per_sec: float = MAX_ANALYSIS_MS_PER_SEC):
+        self.target_fps = target_fps
+        self.max_cpu_ms_per_sec = max_cpu_ms_per_sec
+        self.source_fps = source_fps if source_fps and 0 < source_fps <= 120 else 0
+        self.avg_processing_ms = 0.0
+        self.frames_to_skip = 0
+        self.analysis_fps = 0.0
+
+        self._since_decode = 0
+        self._last_frame_at: Optional[float] = None
+        self._last_analysis_at: Optional[float] = None
+        self.frames_seen = 0
+        self.frames_analyzed = 0
+        self._recorded_seen = 0
+        self._recorded_analyzed = 0
+
+    def set_budget(self, target_fps: Optional[float] = None, max_cpu_ms_per_sec: Optional[float] = None):
+        if target_fps is not None:
+            self.target_fps = target_fps
+        if max_cpu_ms_per_sec is not None:
+            self.max_cpu_ms_per_sec = max_cpu_ms_per_sec
+        self._update_skip()
+
+    @property
+    def allowed_fps(self) -> float:
+        allowed = self.target_fps if self.target_fps > 0 else float('inf')
+        if self.max_cpu_ms_per_sec > 0 and self.avg_processing_ms > 0:
+            allowed = min(allowed, self.max_cpu_ms_per_sec / self.avg_processing_ms)
+        return allowed
+
+    def _update_skip(self):
+        allowed = self.allowed_fps
+        if not self.source_fps or math.isinf(allowed):
+            self.frames_to_skip = 0
+            return
+        self.frames_to_skip = max(0, math.ceil(self.source_fps / max(allowed, 0.01)) - 1)
+
+    def should_decode(self) -> bool:
+        """Called by the capture thread once per source frame, before decoding it"""
+        now = time.time()
+        if self._last_frame_at is not None:
+            interval = now - self._last_frame_at
+            if interval > 0:
+                fps = 1.0 / interval
+                self.source_fps = fps if not self.source_fps else 0.95 * self.source_fps + 0.05 * fps
+        self._last_frame_at = now
+        self.frames_seen += 1
+
+        if self._since_decode >= self.frames_to_skip:
+            self._since_decode = 0
+            return True
+        self._since_decode += 1
+        return False
+
+    def record(self, processing_time_ms: float):
+        """Called by the analysis loop after each analyzed frame"""
+        now = time.time()
+        self.frames_analyzed += 1
+        if self.avg_processing_ms == 0:
+            self.avg_processing_ms = float(processing_time_ms)
+        else:
+            self.avg_processing_ms = 0.8 * self.avg_processing_ms + 0.2 * processing_time_ms
+
+        if self._last_analysis_at is not None:
+            interval = now - self._last_analysis_at
+            if interval > 0:
+                fps = 1.0 / interval
+                self.analysis_fps = fps if self.analysis_fps == 0 else 0.8 * self.analysis_fps + 0.2 * fps
+        self._last_analysis_at = now
+
+        self._update_skip()
+
+    def take_window(self) -> Dict:
+        """Effective analysis rate and share of source frames not analyzed since the previous call"""
+        seen = self.frames_seen - self._recorded_seen
+        analyzed = self.frames_analyzed - self._recorded_analyzed
+        self._recorded_seen = self.frames_seen
+        self._recorded_analyzed = self.frames_analyzed
+
+        skip_ratio = 1 - analyzed / seen if seen > 0 else 0.0
+        return {
+            'analysis_fps': round(self.analysis_fps, 2),
+            'skip_ratio': round(max(0.0, min(skip_ratio, 1.0)), 3)
+        }
+
+    def get_status(self) -> Dict:
+        return {
+            'target_analysis_fps': self.target_fps,
+            'max_cpu_ms_per_sec': self.max_cpu_ms_per_sec,
+            'source_fps': round(self.source_fps, 2),
+            'analysis_fps': round(self.analysis_fps, 2),
+            'avg_processing_ms': round(self.avg_processing_ms, 1),
+            'frames_to_skip': self.frames_to_skip
+        }
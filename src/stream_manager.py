@@ -1,3 +1,4 @@
+import os
 import asyncio
 import threading
 import logging
@@ -5,20 +6,77 @@ from typing import Dict, List, Optional
 from datetime import datetime
 import time
 import psutil
+from concurrent.futures import ThreadPoolExecutor
 
 from .database import SessionLocal
 from .models import VideoStream, VideoEvent, VideoAnalytics, SystemMetrics
 from .video_processor import VideoProcessor
+from .capture import FrameRingBuffer, CaptureThread
+from .mjpeg_hub import MjpegHub
+from .scheduler import AnalysisScheduler
+from .worker_pool import StreamWorkerPool, ForwardingThumbnails, STREAM_WORKERS
+from .tracker import ObjectTracker, Track
+from .motion_session import MotionSession, MotionSessionTracker, MOTION_COOLDOWN, MOTION_SESSION_FRAMES
+from .db_writer import DatabaseWriter
+from .rollup import AnalyticsRollup
+from .counters import DashboardCounters
+from .pubsub import PubSubHub
+from .thumbnails import ThumbnailCache
+from .image_writer import ImageWriter
+from .artifacts import ArtifactStore
+from .recorder import ClipRecorder
+from .hls import HlsHub
 
 logger = logging.getLogger(__name__)
 
+# Minimum seconds between in-place updates of an active track's event row
+TRACK_UPDATE_INTERVAL = 5.0
+# Threads for blocking control calls made on behalf of the API (opening a
+# camera, joining a stream thread, waiting on a worker)
+STREAM_CONTROL_THREADS = int(os.getenv("STREAM_CONTROL_THREADS", "4"))
+# Seconds removing a stream waits for its last clips, images and rows to be
+# written; stays under the worker call timeout
+STREAM_DRAIN_TIMEOUT = 20.0
+
 class StreamManager:
-    def __init__(self):
+    def __init__(self, workers: int = STREAM_WORKERS, worker_events=None):
+        """``worker_events`` is the event queue of a stream worker process
+        running this manager; the API process alone owns the thumbnail
+        directory and serves live HLS, so workers build neither.
+        """
         self.active_streams: Dict[int, Dict] = {}
         self.processors: Dict[int, VideoProcessor] = {}
         self.running = False
         self.system_monitor_thread = None
+        self.frame_hub = MjpegHub()
+        self.control_executor = ThreadPoolExecutor(
+            max_workers=STREAM_CONTROL_THREADS, thread_name_prefix="stream-control"
+        )
+        self.db_writer = DatabaseWriter()
+        self.db_writer.add_listener(AnalyticsRollup())
+        self.dashboard = DashboardCounters()
+        self.db_writer.add_listener(self.dashboard)
+        self.push_hub = PubSubHub()
+        self.db_writer.add_listener(self._publish_rows)
+        if worker_events is None:
+            self.thumbnails = ThumbnailCache()
+            self.hls = HlsHub(self.frame_hub)
+        else:
+            self.thumbnails = ForwardingThumbnails(worker_events)
+            self.hls = None
+        self.image_writer = ImageWriter()
+        self.artifacts = ArtifactStore(self.image_writer)
+        self.recorder = ClipRecorder()
+        # With workers > 0 streams run in worker processes and this manager
+        # only supervises them
+        self.worker_pool = StreamWorkerPool(
+            workers, self.frame_hub, self.dashboard, self.push_hub, self.thumbnails
+        ) if workers > 0 else None
         
+    async def run_control(self, fn, *args):
+        """Await a blocking manager call from the event loop without stalling it"""
+        return await asyncio.get_running_loop().run_in_executor(self.control_executor, fn, *args)
+    
     def add_stream(self, stream_id: int, stream_url: str, stream_name: str) -> bool:
         try:
             db = SessionLocal()
@@ -41,16 +99,52 @@ class StreamManager:
             
             db.commit()
             db.close()
+            self.dashboard.refresh_streams()
+            
+            if self.worker_pool:
+                if not self.worker_pool.add_stream(stream_id, stream_url, stream_name):
+                    logger.error(f"Failed to initialize stream {stream_id} in worker pool")
+                    return False
+                self.active_streams[stream_id] = {
+                    'name': stream_name,
+                    'url': stream_url,
+                    'thread': None,
+                    'running': False
+                }
+                logger.info(f"Stream {stream_id} added successfully")
+                self._publish_stream_state(stream_id, 'added')
+                return True
             
+            attached = self.attach_stream(stream_id, stream_url, stream_name)
+            if attached:
+                self._publish_stream_state(stream_id, 'added')
+            return attached
+                
+        except Exception as e:
+            logger.error(f"Error adding stream {stream_id}: {e}")
+            return False
+    
+    def attach_stream(self, stream_id: int, stream_url: str, stream_name: str) -> bool:
+        """Open a stream and manage it in this process, without touching the database"""
+        try:
             # Initialize processor
-            processor = VideoProcessor(stream_id, stream_url)
+            processor = VideoProcessor(stream_id, stream_url, self.artifacts)
             if processor.initialize_stream():
                 self.processors[stream_id] = processor
                 self.active_streams[stream_id] = {
                     'name': stream_name,
                     'url': stream_url,
                     'thread': None,
-                    'running': False
+                    'running': False,
+                    'buffer': FrameRingBuffer(),
+                    'scheduler': AnalysisScheduler(processor.fps),
+                    'tracker': ObjectTracker(stream_id),
+                    'motion': MotionSessionTracker(),
+                    'capture': None,
+                    'analyzed_frames': 0,
+                    'last_analyzed_at': 0.0,
+                    'capture_lag_ms': 0.0,
+                    'avg_capture_lag_ms': 0.0
                 }
                 logger.info(f"Stream {stream_id} added successfully")
                 return True
@@ -68,17 +162,39 @@ class StreamManager:
                 self.stop_stream(stream_id)
                 del self.active_streams[stream_id]
                 
+                if self.worker_pool:
+                    # The worker drains its own writers before it answers
+                    self.worker_pool.remove_stream(stream_id)
+                else:
+                    self._drain_stream(stream_id)
+                
                 if stream_id in self.processors:
                     self.processors[stream_id].release()
                     del self.processors[stream_id]
+                self.artifacts.release_stream(stream_id)
                 
                 logger.info(f"Stream {stream_id} removed from manager successfully")
+                self._publish_stream_state(stream_id, 'removed')
                 return True
             return False
         except Exception as e:
             logger.error(f"Error removing stream {stream_id}: {e}")
             return False
     
+    def _drain_stream(self, stream_id: int):
+        """Wait until a stopped stream's final clips, images and rows are written.
+
+        Stopping a stream flushes its open motion session, tracks and clip
+        into the background writers; a purge that started before those land
+        would miss them.
+        """
+        deadline = time.time() + STREAM_DRAIN_TIMEOUT
+        drained = self.recorder.drain_stream(stream_id, timeout=STREAM_DRAIN_TIMEOUT)
+        drained = self.image_writer.drain_stream(stream_id, timeout=max(0.0, deadline - time.time())) and drained
+        drained = self.db_writer.drain(timeout=max(0.0, deadline - time.time())) and drained
+        if not drained:
+            logger.warning(f"Stream {stream_id} removed before all of its queued writes finished")
+    
     def start_stream(self, stream_id: int) -> bool:
         try:
             if stream_id not in self.active_streams:
@@ -89,6 +205,14 @@ class StreamManager:
                 logger.warning(f"Stream {stream_id} is already running")
                 return True
             
+            if self.worker_pool:
+                if not self.worker_pool.start_stream(stream_id):
+                    return False
+                self.active_streams[stream_id]['running'] = True
+                logger.info(f"Stream {stream_id} started successfully")
+                self._publish_stream_state(stream_id, 'started')
+                return True
+            
             thread = threading.Thread(target=self._process_stream, args=(stream_id,))
             thread.daemon = True
             self.active_streams[stream_id]['thread'] = thread
@@ -96,18 +220,37 @@ class StreamManager:
             thread.start()
             
             logger.info(f"Stream {stream_id} started successfully")
+            self._publish_stream_state(stream_id, 'started')
             return True
         except Exception as e:
             logger.error(f"Error starting stream {stream_id}: {e}")
             return False
     
+    def set_processing_budget(self, stream_id: int, target_fps: Optional[float] = None,
+                              max_cpu_ms_per_sec: Optional[float] = None) -> Optional[Dict]:
+        if stream_id not in self.active_streams:
+            return None
+        if self.worker_pool:
+            return self.worker_pool.set_processing_budget(stream_id, target_fps, max_cpu_ms_per_sec)
+        
+        scheduler = self.active_streams[stream_id]['scheduler']
+        scheduler.set_budget(target_fps, max_cpu_ms_per_sec)
+        logger.info(f"Processing budget updated for stream {stream_id}")
+        return scheduler.get_status()
+    
     def stop_stream(self, stream_id: int) -> bool:
         try:
             if stream_id in self.active_streams:
+                if self.worker_pool:
+                    self.worker_pool.stop_stream(stream_id)
+                    self.frame_hub.close_stream(stream_id)
                 self.active_streams[stream_id]['running'] = False
                 if self.active_streams[stream_id]['thread']:
                     self.active_streams[stream_id]['thread'].join(timeout=5)
+                if self.hls:
+                    self.hls.close_stream(stream_id)
                 logger.info(f"Stream {stream_id} stopped successfully")
+                self._publish_stream_state(stream_id, 'stopped')
                 return True
             return False
         except Exception as e:
@@ -120,121 +263,280 @@ class StreamManager:
             logger.error(f"No processor found for stream {stream_id}")
             return
         
+        stream_info = self.active_streams[stream_id]
+        frame_buffer = stream_info['buffer']
+        scheduler = stream_info['scheduler']
+        capture = CaptureThread(
+            processor, frame_buffer,
+            on_frame=lambda frame: self._on_captured_frame(stream_id, frame),
+            scheduler=scheduler,
+            # Viewers and the recording buffer both need frames analysis skips
+            wants_frames=lambda: self.frame_hub.has_subscribers(stream_id) or self.recorder.wants_frame(stream_id)
+        )
+        stream_info['capture'] = capture
+        capture.start()
+        
         logger.info(f"Processing stream {stream_id}")
         
-        while self.active_streams[stream_id]['running']:
+        while stream_info['running']:
             try:
-                ret, frame = processor.read_frame()
-                if not ret:
-                    logger.warning(f"Failed to read frame from stream {stream_id}")
-                    time.sleep(1)
+                latest = frame_buffer.get_latest(timeout=1.0)
+                if latest is None:
+                    # The source stalled or ended: close what is waiting on frames
+                    self._expire_idle(stream_id)
                     continue
+                _, captured_at, frame = latest
                 
                 # Process frame
                 analytics = processor.process_frame(frame)
+                scheduler.record(analytics['processing_time_ms'])
+                analytics.update(scheduler.take_window())
+                
+                # Track how stale the analyzed frame was
+                lag_ms = (time.time() - captured_at) * 1000
+                stream_info['analyzed_frames'] += 1
+                stream_info['last_analyzed_at'] = time.time()
+                stream_info['capture_lag_ms'] = round(lag_ms, 1)
+                stream_info['avg_capture_lag_ms'] = round(
+                    0.9 * stream_info['avg_capture_lag_ms'] + 0.1 * lag_ms, 1
+                )
                 
                 # Store analytics
                 self._store_analytics(stream_id, analytics)
                 
-                # Check for events
-                if analytics['motion_detected']:
-                    self._handle_motion_event(stream_id, frame, analytics)
+                # Check for events; motion sessions need every frame to
+                # notice when motion stops
+                self._handle_motion_event(stream_id, frame, analytics)
                 
-                if analytics['object_count'] > 0:
-                    self._handle_object_events(stream_id, frame, analytics)
-                
-                # Brief pause to prevent overwhelming the system
-                time.sleep(0.1)
+                # Runs on every frame so tracks can end when objects leave
+                self._handle_object_events(stream_id, frame, analytics)
                 
             except Exception as e:
                 logger.error(f"Error processing stream {stream_id}: {e}")
                 time.sleep(1)
         
+        capture.stop()
+        frame_buffer.clear()
+        self.frame_hub.close_stream(stream_id)
+        
+        open_tracks = stream_info['tracker'].close_all()
+        if open_tracks:
+            self._close_tracks(stream_id, open_tracks)
+        
+        open_session = stream_info['motion'].close()
+        if open_session:
+            self._record_motion_session(stream_id, open_session)
+        self.recorder.flush_stream(stream_id)
         processor.release()
         logger.info(f"Stream {stream_id} processing stopped")
     
+    def _expire_idle(self, stream_id: int):
+        """Close the motion session, tracks and clip of a stream that stopped delivering frames.
+
+        They normally close on analyzed frames; without any, wall-clock time
+        takes over, with the motion cooldown as the limit for tracks too.
+        """
+        stream_info = self.active_streams[stream_id]
+        now = time.time()
+        session = stream_info['motion'].tick(now)
+        if session:
+            self._record_motion_session(stream_id, session)
+        tracker = stream_info['tracker']
+        if tracker.tracks and now - stream_info['last_analyzed_at'] >= MOTION_COOLDOWN:
+            self._close_tracks(stream_id, tracker.close_all())
+        self.recorder.tick(stream_id, now)
+    
+    def _on_captured_frame(self, stream_id: int, frame):
+        self.frame_hub.publish(stream_id, frame)
+        self.recorder.add_frame(stream_id, frame)
+    
     def _store_analytics(self, stream_id: int, analytics: Dict):
         try:
-            db = SessionLocal()
-            analytics_record = VideoAnalytics(
-                stream_id=stream_id,
-                fps=analytics['fps'],
-                frame_count=analytics['frame_count'],
-                motion_detected=analytics['motion_detected'],
-                object_count=analytics['object_count'],
-                quality_score=analytics['quality_score'],
-                processing_time_ms=analytics['processing_time_ms']
-            )
-            db.add(analytics_record)
-            db.commit()
-            db.close()
+            self.db_writer.insert(VideoAnalytics, {
+                'stream_id': stream_id,
+                'timestamp': datetime.utcnow(),
+                'fps': analytics['fps'],
+                'frame_count': analytics['frame_count'],
+                'motion_detected': analytics['motion_detected'],
+                'object_count': analytics['object_count'],
+                'quality_score': analytics['quality_score'],
+                'processing_time_ms': analytics['processing_time_ms'],
+                'analysis_fps': analytics.get('analysis_fps'),
+                'skip_ratio': analytics.get('skip_ratio')
+            }, droppable=True)
         except Exception as e:
             logger.error(f"Error storing analytics: {e}")
     
     def _handle_motion_event(self, stream_id: int, frame, analytics: Dict):
         try:
             processor = self.processors[stream_id]
-            frame_path = processor.save_frame(frame, "motion")
+            motion = self.active_streams[stream_id]['motion']
+            now = time.time()
+            session = motion.update(analytics['motion_area'], processor.motion_threshold, frame, now)
+            if session:
+                self._record_motion_session(stream_id, session)
+            if motion.session and motion.session.last_motion == now:
+                # Only frames with motion extend the clip, so it ends one
+                # post-roll after motion stops rather than after the cooldown
+                video_path = self.recorder.trigger(stream_id, now)
+                motion.session.video_path = motion.session.video_path or video_path
+            if motion.session and motion.session.event_key is None:
+                self._open_motion_session(stream_id, motion.session)
+        except Exception as e:
+            logger.error(f"Error handling motion event: {e}")
+    
+    def _motion_metadata(self, session: MotionSession, status: str, frame_paths: List[str],
+                         frame_dimensions: Optional[tuple]) -> Dict:
+        return {
+            'motion_area': session.peak_motion_area,
+            'peak_motion_area': session.peak_motion_area,
+            'session_status': status,
+            'start_time': datetime.utcfromtimestamp(session.start_time).isoformat(),
+            'end_time': datetime.utcfromtimestamp(session.end_time).isoformat(),
+            'duration_s': round(session.duration, 2),
+            'motion_frames': session.motion_frames,
+            'frame_paths': frame_paths,
+            'frame_dimensions': frame_dimensions
+        }
+    
+    def _open_motion_session(self, stream_id: int, session: MotionSession):
+        """Write the event of a motion session as soon as it opens; it is completed on close"""
+        try:
+            session.event_key = f"{stream_id}-motion-{int(session.start_time * 1000)}"
+            _, first_frame = session.frames['first']
+            height, width = first_frame.shape[:2]
+            session.frame_path = self.processors[stream_id].save_frame(
+                first_frame, "motion_first", self.thumbnails.prefetch)
+            frame_paths = [session.frame_path] if session.frame_path else []
             
-            db = SessionLocal()
-            event = VideoEvent(
-                stream_id=stream_id,
-                event_type="motion_detected",
-                confidence=0.9,
-                event_metadata={
-                    'motion_area': analytics['motion_area'],
-                    'frame_dimensions': analytics['frame_dimensions']
-                },
-                frame_path=frame_path
-            )
-            db.add(event)
-            db.commit()
-            db.close()
+            self.db_writer.insert(VideoEvent, {
+                'stream_id': stream_id,
+                'event_time': datetime.utcfromtimestamp(session.start_time),
+                'event_type': "motion_detected",
+                'confidence': 0.9,
+                'event_metadata': self._motion_metadata(session, 'active', frame_paths, (width, height)),
+                'frame_path': session.frame_path,
+                'video_path': session.video_path,
+                'track_id': session.event_key
+            })
+        except Exception as e:
+            logger.error(f"Error opening motion session: {e}")
+    
+    def _record_motion_session(self, stream_id: int, session: MotionSession):
+        """Complete the event of a finished motion session"""
+        try:
+            if session.event_key is None:
+                self._open_motion_session(stream_id, session)
+            
+            processor = self.processors[stream_id]
+            frame_paths = []
+            frame_dimensions = None
+            for role, _, session_frame in session.representative_frames(MOTION_SESSION_FRAMES):
+                height, width = session_frame.shape[:2]
+                frame_dimensions = (width, height)
+                if session_frame is session.frames['first'][1] and session.frame_path:
+                    # Saved when the session opened
+                    frame_path = session.frame_path
+                else:
+                    frame_path = processor.save_frame(session_frame, f"motion_{role}", self.thumbnails.prefetch)
+                if frame_path:
+                    frame_paths.append(frame_path)
+            
+            self.db_writer.update(VideoEvent, {'track_id': session.event_key}, {
+                'event_metadata': self._motion_metadata(session, 'ended', frame_paths, frame_dimensions),
+                'frame_path': frame_paths[0] if frame_paths else None,
+                'video_path': session.video_path
+            })
             
-            logger.info(f"Motion event recorded for stream {stream_id}")
+            logger.info(f"Motion session recorded for stream {stream_id} ({session.duration:.1f}s)")
         except Exception as e:
-            logger.error(f"Error handling motion event: {e}")
+            logger.error(f"Error recording motion session: {e}")
+    
+    def _track_metadata(self, track: Track, status: str) -> Dict:
+        obj = track.detection
+        return {
+            'object_type': track.object_type,
+            'area': obj['area'],
+            'class_id': obj.get('class_id', -1),
+            'detection_method': obj.get('detection_method', 'opencv'),
+            'track_id': track.track_id,
+            'track_status': status,
+            'first_seen': datetime.utcfromtimestamp(track.first_seen).isoformat(),
+            'last_seen': datetime.utcfromtimestamp(track.last_seen).isoformat(),
+            'duration_s': round(track.duration, 2),
+            'hits': track.hits
+        }
     
     def _handle_object_events(self, stream_id: int, frame, analytics: Dict):
         try:
+            tracker = self.active_streams[stream_id]['tracker']
+            changes = tracker.update(analytics['objects'], frame, analytics.get('searched_regions'))
+            
+            now = time.time()
+            due = [t for t in changes['updated'] if now - t.last_persisted >= TRACK_UPDATE_INTERVAL]
+            if not (changes['started'] or changes['ended'] or due):
+                return
+            
             processor = self.processors[stream_id]
-            frame_path = processor.save_frame(frame, "objects")
             
-            db = SessionLocal()
-            for obj in analytics['objects']:
-                # Create specific event type for different objects
-                object_type = obj['type']
-                event_type = f"{object_type}_detected"
-                
-                # Generate unique event ID for the clip filename
-                event_id = f"{stream_id}_{int(time.time() * 1000)}"
-                
-                # Save object clip
-                clip_path = processor.save_object_clip(frame, obj['bounding_box'], object_type, event_id)
-                
-                event = VideoEvent(
-                    stream_id=stream_id,
-                    event_type=event_type,
-                    confidence=obj['confidence'],
-                    bounding_box=obj['bounding_box'],
-                    event_metadata={
-                        'object_type': object_type,
-                        'area': obj['area'],
-                        'class_id': obj.get('class_id', -1),
-                        'detection_method': obj.get('detection_method', 'opencv')
-                    },
-                    frame_path=frame_path,
-                    clip_path=clip_path
-                )
-                db.add(event)
-            db.commit()
-            db.close()
+            if changes['started']:
+                # One frame covers every track that starts on it
+                frame_path = processor.save_frame(frame, "objects", self.thumbnails.prefetch)
+                video_path = self.recorder.trigger(stream_id)
+                for track in changes['started']:
+                    self.db_writer.insert(VideoEvent, {
+                        'stream_id': stream_id,
+                        'event_time': datetime.utcfromtimestamp(track.first_seen),
+                        'event_type': f"{track.object_type}_detected",
+                        'confidence': track.best_confidence,
+                        'bounding_box': track.bounding_box,
+                        'event_metadata': self._track_metadata(track, 'active'),
+                        'frame_path': frame_path,
+                        'video_path': video_path,
+                        'track_id': track.track_id
+                    })
+            
+            for track in due:
+                self.db_writer.update(VideoEvent, {'track_id': track.track_id}, {
+                    'confidence': track.best_confidence,
+                    'bounding_box': track.bounding_box,
+                    'event_metadata': self._track_metadata(track, 'active')
+                })
+                track.last_persisted = now
+            
+            if changes['ended']:
+                self._close_tracks(stream_id, changes['ended'])
             
-            detected_objects = [obj['type'] for obj in analytics['objects']]
-            logger.info(f"Object events recorded for stream {stream_id}: {detected_objects}")
+            if changes['started']:
+                detected_objects = [t.object_type for t in changes['started']]
+                logger.info(f"Object tracks started for stream {stream_id}: {detected_objects}")
         except Exception as e:
             logger.error(f"Error handling object events: {e}")
     
+    def _close_tracks(self, stream_id: int, tracks: List[Track]):
+        """Finalize ended tracks with their duration and best-confidence crop"""
+        try:
+            processor = self.processors[stream_id]
+            for track in tracks:
+                clip_path = None
+                if track.best_crop is not None:
+                    height, width = track.best_crop.shape[:2]
+                    clip_path = processor.save_object_clip(
+                        track.best_crop, {'x': 0, 'y': 0, 'w': width, 'h': height},
+                        track.object_type, track.track_id
+                    )
+                
+                self.db_writer.update(VideoEvent, {'track_id': track.track_id}, {
+                    'confidence': track.best_confidence,
+                    'bounding_box': track.best_box,
+                    'event_metadata': self._track_metadata(track, 'ended'),
+                    'clip_path': clip_path
+                })
+            
+            logger.info(f"Object tracks ended for stream {stream_id}: {[t.track_id for t in tracks]}")
+        except Exception as e:
+            logger.error(f"Error closing object tracks: {e}")
+    
     def start_system_monitoring(self):
         if not self.system_monitor_thread:
             self.system_monitor_thread = threading.Thread(target=self._monitor_system)
@@ -250,24 +552,68 @@ class StreamManager:
                 disk_usage = psutil.disk_usage('/').percent
                 network_stats = psutil.net_io_counters()
                 
-                db = SessionLocal()
-                metrics = SystemMetrics(
-                    cpu_usage=cpu_usage,
-                    memory_usage=memory_usage,
-                    disk_usage=disk_usage,
-                    network_usage=network_stats.bytes_sent + network_stats.bytes_recv,
-                    active_streams=len([s for s in self.active_streams.values() if s['running']])
-                )
-                db.add(metrics)
-                db.commit()
-                db.close()
+                metrics = {
+                    'timestamp': datetime.utcnow(),
+                    'cpu_usage': cpu_usage,
+                    'memory_usage': memory_usage,
+                    'disk_usage': disk_usage,
+                    'network_usage': network_stats.bytes_sent + network_stats.bytes_recv,
+                    'active_streams': len([s for s in self.active_streams.values() if s['running']])
+                }
+                self.db_writer.insert(SystemMetrics, metrics, droppable=True)
+                self.push_hub.publish('metrics', metrics, key='system')
                 
                 time.sleep(60)  # Collect metrics every minute
             except Exception as e:
                 logger.error(f"Error collecting system metrics: {e}")
                 time.sleep(60)
     
+    def _publish_stream_state(self, stream_id: int, state: str):
+        info = self.active_streams.get(stream_id, {})
+        self.push_hub.publish('streams', {
+            'stream_id': stream_id,
+            'state': state,
+            'running': info.get('running', False),
+            'name': info.get('name')
+        }, key=stream_id)
+    
+    def _publish_rows(self, inserted: List[tuple]):
+        """Write-behind listener pushing committed events and analytics to subscribers"""
+        latest_analytics = {}
+        for model, values in inserted:
+            if model is VideoEvent:
+                self.push_hub.publish('events', values)
+            elif model is VideoAnalytics:
+                latest_analytics[values['stream_id']] = values
+        # One analytics tick per stream and flush, however many rows it held
+        for stream_id, values in latest_analytics.items():
+            self.push_hub.publish('analytics', values, key=stream_id)
+        if not self.dashboard.forwarding:
+            self.push_hub.publish('summary', self.dashboard.get_summary(), key='summary')
+    
     def get_stream_status(self) -> Dict:
+        if self.worker_pool:
+            reported = self.worker_pool.get_stream_status()
+            return {
+                'active_streams': len(self.active_streams),
+                'running_streams': len([s for s in self.active_streams.values() if s['running']]),
+                'streams': {
+                    sid: dict(
+                        reported.get(sid, {}),
+                        name=info['name'],
+                        url=info['url'],
+                        running=info['running']
+                    )
+                    for sid, info in self.active_streams.items()
+                },
+                'viewers': self.frame_hub.get_status(),
+                'hls': self.hls.get_status() if self.hls else {},
+                'writer': self.db_writer.get_status(),
+                'push': self.push_hub.get_status(),
+                'thumbnails': self.thumbnails.get_status(),
+                'workers': self.worker_pool.get_status()
+            }
+        
         return {
             'active_streams': len(self.active_streams),
             'running_streams': len([s for s in self.active_streams.values() if s['running']]),
@@ -275,19 +621,56 @@ class StreamManager:
                 sid: {
                     'name': info['name'],
                     'url': info['url'],
-                    'running': info['running']
+                    'running': info['running'],
+                    'captured_frames': info['buffer'].captured_frames,
+                    'analyzed_frames': info['analyzed_frames'],
+                    'dropped_frames': info['buffer'].dropped_frames,
+                    'capture_lag_ms': info['capture_lag_ms'],
+                    'avg_capture_lag_ms': info['avg_capture_lag_ms'],
+                    'scheduler': info['scheduler'].get_status(),
+                    'detection': dict(self.processors[sid].detection_stats) if sid in self.processors else {},
+                    'active_tracks': len(info['tracker'].tracks),
+                    'motion_session_active': info['motion'].session is not None
                 }
                 for sid, info in self.active_streams.items()
-            }
+            },
+            'viewers': self.frame_hub.get_status(),
+            'hls': self.hls.get_status() if self.hls else {},
+            'writer': self.db_writer.get_status(),
+            'push': self.push_hub.get_status(),
+            'thumbnails': self.thumbnails.get_status(),
+            'images': self.image_writer.get_status(),
+            'artifacts': self.artifacts.get_status(),
+            'recordings': self.recorder.get_status()
         }
     
-    def start(self):
+    def start(self, monitor_system: bool = True):
         self.running = True
-        self.start_system_monitoring()
+        self.db_writer.start()
+        self.image_writer.start()
+        if self.worker_pool:
+            self.worker_pool.start()
+        if monitor_system:
+            self.start_system_monitoring()
         logger.info("Stream manager started")
     
     def stop(self):
         self.running = False
-        for stream_id in list(self.active_streams.keys()):
-            self.stop_stream(stream_id)
+        if self.worker_pool:
+            # Workers stop their own streams as they shut down
+            self.worker_pool.shutdown()
+            for stream_id, info in self.active_streams.items():
+                info['running'] = False
+                self.frame_hub.close_stream(stream_id)
+        else:
+            for stream_id in list(self.active_streams.keys()):
+                self.stop_stream(stream_id)
+        if self.hls:
+            self.hls.stop()
+        # Streams flush their open tracks and sessions on stop, so drain last
+        self.recorder.stop()
+        self.image_writer.stop()
+        self.db_writer.stop()
+        self.push_hub.close()
+        self.thumbnails.shutdown()
         logger.info("Stream manager stopped")
\ No newline at end of file
@@ -0,0 +1,220 @@
+import os
+import asyncio
+import hashlib
+import threading
+import time
+import logging
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import cv2
+import numpy as np
+
+from .packs import lookup_entry, read_entry, split_pack_entry
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_DIR = os.getenv("THUMBNAIL_DIR", "thumbnails")
+THUMBNAIL_CACHE_MB = int(os.getenv("THUMBNAIL_CACHE_MB", "256"))
+THUMBNAIL_QUALITY = int(os.getenv("THUMBNAIL_QUALITY", "80"))
+THUMBNAIL_THREADS = int(os.getenv("THUMBNAIL_THREADS", "2"))
+# Requested widths are rounded up to one of these so a handful of
+# derivatives per image covers every client
+THUMBNAIL_WIDTHS = [int(w) for w in os.getenv("THUMBNAIL_WIDTHS", "160,320,640").split(",") if w.strip()]
+# Widths generated as soon as an event frame is saved; empty disables it
+THUMBNAIL_EAGER_WIDTHS = [int(w) for w in os.getenv("THUMBNAIL_EAGER_WIDTHS", "").split(",") if w.strip()]
+MAX_NARROW_ENTRIES = 10000
+
+
+def snap_width(width: int) -> int:
+    """Smallest configured width at least ``width`` (the largest if none is)"""
+    widths = sorted(THUMBNAIL_WIDTHS)
+    for candidate in widths:
+        if candidate >= width:
+            return candidate
+    return widths[-1]
+
+
+class ThumbnailCache:
+    """Downscaled copies of saved frames and clips, made on first request.
+
+    Derivatives live under ``root`` and are named after the source path,
+    its mtime and size, and the width, so a replaced source never serves a
+    stale thumbnail. The directory is kept under ``max_bytes`` by evicting
+    the least recently used files. Concurrent requests for the same
+    thumbnail share one encode.
+    """
+
+    def __init__(self, root: str = THUMBNAIL_DIR, max_bytes: int = THUMBNAIL_CACHE_MB * 1024 * 1024,
+                 threads: int = THUMBNAIL_THREADS):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="thumbnail")
+        self._entries: OrderedDict = OrderedDict()
+        self._bytes = 0
+        self._inflight: Dict[str, Future] = {}
+        # Sources no wider than the requested width, so they are not decoded
+        # again on every request
+        self._narrow: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.encodes = 0
+        self.encode_ms_total = 0.0
+        self._load()
+
+    def _load(self):
+        """Index thumbnails left by a previous run, oldest access first"""
+        try:
+            os.makedirs(self.root, exist_ok=True)
+            files = []
+            for entry in os.scandir(self.root):
+                if entry.is_file() and entry.name.endswith(".jpg"):
+                    st = entry.stat()
+                    files.append((st.st_atime, entry.name, st.st_size))
+            for _, name, size in sorted(files):
+                self._entries[name] = size
+                self._bytes += size
+            self._evict()
+        except Exception as e:
+            logger.error(f"Error indexing thumbnail cache: {e}")
+
+    def _name(self, source: str, width: int) -> str:
+        pack_entry = split_pack_entry(source)
+        if pack_entry:
+            # Pack entries never change once written
+            entry = lookup_entry(*pack_entry)
+            if entry is None:
+                raise FileNotFoundError(source)
+            identity = f"{os.path.realpath(pack_entry[0])}/{pack_entry[1]}:{entry[0]}:{entry[1]}"
+        else:
+            source_stat = os.stat(source)
+            identity = f"{os.path.realpath(source)}:{source_stat.st_mtime_ns}:{source_stat.st_size}"
+        digest = hashlib.sha1(identity.encode()).hexdigest()[:24]
+        return f"{digest}_w{width}.jpg"
+
+    async def fetch(self, source: str, width: int) -> Optional[str]:
+        """``get`` for the event loop; the stat and the encode run in threads"""
+        future = await asyncio.get_running_loop().run_in_executor(None, self.request, source, width)
+        return await asyncio.wrap_future(future)
+
+    def get(self, source: str, width: int) -> Optional[str]:
+        """Path of the ``width``-pixel thumbnail of ``source``, creating it if needed.
+
+        Returns None when the source is no wider than ``width``; the
+        original is the better response then. Blocks while encoding, so call
+        it from a worker thread.
+        """
+        return self.request(source, width).result()
+
+    def request(self, source: str, width: int) -> Future:
+        """Future resolving to what ``get`` returns, single-flighted per thumbnail"""
+        name = self._name(source, width)
+        path = os.path.join(self.root, name)
+        with self._lock:
+            if name in self._entries or name in self._narrow:
+                self.hits += 1
+                future = Future()
+                if name in self._narrow:
+                    future.set_result(None)
+                else:
+                    self._entries.move_to_end(name)
+                    future.set_result(path)
+                return future
+            future = self._inflight.get(name)
+            if future is not None:
+                self.hits += 1
+                return future
+            future = Future()
+            self._inflight[name] = future
+            self.misses += 1
+        self.executor.submit(self._generate, source, width, name, path, future)
+        return future
+
+    def prefetch(self, source: str, widths: Optional[List[int]] = None):
+        """Start generating thumbnails for a freshly saved image without waiting"""
+        for width in widths if widths is not None else THUMBNAIL_EAGER_WIDTHS:
+            try:
+                self.request(source, width)
+            except Exception as e:
+                logger.warning(f"Could not queue thumbnail for {source}: {e}")
+
+    def _generate(self, source: str, width: int, name: str, path: str, future: Future):
+        try:
+            result = path if os.path.exists(path) else self._encode(source, width, path)
+            with self._lock:
+                if result is None:
+                    self._narrow[name] = True
+                    if len(self._narrow) > MAX_NARROW_ENTRIES:
+                        self._narrow.popitem(last=False)
+                elif name not in self._entries:
+                    size = os.path.getsize(result)
+                    self._entries[name] = size
+                    self._bytes += size
+                    self._evict()
+            future.set_result(result)
+        except Exception as e:
+            logger.error(f"Error generating thumbnail of {source}: {e}")
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                self._inflight.pop(name, None)
+
+    def _encode(self, source: str, width: int, path: str) -> Optional[str]:
+        started = time.perf_counter()
+        pack_entry = split_pack_entry(source)
+        if pack_entry:
+            data = read_entry(pack_entry[0], *lookup_entry(*pack_entry))
+            image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+        else:
+            image = cv2.imread(source)
+        if image is None:
+            raise ValueError(f"Unreadable image {source}")
+        height, source_width = image.shape[:2]
+        if source_width <= width:
+            return None
+        resized = cv2.resize(image, (width, max(1, round(height * width / source_width))),
+                             interpolation=cv2.INTER_AREA)
+        ok, encoded = cv2.imencode(".jpg", resized, [cv2.IMWRITE_JPEG_QUALITY, THUMBNAIL_QUALITY])
+        if not ok:
+            raise ValueError(f"Could not encode thumbnail of {source}")
+        os.makedirs(self.root, exist_ok=True)
+        # Write aside and rename so a reader never sees a partial file
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(encoded.tobytes())
+        os.replace(temp_path, path)
+        self.encodes += 1
+        self.encode_ms_total += (time.perf_counter() - started) * 1000
+        return path
+
+    def _evict(self):
+        """Drop least recently used thumbnails until under budget; caller holds the lock"""
+        while self._bytes > self.max_bytes and len(self._entries) > 1:
+            name, size = self._entries.popitem(last=False)
+            self._bytes -= size
+            self.evictions += 1
+            try:
+                os.remove(os.path.join(self.root, name))
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                logger.warning(f"Failed to evict thumbnail {name}: {e}")
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
+
+    def get_status(self) -> Dict:
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'inflight': len(self._inflight),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'avg_encode_ms': round(self.encode_ms_total / self.encodes, 2) if self.encodes else 0.0
+            }
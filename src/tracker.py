@@ -0,0 +1,157 @@
+import itertools
+import logging
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def box_iou(a: Dict, b: Dict) -> float:
+    x0 = max(a['x'], b['x'])
+    y0 = max(a['y'], b['y'])
+    x1 = min(a['x'] + a['w'], b['x'] + b['w'])
+    y1 = min(a['y'] + a['h'], b['y'] + b['h'])
+    inter = max(0, x1 - x0) * max(0, y1 - y0)
+    union = a['w'] * a['h'] + b['w'] * b['h'] - inter
+    return inter / union if union > 0 else 0.0
+
+
+def box_centroid_distance(a: Dict, b: Dict) -> float:
+    """Centroid distance relative to the diagonal of the larger box"""
+    ax, ay = a['x'] + a['w'] / 2, a['y'] + a['h'] / 2
+    bx, by = b['x'] + b['w'] / 2, b['y'] + b['h'] / 2
+    diagonal = max(np.hypot(a['w'], a['h']), np.hypot(b['w'], b['h']), 1.0)
+    return float(np.hypot(ax - bx, ay - by) / diagonal)
+
+
+class Track:
+    def __init__(self, track_id: str, obj: Dict, frame: np.ndarray, timestamp: float):
+        self.track_id = track_id
+        self.object_type = obj['type']
+        self.first_seen = timestamp
+        self.last_seen = timestamp
+        self.last_persisted = timestamp
+        self.hits = 1
+        self.misses = 0
+        self.bounding_box = obj['bounding_box']
+        self.detection = obj
+        self.best_confidence = obj['confidence']
+        self.best_box = obj['bounding_box']
+        self.best_crop = self._crop(frame, obj['bounding_box'])
+
+    @staticmethod
+    def _crop(frame: np.ndarray, box: Dict) -> Optional[np.ndarray]:
+        if frame is None:
+            return None
+        height, width = frame.shape[:2]
+        x = max(0, min(int(box['x']), width - 1))
+        y = max(0, min(int(box['y']), height - 1))
+        crop = frame[y:y + int(box['h']), x:x + int(box['w'])]
+        return crop.copy() if crop.size else None
+
+    def observe(self, obj: Dict, frame: np.ndarray, timestamp: float):
+        self.last_seen = timestamp
+        self.hits += 1
+        self.misses = 0
+        self.bounding_box = obj['bounding_box']
+        self.detection = obj
+        better = obj['confidence'] > self.best_confidence or (
+            obj['confidence'] == self.best_confidence and obj['area'] > self.best_box['w'] * self.best_box['h']
+        )
+        if better:
+            self.best_confidence = obj['confidence']
+            self.best_box = obj['bounding_box']
+            self.best_crop = self._crop(frame, obj['bounding_box'])
+
+    @property
+    def duration(self) -> float:
+        return self.last_seen - self.first_seen
+
+
+class ObjectTracker:
+    """Associates per-frame detections of one stream into tracks.
+
+    Detections are matched to live tracks of the same object type by IoU,
+    falling back to centroid distance for fast-moving objects. A track only
+    accumulates misses on frames where its area was actually searched, so
+    motion-gated or ROI-restricted frames do not end tracks of stationary
+    objects.
+    """
+
+    def __init__(self, stream_id: int, iou_threshold: float = 0.3,
+                 max_centroid_distance: float = 0.5, max_misses: int = 5):
+        self.stream_id = stream_id
+        self.iou_threshold = iou_threshold
+        self.max_centroid_distance = max_centroid_distance
+        self.max_misses = max_misses
+        self.tracks: Dict[str, Track] = {}
+        self._ids = itertools.count(1)
+
+    def _new_track_id(self, timestamp: float) -> str:
+        return f"{self.stream_id}-{int(timestamp * 1000)}-{next(self._ids)}"
+
+    def update(self, objects: List[Dict], frame: np.ndarray,
+               searched_regions: Optional[List[Dict]] = None,
+               timestamp: Optional[float] = None) -> Dict[str, List[Track]]:
+        """Feed one analyzed frame's detections.
+
+        ``searched_regions`` are the source-coordinate boxes detection ran
+        in; None means the whole frame was searched and an empty list means
+        detection was skipped. Returns the tracks that started, were updated
+        and ended on this frame.
+        """
+        timestamp = timestamp if timestamp is not None else time.time()
+        started, updated, ended = [], [], []
+
+        # Greedy matching, best-scoring pairs first
+        candidates = []
+        for obj_index, obj in enumerate(objects):
+            for track in self.tracks.values():
+                if track.object_type != obj['type']:
+                    continue
+                iou = box_iou(track.bounding_box, obj['bounding_box'])
+                if iou >= self.iou_threshold:
+                    candidates.append((1.0 + iou, obj_index, track.track_id))
+                    continue
+                distance = box_centroid_distance(track.bounding_box, obj['bounding_box'])
+                if distance <= self.max_centroid_distance:
+                    candidates.append((1.0 - distance, obj_index, track.track_id))
+
+        matched_objects, matched_tracks = set(), set()
+        for _, obj_index, track_id in sorted(candidates, reverse=True):
+            if obj_index in matched_objects or track_id in matched_tracks:
+                continue
+            matched_objects.add(obj_index)
+            matched_tracks.add(track_id)
+            track = self.tracks[track_id]
+            track.observe(objects[obj_index], frame, timestamp)
+            updated.append(track)
+
+        for track_id, track in list(self.tracks.items()):
+            if track_id in matched_tracks or not self._was_searched(track, searched_regions):
+                continue
+            track.misses += 1
+            if track.misses >= self.max_misses:
+                ended.append(self.tracks.pop(track_id))
+
+        for obj_index, obj in enumerate(objects):
+            if obj_index in matched_objects:
+                continue
+            track = Track(self._new_track_id(timestamp), obj, frame, timestamp)
+            self.tracks[track.track_id] = track
+            started.append(track)
+
+        return {'started': started, 'updated': updated, 'ended': ended}
+
+    def _was_searched(self, track: Track, searched_regions: Optional[List[Dict]]) -> bool:
+        if searched_regions is None:
+            return True
+        return any(box_iou(track.bounding_box, region) > 0 for region in searched_regions)
+
+    def close_all(self) -> List[Track]:
+        """End every live track, e.g. when the stream stops"""
+        ended = list(self.tracks.values())
+        self.tracks.clear()
+        return ended
@@ -2,24 +2,46 @@ import cv2
 import numpy as np
 import time
 import logging
-from typing import Dict, List, Tuple, Optional
+from typing import Callable, Dict, List, Tuple, Optional, Union
 from datetime import datetime
 import os
 import json
 from skimage import measure, morphology
 from skimage.segmentation import clear_border
 
+from .preprocessing import PreprocessedFrame, preprocess, ANALYSIS_WIDTH
+from .artifacts import ArtifactStore
+from .image_writer import store_image
+from .packs import CLIP_STORAGE, pack_entry_path
+
 logger = logging.getLogger(__name__)
 
+# off: detect on every frame; motion: skip detection on frames without
+# motion; roi: additionally run HOG/Haar only around the motion regions
+DETECTION_GATING = os.getenv("DETECTION_GATING", "roi")
+FULL_DETECTION_INTERVAL = float(os.getenv("FULL_DETECTION_INTERVAL", "10"))
+# Where event frames and object clips are written; also the only
+# directories the file endpoints serve from
+FRAMES_DIR = os.getenv("FRAMES_DIR", "videos")
+CLIPS_DIR = os.getenv("CLIPS_DIR", "clips")
+
 class VideoProcessor:
-    def __init__(self, stream_id: int, stream_url: str):
+    def __init__(self, stream_id: int, stream_url: str, artifacts: Optional[ArtifactStore] = None):
         self.stream_id = stream_id
         self.stream_url = stream_url
+        # Shares one file between events that save the same frame or crop,
+        # and writes it off this stream's thread; without one every save is
+        # written inline
+        self.artifacts = artifacts
         self.cap = None
         self.fps = 0
+        # Files report how many frames they hold; live streams report none
+        self.is_file = False
         self.frame_count = 0
         self.is_running = False
         self.motion_threshold = 1000
+        self.analysis_width = ANALYSIS_WIDTH
+        self.motion_level = 1
         self.background_subtractor = cv2.createBackgroundSubtractorMOG2()
         
         # Initialize HOG descriptor for person detection
@@ -38,6 +60,14 @@ class VideoProcessor:
         self.min_object_area = 500
         self.max_object_area = 50000
         
+        # Detection gating
+        self.detection_gating = DETECTION_GATING
+        self.full_detection_interval = FULL_DETECTION_INTERVAL
+        self.roi_padding = 0.5
+        self.max_roi_coverage = 0.6
+        self.last_full_detection = 0.0
+        self.detection_stats = {'full': 0, 'roi': 0, 'skipped': 0}
+        
     def initialize_stream(self) -> bool:
         try:
             self.cap = cv2.VideoCapture(self.stream_url)
@@ -46,6 +76,7 @@ class VideoProcessor:
                 return False
             
             self.fps = self.cap.get(cv2.CAP_PROP_FPS)
+            self.is_file = self.cap.get(cv2.CAP_PROP_FRAME_COUNT) > 0
             logger.info(f"Stream {self.stream_id} initialized with FPS: {self.fps}")
             return True
         except Exception as e:
@@ -55,15 +86,25 @@ class VideoProcessor:
     def process_frame(self, frame: np.ndarray) -> Dict:
         start_time = time.time()
         
+        # Derived images (downscale, grayscale, pyramid) are computed once
+        # here and shared by every detector
+        pre = PreprocessedFrame(frame, self.analysis_width)
+        
         # Basic analytics
         height, width = frame.shape[:2]
-        quality_score = self.calculate_quality_score(frame)
+        quality_score = self.calculate_quality_score(pre)
         
         # Motion detection
-        motion_detected, motion_area = self.detect_motion(frame)
+        motion_detected, motion_area, motion_regions = self.detect_motion_regions(pre)
         
-        # Object detection (simplified)
-        objects = self.detect_objects(frame)
+        # Object detection (simplified), gated on motion
+        regions = self.plan_detection(pre, motion_detected, motion_regions)
+        if regions is None:
+            objects = []
+            searched_regions = []
+        else:
+            objects = self.detect_objects(pre, regions or None)
+            searched_regions = [pre.to_source_box(*region) for region in regions] if regions else None
         
         processing_time = int((time.time() - start_time) * 1000)
         
@@ -74,38 +115,116 @@ class VideoProcessor:
             'motion_area': motion_area,
             'object_count': len(objects),
             'objects': objects,
+            'searched_regions': searched_regions,
             'quality_score': quality_score,
             'processing_time_ms': processing_time,
             'frame_dimensions': (width, height)
         }
     
-    def detect_motion(self, frame: np.ndarray) -> Tuple[bool, int]:
+    def detect_motion(self, frame: Union[np.ndarray, PreprocessedFrame]) -> Tuple[bool, int]:
+        motion_detected, motion_area, _ = self.detect_motion_regions(frame)
+        return motion_detected, motion_area
+    
+    def detect_motion_regions(self, frame: Union[np.ndarray, PreprocessedFrame]) -> Tuple[bool, int, List[Tuple[int, int, int, int]]]:
+        """Detect motion and return the moving regions as (x, y, w, h) at analysis scale"""
         try:
-            fg_mask = self.background_subtractor.apply(frame)
+            pre = preprocess(frame, self.analysis_width)
+            # Motion needs little detail, so model the background on a small
+            # pyramid level; areas are converted back to source pixels
+            level = min(self.motion_level, len(pre.pyramid) - 1)
+            fg_mask = self.background_subtractor.apply(pre.pyramid[level])
             contours, _ = cv2.findContours(fg_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
             
             motion_area = 0
+            regions = []
+            factor = 2 ** level
             for contour in contours:
-                if cv2.contourArea(contour) > 500:
-                    motion_area += cv2.contourArea(contour)
+                area = pre.to_source_area(cv2.contourArea(contour), level)
+                if area > 500:
+                    motion_area += area
+                    x, y, w, h = cv2.boundingRect(contour)
+                    regions.append((x * factor, y * factor, w * factor, h * factor))
             
             motion_detected = motion_area > self.motion_threshold
-            return motion_detected, int(motion_area)
+            return motion_detected, int(motion_area), regions
         except Exception as e:
             logger.error(f"Motion detection error: {e}")
-            return False, 0
+            return False, 0, []
+    
+    def plan_detection(self, pre: PreprocessedFrame, motion_detected: bool,
+                       motion_regions: List[Tuple[int, int, int, int]]) -> Optional[List[Tuple[int, int, int, int]]]:
+        """Decide where to run detection: None to skip, [] for the full frame, or regions at analysis scale"""
+        now = time.time()
+        full_refresh_due = now - self.last_full_detection >= self.full_detection_interval
+        
+        if self.detection_gating == 'off' or full_refresh_due:
+            self.last_full_detection = now
+            self.detection_stats['full'] += 1
+            return []
+        
+        if not motion_detected:
+            self.detection_stats['skipped'] += 1
+            return None
+        
+        if self.detection_gating == 'roi':
+            height, width = pre.analysis.shape[:2]
+            regions = self._merge_regions([self._pad_region(r, width, height) for r in motion_regions])
+            covered = sum(w * h for _, _, w, h in regions)
+            if regions and covered < self.max_roi_coverage * width * height:
+                self.detection_stats['roi'] += 1
+                return regions
+        
+        self.detection_stats['full'] += 1
+        return []
     
-    def detect_objects(self, frame: np.ndarray) -> List[Dict]:
+    def _pad_region(self, region: Tuple[int, int, int, int], width: int, height: int) -> Tuple[int, int, int, int]:
+        x, y, w, h = region
+        pad_x = int(w * self.roi_padding) + 16
+        pad_y = int(h * self.roi_padding) + 16
+        # Leave room for at least one HOG window plus its padding
+        min_w, min_h = 128, 192
+        cx, cy = x + w / 2, y + h / 2
+        w = max(w + 2 * pad_x, min_w)
+        h = max(h + 2 * pad_y, min_h)
+        x0 = int(max(0, cx - w / 2))
+        y0 = int(max(0, cy - h / 2))
+        x1 = int(min(width, cx + w / 2))
+        y1 = int(min(height, cy + h / 2))
+        return (x0, y0, x1 - x0, y1 - y0)
+    
+    def _merge_regions(self, regions: List[Tuple[int, int, int, int]]) -> List[Tuple[int, int, int, int]]:
+        """Union overlapping regions so no area is searched twice"""
+        merged = list(regions)
+        changed = True
+        while changed:
+            changed = False
+            result = []
+            while merged:
+                x, y, w, h = merged.pop()
+                for i, (ox, oy, ow, oh) in enumerate(result):
+                    if x < ox + ow and ox < x + w and y < oy + oh and oy < y + h:
+                        nx, ny = min(x, ox), min(y, oy)
+                        result[i] = (nx, ny, max(x + w, ox + ow) - nx, max(y + h, oy + oh) - ny)
+                        changed = True
+                        break
+                else:
+                    result.append((x, y, w, h))
+            merged = result
+        return merged
+    
+    def detect_objects(self, frame: Union[np.ndarray, PreprocessedFrame],
+                       regions: Optional[List[Tuple[int, int, int, int]]] = None) -> List[Dict]:
         """Enhanced object detection using OpenCV methods"""
         objects = []
+        frame = preprocess(frame, self.analysis_width)
         
         try:
             # 1. Person detection using HOG
-            people = self.detect_people(frame)
+            people = self.detect_people(frame, regions)
             objects.extend(people)
             
             # 2. Face detection
-            faces = self.detect_faces(frame)
+            faces = self.detect_faces(frame, regions)
             objects.extend(faces)
             
             # 3. Generic object detection using contours
@@ -117,20 +236,36 @@ class VideoProcessor:
         
         return objects
     
-    def detect_people(self, frame: np.ndarray) -> List[Dict]:
+    def _iter_regions(self, image: np.ndarray, regions: Optional[List[Tuple[int, int, int, int]]]):
+        """Yield (crop, x offset, y offset) for each region, or the whole image"""
+        if not regions:
+            yield image, 0, 0
+            return
+        for x, y, w, h in regions:
+            yield image[y:y + h, x:x + w], x, y
+    
+    def detect_people(self, frame: Union[np.ndarray, PreprocessedFrame],
+                      regions: Optional[List[Tuple[int, int, int, int]]] = None) -> List[Dict]:
         """Detect people using HOG descriptor"""
         people = []
         try:
-            # Detect people
-            boxes, weights = self.hog.detectMultiScale(frame, winStride=(8, 8), padding=(32, 32), scale=1.05)
+            pre = preprocess(frame, self.analysis_width)
+            detections = []
+            for crop, ox, oy in self._iter_regions(pre.analysis, regions):
+                if crop.shape[0] < 128 or crop.shape[1] < 64:
+                    continue
+                # Detect people
+                boxes, weights = self.hog.detectMultiScale(crop, winStride=(8, 8), padding=(32, 32), scale=1.05)
+                detections.extend(((x + ox, y + oy, w, h), weight) for (x, y, w, h), weight in zip(boxes, weights))
             
-            for (x, y, w, h), weight in zip(boxes, weights):
-                if weight > 0.5:  # Confidence threshold
+            for (x, y, w, h), weight in detections:
+                if float(weight) > 0.5:  # Confidence threshold
+                    box = pre.to_source_box(x, y, w, h)
                     people.append({
                         'type': 'person',
                         'confidence': min(float(weight), 1.0),
-                        'bounding_box': {'x': int(x), 'y': int(y), 'w': int(w), 'h': int(h)},
-                        'area': int(w * h),
+                        'bounding_box': box,
+                        'area': box['w'] * box['h'],
                         'detection_method': 'hog'
                     })
         except Exception as e:
@@ -138,24 +273,29 @@ class VideoProcessor:
         
         return people
     
-    def detect_faces(self, frame: np.ndarray) -> List[Dict]:
+    def detect_faces(self, frame: Union[np.ndarray, PreprocessedFrame],
+                     regions: Optional[List[Tuple[int, int, int, int]]] = None) -> List[Dict]:
         """Detect faces using Haar cascades"""
         faces = []
         if self.face_cascade is None:
             return faces
             
         try:
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            face_rects = self.face_cascade.detectMultiScale(
-                gray, scaleFactor=1.1, minNeighbors=5, minSize=(30, 30)
-            )
+            pre = preprocess(frame, self.analysis_width)
+            face_rects = []
+            for crop, ox, oy in self._iter_regions(pre.analysis_gray, regions):
+                rects = self.face_cascade.detectMultiScale(
+                    crop, scaleFactor=1.1, minNeighbors=5, minSize=(30, 30)
+                )
+                face_rects.extend((x + ox, y + oy, w, h) for (x, y, w, h) in rects)
             
             for (x, y, w, h) in face_rects:
+                box = pre.to_source_box(x, y, w, h)
                 faces.append({
                     'type': 'face',
                     'confidence': 0.8,  # Haar cascades don't provide confidence
-                    'bounding_box': {'x': int(x), 'y': int(y), 'w': int(w), 'h': int(h)},
-                    'area': int(w * h),
+                    'bounding_box': box,
+                    'area': box['w'] * box['h'],
                     'detection_method': 'haar'
                 })
         except Exception as e:
@@ -163,29 +303,30 @@ class VideoProcessor:
         
         return faces
     
-    def detect_generic_objects(self, frame: np.ndarray) -> List[Dict]:
+    def detect_generic_objects(self, frame: Union[np.ndarray, PreprocessedFrame]) -> List[Dict]:
         """Detect generic objects using contour analysis"""
         objects = []
         try:
-            # Convert to grayscale
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            pre = preprocess(frame, self.analysis_width)
             
             # Apply adaptive thresholding
-            binary = cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, 
+            binary = cv2.adaptiveThreshold(pre.analysis_gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, 
                                          cv2.THRESH_BINARY, 11, 2)
             
             # Find contours
             contours, _ = cv2.findContours(binary, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
             
             for contour in contours:
-                area = cv2.contourArea(contour)
+                # Area limits are in source pixels
+                contour_area = cv2.contourArea(contour)
+                area = pre.to_source_area(contour_area)
                 if self.min_object_area < area < self.max_object_area:
                     # Calculate bounding box
                     x, y, w, h = cv2.boundingRect(contour)
                     
                     # Calculate some features
                     aspect_ratio = w / h
-                    extent = area / (w * h)
+                    extent = contour_area / (w * h)
                     
                     # Classify object based on shape features
                     object_type = self.classify_object_by_shape(aspect_ratio, extent, area)
@@ -193,7 +334,7 @@ class VideoProcessor:
                     objects.append({
                         'type': object_type,
                         'confidence': 0.6,
-                        'bounding_box': {'x': int(x), 'y': int(y), 'w': int(w), 'h': int(h)},
+                        'bounding_box': pre.to_source_box(x, y, w, h),
                         'area': int(area),
                         'detection_method': 'contour',
                         'features': {
@@ -222,10 +363,10 @@ class VideoProcessor:
         else:
             return 'unknown_object'
     
-    def calculate_quality_score(self, frame: np.ndarray) -> float:
+    def calculate_quality_score(self, frame: Union[np.ndarray, PreprocessedFrame]) -> float:
         try:
             # Simple quality score based on sharpness (Laplacian variance)
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            gray = preprocess(frame, self.analysis_width).analysis_gray
             laplacian_var = cv2.Laplacian(gray, cv2.CV_64F).var()
             # Normalize to 0-1 range
             quality_score = min(laplacian_var / 1000, 1.0)
@@ -234,16 +375,15 @@ class VideoProcessor:
             logger.error(f"Quality calculation error: {e}")
             return 0.0
     
-    def save_frame(self, frame: np.ndarray, event_type: str) -> Optional[str]:
+    def save_frame(self, frame: np.ndarray, event_type: str,
+                   on_written: Optional[Callable[[str], None]] = None) -> Optional[str]:
         try:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+            # UTC, like event times, clip recordings and pack hours
+            timestamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S_%f")
             filename = f"stream_{self.stream_id}_{event_type}_{timestamp}.jpg"
-            filepath = os.path.join("videos", filename)
-            
-            os.makedirs(os.path.dirname(filepath), exist_ok=True)
-            cv2.imwrite(filepath, frame)
+            filepath = os.path.join(FRAMES_DIR, filename)
             
-            return filepath
+            return self._write_image(filepath, frame, on_written)
         except Exception as e:
             logger.error(f"Error saving frame: {e}")
             return None
@@ -269,14 +409,17 @@ class VideoProcessor:
             
             # Only save if the clip has reasonable dimensions
             if object_clip.shape[0] > 10 and object_clip.shape[1] > 10:
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+                # One clock for the name and the pack, so a clip saved at
+                # the turn of an hour still lands in the pack its name says
+                now = datetime.utcnow()
+                timestamp = now.strftime("%Y%m%d_%H%M%S_%f")
                 filename = f"stream_{self.stream_id}_{object_type}_clip_{timestamp}_{event_id}.jpg"
-                filepath = os.path.join("clips", filename)
+                if CLIP_STORAGE == 'pack':
+                    filepath = pack_entry_path(CLIPS_DIR, self.stream_id, filename, now)
+                else:
+                    filepath = os.path.join(CLIPS_DIR, filename)
                 
-                os.makedirs(os.path.dirname(filepath), exist_ok=True)
-                cv2.imwrite(filepath, object_clip)
-                
-                return filepath
+                return self._write_image(filepath, object_clip, by_content=True)
             else:
                 logger.warning(f"Object clip too small: {object_clip.shape}")
                 return None
@@ -285,6 +428,16 @@ class VideoProcessor:
             logger.error(f"Error saving object clip: {e}")
             return None
     
+    def _write_image(self, filepath: str, image: np.ndarray,
+                     on_written: Optional[Callable[[str], None]] = None, by_content: bool = False) -> Optional[str]:
+        if self.artifacts:
+            return self.artifacts.save(self.stream_id, filepath, image, on_written, by_content)
+        
+        store_image(filepath, image)
+        if on_written:
+            on_written(filepath)
+        return filepath
+    
     def read_frame(self) -> Tuple[bool, Optional[np.ndarray]]:
         if not self.cap:
             return False, None
@@ -294,6 +447,16 @@ class VideoProcessor:
             self.frame_count += 1
         return ret, frame
     
+    def grab_frame(self) -> bool:
+        """Advance the stream by one frame without decoding it"""
+        if not self.cap:
+            return False
+        
+        ret = self.cap.grab()
+        if ret:
+            self.frame_count += 1
+        return ret
+    
     def release(self):
         if self.cap:
             self.cap.release()
@@ -0,0 +1,533 @@
+import os
+import time
+import signal
+import queue
+import itertools
+import threading
+import logging
+import multiprocessing as mp
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from .thumbnails import THUMBNAIL_EAGER_WIDTHS
+
+logger = logging.getLogger(__name__)
+
+STREAM_WORKERS = int(os.getenv("STREAM_WORKERS", "0"))
+
+SHARED_FRAME_SLOTS = 3
+SLOT_HEADER_BYTES = 8
+STATUS_INTERVAL = 1.0
+CALL_TIMEOUT = 30
+
+
+class SharedFrameWriter:
+    """Worker-side replacement for MjpegHub.
+
+    Frames of streams that have live viewers in the API process are copied
+    into a per-stream shared memory ring instead of being pickled through a
+    queue; only a small descriptor travels over the event queue. Each slot
+    starts with a sequence number so the reader can detect overwritten slots.
+    """
+
+    def __init__(self, event_queue):
+        self.event_queue = event_queue
+        self.watched = set()
+        self._segments: Dict[int, Dict] = {}
+        self._lock = threading.Lock()
+
+    def has_subscribers(self, stream_id: int) -> bool:
+        return stream_id in self.watched
+
+    def set_watched(self, stream_id: int, watched: bool) -> bool:
+        if watched:
+            self.watched.add(stream_id)
+        else:
+            self.watched.discard(stream_id)
+        return True
+
+    def _segment_for(self, stream_id: int, frame: np.ndarray) -> Dict:
+        segment = self._segments.get(stream_id)
+        if segment and segment['shape'] == frame.shape and segment['dtype'] == frame.dtype.str:
+            return segment
+
+        if segment:
+            self._unlink(segment)
+        slot_size = SLOT_HEADER_BYTES + frame.nbytes
+        shm = shared_memory.SharedMemory(create=True, size=slot_size * SHARED_FRAME_SLOTS)
+        segment = {
+            'shm': shm,
+            'shape': frame.shape,
+            'dtype': frame.dtype.str,
+            'slot_size': slot_size,
+            'sequence': 0
+        }
+        self._segments[stream_id] = segment
+        return segment
+
+    def publish(self, stream_id: int, frame: np.ndarray):
+        if stream_id not in self.watched:
+            return
+
+        with self._lock:
+            segment = self._segment_for(stream_id, frame)
+            segment['sequence'] += 1
+            sequence = segment['sequence']
+            slot = sequence % SHARED_FRAME_SLOTS
+            offset = slot * segment['slot_size']
+
+            buf = segment['shm'].buf
+            header = np.ndarray((1,), dtype=np.int64, buffer=buf, offset=offset)
+            header[0] = -1
+            np.ndarray(frame.shape, dtype=frame.dtype, buffer=buf,
+                       offset=offset + SLOT_HEADER_BYTES)[...] = frame
+            header[0] = sequence
+            del header, buf
+
+            name = segment['shm'].name
+
+        self.event_queue.put(('frame', stream_id, name, slot, frame.shape, frame.dtype.str, sequence))
+
+    def close_stream(self, stream_id: int):
+        with self._lock:
+            segment = self._segments.pop(stream_id, None)
+            if segment:
+                self._unlink(segment)
+
+    def get_status(self) -> Dict:
+        return {}
+
+    def close(self):
+        with self._lock:
+            for segment in self._segments.values():
+                self._unlink(segment)
+            self._segments.clear()
+
+    def _unlink(self, segment: Dict):
+        try:
+            segment['shm'].close()
+            segment['shm'].unlink()
+        except Exception as e:
+            logger.warning(f"Error releasing shared frame buffer: {e}")
+
+
+class SharedFrameReader:
+    """API-side counterpart of SharedFrameWriter"""
+
+    def __init__(self):
+        self._segments: Dict[int, shared_memory.SharedMemory] = {}
+
+    def _attach(self, stream_id: int, name: str) -> shared_memory.SharedMemory:
+        shm = self._segments.get(stream_id)
+        if shm is not None and shm.name == name:
+            return shm
+
+        self.release(stream_id)
+        # Spawned workers share this process's resource tracker, so attaching
+        # here does not register the segment a second time
+        shm = shared_memory.SharedMemory(name=name)
+        self._segments[stream_id] = shm
+        return shm
+
+    def read(self, stream_id: int, name: str, slot: int, shape, dtype: str, sequence: int) -> Optional[np.ndarray]:
+        try:
+            shm = self._attach(stream_id, name)
+        except FileNotFoundError:
+            return None
+
+        dtype = np.dtype(dtype)
+        slot_size = SLOT_HEADER_BYTES + int(np.prod(shape)) * dtype.itemsize
+        offset = slot * slot_size
+        header = np.ndarray((1,), dtype=np.int64, buffer=shm.buf, offset=offset)
+        if header[0] != sequence:
+            return None
+
+        frame = np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=offset + SLOT_HEADER_BYTES).copy()
+        if header[0] != sequence:
+            # Overwritten while copying
+            return None
+        return frame
+
+    def release(self, stream_id: int):
+        shm = self._segments.pop(stream_id, None)
+        if shm is not None:
+            try:
+                shm.close()
+            except Exception as e:
+                logger.warning(f"Error detaching shared frame buffer: {e}")
+
+    def close(self):
+        for stream_id in list(self._segments.keys()):
+            self.release(stream_id)
+
+
+class ForwardingPushHub:
+    """Worker-side replacement for PubSubHub.
+
+    Stream state is published by the API process itself, so only what the
+    worker alone knows about (committed events and analytics ticks) is
+    relayed over the event queue to the API process's hub.
+    """
+
+    FORWARDED_TOPICS = ('events', 'analytics')
+
+    def __init__(self, event_queue):
+        self._event_queue = event_queue
+
+    def has_subscribers(self, topic: Optional[str] = None) -> bool:
+        return True
+
+    def publish(self, topic: str, data, key=None):
+        if topic in self.FORWARDED_TOPICS:
+            self._event_queue.put(('publish', topic, data, key))
+
+    def get_status(self) -> Dict:
+        return {}
+
+
+class ForwardingThumbnails:
+    """Worker-side replacement for ThumbnailCache.
+
+    Every worker building its own cache over the same directory would
+    evict files the others and the API process still index, so eager
+    thumbnails of saved frames are requested from the API process's cache
+    over the event queue instead.
+    """
+
+    def __init__(self, event_queue):
+        self._event_queue = event_queue
+
+    def prefetch(self, source: str, widths: Optional[List[int]] = None):
+        if widths is not None or THUMBNAIL_EAGER_WIDTHS:
+            self._event_queue.put(('thumbnail', source, widths))
+
+    def get_status(self) -> Dict:
+        return {}
+
+    def shutdown(self):
+        pass
+
+
+def _worker_main(worker_index: int, command_queue, event_queue):
+    logging.basicConfig(level=logging.INFO)
+    # Ctrl+C reaches the whole process group; let the supervisor decide when
+    # workers shut down
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    from .stream_manager import StreamManager
+
+    manager = StreamManager(workers=0, worker_events=event_queue)
+    frames = SharedFrameWriter(event_queue)
+    manager.frame_hub = frames
+    manager.dashboard.forwarding = True
+    manager.push_hub = ForwardingPushHub(event_queue)
+    manager.start(monitor_system=False)
+
+    handlers = {
+        'add': manager.attach_stream,
+        'start': manager.start_stream,
+        'stop': manager.stop_stream,
+        'remove': manager.remove_stream,
+        'budget': manager.set_processing_budget,
+        'watch': frames.set_watched,
+    }
+
+    logger.info(f"Stream worker {worker_index} started (pid {os.getpid()})")
+    last_status = 0.0
+    running = True
+    while running:
+        try:
+            request_id, action, args = command_queue.get(timeout=STATUS_INTERVAL)
+        except queue.Empty:
+            request_id, action = None, None
+        except (EOFError, OSError):
+            break
+
+        if action == 'shutdown':
+            running = False
+            result = True
+        elif action in handlers:
+            try:
+                result = handlers[action](*args)
+            except Exception as e:
+                logger.error(f"Worker {worker_index} failed to {action} {args}: {e}")
+                result = None
+        else:
+            result = None
+
+        if action is not None and request_id is not None:
+            event_queue.put(('result', worker_index, request_id, result))
+
+        if time.time() - last_status >= STATUS_INTERVAL:
+            status = manager.get_stream_status()
+            status.pop('viewers', None)
+            status.pop('hls', None)
+            status.pop('push', None)
+            status.pop('thumbnails', None)
+            status['dashboard'] = manager.dashboard.take_pending()
+            event_queue.put(('status', worker_index, os.getpid(), status))
+            last_status = time.time()
+
+    manager.stop()
+    frames.close()
+    logger.info(f"Stream worker {worker_index} stopped")
+
+
+class StreamWorkerPool:
+    """Shards streams across worker processes that each run their own StreamManager.
+
+    The API process only keeps the stream-to-worker assignment, forwards
+    commands, collects status reports and relays frames of watched streams
+    from shared memory into its MjpegHub.
+    """
+
+    def __init__(self, size: int, frame_hub, dashboard=None, push_hub=None, thumbnails=None):
+        self.size = size
+        self.frame_hub = frame_hub
+        self.dashboard = dashboard
+        self.push_hub = push_hub
+        self.thumbnails = thumbnails
+        self.running = False
+        self._context = mp.get_context('spawn')
+        self._event_queue = self._context.Queue()
+        self._workers: List[Dict] = []
+        self._assignments: Dict[int, int] = {}
+        self._pending: Dict[int, Dict] = {}
+        self._request_ids = itertools.count(1)
+        self._watched = set()
+        self._reader = SharedFrameReader()
+        self._lock = threading.Lock()
+        self._supervisor = None
+
+    def start(self):
+        self.running = True
+        for index in range(self.size):
+            self._workers.append({
+                'process': None,
+                'commands': None,
+                'streams': {},
+                'status': {},
+                'pid': None,
+                'restarts': 0,
+                'last_report': None
+            })
+            self._spawn(index)
+
+        self._supervisor = threading.Thread(target=self._supervise, daemon=True)
+        self._supervisor.start()
+        logger.info(f"Stream worker pool started with {self.size} processes")
+
+    def _spawn(self, index: int):
+        worker = self._workers[index]
+        worker['commands'] = self._context.Queue()
+        worker['process'] = self._context.Process(
+            target=_worker_main,
+            args=(index, worker['commands'], self._event_queue),
+            name=f"stream-worker-{index}",
+            daemon=True
+        )
+        worker['process'].start()
+        worker['pid'] = worker['process'].pid
+
+    def _send(self, index: int, action: str, *args, request_id: Optional[int] = None):
+        self._workers[index]['commands'].put((request_id, action, args))
+
+    def _call(self, index: int, action: str, *args, timeout: float = CALL_TIMEOUT):
+        if not self._workers[index]['process'].is_alive():
+            logger.error(f"Worker {index} is not running, cannot {action}")
+            return None
+        
+        request_id = next(self._request_ids)
+        pending = {'event': threading.Event(), 'result': None}
+        with self._lock:
+            self._pending[request_id] = pending
+        self._send(index, action, *args, request_id=request_id)
+
+        if not pending['event'].wait(timeout):
+            logger.error(f"Worker {index} did not answer {action} within {timeout}s")
+        with self._lock:
+            self._pending.pop(request_id, None)
+        return pending['result']
+
+    def _pick_worker(self) -> int:
+        return min(range(self.size), key=lambda index: len(self._workers[index]['streams']))
+
+    def add_stream(self, stream_id: int, stream_url: str, stream_name: str) -> bool:
+        index = self._assignments.get(stream_id)
+        if index is None:
+            index = self._pick_worker()
+
+        if not self._call(index, 'add', stream_id, stream_url, stream_name):
+            return False
+
+        self._assignments[stream_id] = index
+        self._workers[index]['streams'][stream_id] = {
+            'url': stream_url,
+            'name': stream_name,
+            'running': False
+        }
+        logger.info(f"Stream {stream_id} assigned to worker {index}")
+        return True
+
+    def _stream_call(self, stream_id: int, action: str, *args):
+        index = self._assignments.get(stream_id)
+        if index is None:
+            return None
+        return self._call(index, action, stream_id, *args)
+
+    def start_stream(self, stream_id: int) -> bool:
+        success = bool(self._stream_call(stream_id, 'start'))
+        if success:
+            self._workers[self._assignments[stream_id]]['streams'][stream_id]['running'] = True
+        return success
+
+    def stop_stream(self, stream_id: int) -> bool:
+        success = bool(self._stream_call(stream_id, 'stop'))
+        if success:
+            self._workers[self._assignments[stream_id]]['streams'][stream_id]['running'] = False
+        return success
+
+    def remove_stream(self, stream_id: int) -> bool:
+        success = bool(self._stream_call(stream_id, 'remove'))
+        index = self._assignments.pop(stream_id, None)
+        if index is not None:
+            self._workers[index]['streams'].pop(stream_id, None)
+        self._watched.discard(stream_id)
+        self._reader.release(stream_id)
+        return success
+
+    def set_processing_budget(self, stream_id: int, target_fps: Optional[float],
+                              max_cpu_ms_per_sec: Optional[float]) -> Optional[Dict]:
+        return self._stream_call(stream_id, 'budget', target_fps, max_cpu_ms_per_sec)
+
+    def get_stream_status(self) -> Dict:
+        streams = {}
+        for index, worker in enumerate(self._workers):
+            reported = worker['status'].get('streams', {})
+            for stream_id in worker['streams']:
+                if stream_id in reported:
+                    streams[stream_id] = dict(reported[stream_id], worker=index)
+        return streams
+
+    def get_status(self) -> List[Dict]:
+        now = time.time()
+        return [
+            {
+                'worker': index,
+                'pid': worker['pid'],
+                'alive': worker['process'] is not None and worker['process'].is_alive(),
+                'streams': sorted(worker['streams'].keys()),
+                'restarts': worker['restarts'],
+                'writer': worker['status'].get('writer'),
+                'images': worker['status'].get('images'),
+                'artifacts': worker['status'].get('artifacts'),
+                'recordings': worker['status'].get('recordings'),
+                'last_report_age_s': round(now - worker['last_report'], 1) if worker['last_report'] else None
+            }
+            for index, worker in enumerate(self._workers)
+        ]
+
+    def _handle_event(self, event):
+        kind = event[0]
+        if kind == 'frame':
+            _, stream_id, name, slot, shape, dtype, sequence = event
+            if not self.frame_hub.has_subscribers(stream_id):
+                return
+            frame = self._reader.read(stream_id, name, slot, shape, dtype, sequence)
+            if frame is not None:
+                self.frame_hub.publish(stream_id, frame)
+        elif kind == 'result':
+            _, _, request_id, result = event
+            with self._lock:
+                pending = self._pending.get(request_id)
+            if pending:
+                pending['result'] = result
+                pending['event'].set()
+        elif kind == 'status':
+            _, index, pid, status = event
+            worker = self._workers[index]
+            worker['status'] = status
+            worker['pid'] = pid
+            worker['last_report'] = time.time()
+            pending = status.pop('dashboard', None)
+            if pending and self.dashboard:
+                self.dashboard.apply_pending(pending)
+                if self.push_hub and any(pending.values()):
+                    self.push_hub.publish('summary', self.dashboard.get_summary(), key='summary')
+        elif kind == 'publish':
+            _, topic, data, key = event
+            if self.push_hub:
+                self.push_hub.publish(topic, data, key)
+        elif kind == 'thumbnail':
+            _, source, widths = event
+            if self.thumbnails:
+                self.thumbnails.prefetch(source, widths)
+
+    def _sync_watchers(self):
+        for stream_id, index in list(self._assignments.items()):
+            watched = self.frame_hub.has_subscribers(stream_id)
+            if watched != (stream_id in self._watched):
+                if watched:
+                    self._watched.add(stream_id)
+                else:
+                    self._watched.discard(stream_id)
+                self._send(index, 'watch', stream_id, watched)
+
+    def _check_workers(self):
+        for index, worker in enumerate(self._workers):
+            if not self.running or worker['process'].is_alive():
+                continue
+
+            logger.error(f"Stream worker {index} exited with code {worker['process'].exitcode}, restarting")
+            worker['restarts'] += 1
+            worker['status'] = {}
+            self._spawn(index)
+
+            # Commands are handled in order, so the streams can be re-added
+            # and restarted without waiting for replies
+            for stream_id, info in worker['streams'].items():
+                self._send(index, 'add', stream_id, info['url'], info['name'])
+                if info['running']:
+                    self._send(index, 'start', stream_id)
+                if stream_id in self._watched:
+                    self._send(index, 'watch', stream_id, True)
+
+    def _supervise(self):
+        last_check = time.time()
+        while self.running:
+            try:
+                event = self._event_queue.get(timeout=0.1)
+                self._handle_event(event)
+            except queue.Empty:
+                pass
+            except Exception as e:
+                logger.error(f"Error handling worker event: {e}")
+
+            try:
+                self._sync_watchers()
+                if time.time() - last_check >= STATUS_INTERVAL:
+                    self._check_workers()
+                    last_check = time.time()
+            except Exception as e:
+                logger.error(f"Error supervising stream workers: {e}")
+
+    def shutdown(self, timeout: float = 10):
+        self.running = False
+        for index, worker in enumerate(self._workers):
+            try:
+                self._send(index, 'shutdown')
+            except Exception:
+                pass
+
+        deadline = time.time() + timeout
+        for worker in self._workers:
+            process = worker['process']
+            process.join(timeout=max(0.1, deadline - time.time()))
+            if process.is_alive():
+                process.terminate()
+
+        if self._supervisor:
+            self._supervisor.join(timeout=2)
+        self._reader.close()
+        logger.info("Stream worker pool stopped")
@@ -0,0 +1,88 @@
+import gc
+import os
+from types import SimpleNamespace
+
+import numpy as np
+
+from src.artifacts import ArtifactStore, remove_event_files
+from src.image_writer import ImageWriter
+
+
+def _image(value: int = 0) -> np.ndarray:
+    return np.full((8, 8, 3), value, dtype=np.uint8)
+
+
+def test_same_frame_is_written_once_per_stream(tmp_path):
+    store = ArtifactStore()
+    frame = _image()
+    first = store.save(1, str(tmp_path / "motion.jpg"), frame)
+    assert store.save(1, str(tmp_path / "objects.jpg"), frame) == first
+    # An equal but distinct frame, and the same frame on another stream, are saved again
+    assert store.save(1, str(tmp_path / "other.jpg"), _image()) != first
+    assert store.save(2, str(tmp_path / "stream2.jpg"), frame) != first
+    assert sorted(os.listdir(tmp_path)) == ["motion.jpg", "other.jpg", "stream2.jpg"]
+    assert (store.saved, store.shared) == (3, 1)
+
+
+def test_freed_frames_are_forgotten(tmp_path):
+    store = ArtifactStore()
+    frame = _image()
+    store.save(1, str(tmp_path / "a.jpg"), frame)
+    assert store.get_status()['tracked_frames'] == 1
+    del frame
+    gc.collect()
+    assert store.get_status()['tracked_frames'] == 0
+
+
+def test_crops_are_matched_by_content_in_a_bounded_cache(tmp_path):
+    store = ArtifactStore(max_entries=2)
+    first = store.save(1, str(tmp_path / "a.jpg"), _image(1), by_content=True)
+    assert store.save(1, str(tmp_path / "b.jpg"), _image(1), by_content=True) == first
+    store.save(1, str(tmp_path / "c.jpg"), _image(2), by_content=True)
+    store.save(1, str(tmp_path / "d.jpg"), _image(3), by_content=True)
+    # The first crop fell out of the cache and is written again
+    assert store.save(1, str(tmp_path / "e.jpg"), _image(1), by_content=True) == str(tmp_path / "e.jpg")
+    assert store.get_status()['tracked_crops'] == 2
+
+
+def test_dropped_images_are_not_shared(tmp_path):
+    writer = ImageWriter(max_size=1, policy='drop_newest')
+    # Accepting work with no threads, so the queue stays full
+    writer.running = True
+    writer.submit(str(tmp_path / "queued.jpg"), _image())
+    store = ArtifactStore(writer)
+    frame = _image()
+    assert store.save(1, str(tmp_path / "a.jpg"), frame) is None
+    assert store.get_status()['tracked_frames'] == 0 and store.saved == 0
+
+
+def test_release_stream_forgets_only_that_stream(tmp_path):
+    store = ArtifactStore()
+    frames = [_image(), _image()]
+    store.save(1, str(tmp_path / "a.jpg"), frames[0])
+    store.save(2, str(tmp_path / "b.jpg"), frames[1])
+    store.save(1, str(tmp_path / "c.jpg"), _image(5), by_content=True)
+    store.release_stream(1)
+    assert store.get_status()['tracked_frames'] == 1 and store.get_status()['tracked_crops'] == 0
+
+
+def _event(frame_path=None, frame_paths=(), clip_path=None, video_path=None):
+    return SimpleNamespace(frame_path=frame_path, event_metadata={'frame_paths': list(frame_paths)},
+                           clip_path=clip_path, video_path=video_path)
+
+
+def test_shared_files_are_removed_once_and_kept_files_stay(tmp_path):
+    paths = {name: str(tmp_path / name) for name in ("shared.jpg", "peak.jpg", "kept.jpg", "clip.jpg", "clip.mp4")}
+    for path in paths.values():
+        open(path, "wb").close()
+
+    events = [
+        _event(paths["shared.jpg"], [paths["peak.jpg"], paths["shared.jpg"]], video_path=paths["clip.mp4"]),
+        _event(paths["shared.jpg"], clip_path=paths["clip.jpg"], video_path=paths["clip.mp4"]),
+        _event(paths["kept.jpg"]),
+        _event(str(tmp_path / "already_gone.jpg")),
+    ]
+    deleted = remove_event_files(events, keep=[paths["kept.jpg"]])
+
+    assert deleted == {'frames': 2, 'clips': 1, 'videos': 1}
+    assert os.listdir(tmp_path) == ["kept.jpg"]
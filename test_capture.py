@@ -0,0 +1,61 @@
+import numpy as np
+
+import src.capture
+from src.capture import CaptureThread, FrameRingBuffer
+
+FRAME = np.zeros((4, 4, 3), dtype=np.uint8)
+
+
+def test_ring_buffer_keeps_only_the_newest_frames():
+    buffer = FrameRingBuffer(capacity=2)
+    for index in range(5):
+        buffer.put(np.full((2, 2), index, dtype=np.uint8), float(index))
+
+    sequence, captured_at, frame = buffer.get_latest(timeout=0)
+    assert (sequence, captured_at, frame[0, 0]) == (5, 4.0, 4)
+    # Unread frames the reader skipped, including the overwritten ones
+    assert buffer.captured_frames == 5 and buffer.dropped_frames == 4
+    assert buffer.get_latest(timeout=0) is None
+
+
+def test_ring_buffer_counts_nothing_dropped_when_read_in_step():
+    buffer = FrameRingBuffer(capacity=2)
+    for index in range(3):
+        buffer.put(FRAME, float(index))
+        assert buffer.get_latest(timeout=0)[0] == index + 1
+    assert buffer.dropped_frames == 0
+
+
+class _Processor:
+    stream_id = 1
+    fps = 10.0
+
+    def __init__(self, is_file: bool, frames: int = 3):
+        self.is_file = is_file
+        self.frames = frames
+        self.capture = None
+
+    def read_frame(self):
+        self.frames -= 1
+        if self.frames == 0:
+            self.capture.running = False
+        return True, FRAME
+
+
+def _sleeps(monkeypatch, processor) -> list:
+    sleeps = []
+    monkeypatch.setattr(src.capture.time, "time", lambda: 100.0)
+    monkeypatch.setattr(src.capture.time, "sleep", sleeps.append)
+    buffer = FrameRingBuffer()
+    processor.capture = CaptureThread(processor, buffer)
+    processor.capture.run()
+    assert buffer.captured_frames == 3
+    return sleeps
+
+
+def test_file_sources_are_paced_at_their_frame_rate(monkeypatch):
+    assert _sleeps(monkeypatch, _Processor(is_file=True)) == [0.1, 0.1, 0.1]
+
+
+def test_live_sources_are_read_without_sleeping(monkeypatch):
+    assert _sleeps(monkeypatch, _Processor(is_file=False)) == []
@@ -0,0 +1,99 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+import src.counters
+from src.counters import DashboardCounters, SlidingWindowCounter
+from src.database import SessionLocal
+from src.models import VideoAnalytics, VideoEvent, VideoStream
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = SimpleNamespace(now=1_000_000.0)
+    monkeypatch.setattr(src.counters, "time", SimpleNamespace(time=lambda: clock.now))
+    return clock
+
+
+def test_counts_within_window(clock):
+    counter = SlidingWindowCounter(window=60, resolution=10)
+    counter.add()
+    counter.add(clock.now - 30, count=2)
+    assert counter.total() == 3
+
+
+def test_expired_buckets_drop_out(clock):
+    counter = SlidingWindowCounter(window=60, resolution=10)
+    counter.add(count=5)
+    clock.now += 30
+    counter.add()
+    assert counter.total() == 6
+    clock.now += 40
+    assert counter.total() == 1
+    clock.now += 600
+    assert counter.total() == 0
+
+
+def test_rows_outside_window_are_not_counted(clock):
+    counter = SlidingWindowCounter(window=60, resolution=10)
+    counter.add(clock.now - 120)
+    counter.add(clock.now + 20)
+    assert counter.total() == 0
+
+
+def test_clear(clock):
+    counter = SlidingWindowCounter(window=60, resolution=10)
+    counter.add(count=4)
+    counter.clear()
+    assert counter.total() == 0
+
+
+def test_dashboard_counts_written_rows():
+    counters = DashboardCounters()
+    now = datetime.utcnow()
+    counters([
+        (VideoEvent, {'event_time': now}),
+        (VideoEvent, {'event_time': now - timedelta(days=2)}),
+        (VideoAnalytics, {'timestamp': now}),
+        (VideoStream, {}),
+    ])
+    summary = counters.get_summary()
+    assert summary['recent_events_24h'] == 1
+    assert summary['recent_analytics_1h'] == 1
+
+
+def test_forwarded_counts_are_applied_by_the_api_process():
+    worker, api = DashboardCounters(), DashboardCounters()
+    worker.forwarding = True
+    worker([(VideoEvent, {'event_time': datetime.utcnow()})] * 3)
+    assert worker.recent_events.total() == 0
+
+    api.apply_pending(worker.take_pending())
+    assert api.get_summary()['recent_events_24h'] == 3
+    assert worker.take_pending() == {'events': {}, 'analytics': {}}
+
+
+def test_seed_loads_recent_rows(database):
+    db = SessionLocal()
+    try:
+        db.add(VideoStream(stream_name="test", stream_url="test.mp4", stream_type="file", is_active=True))
+        db.flush()
+        now = datetime.utcnow()
+        db.add_all([
+            VideoEvent(stream_id=1, event_type="motion", event_time=now - timedelta(hours=1)),
+            VideoEvent(stream_id=1, event_type="motion", event_time=now - timedelta(days=3)),
+            VideoAnalytics(stream_id=1, timestamp=now - timedelta(minutes=5)),
+        ])
+        db.commit()
+    finally:
+        db.close()
+
+    counters = DashboardCounters()
+    counters.seed()
+    assert counters.get_summary() == {
+        "total_streams": 1,
+        "active_streams": 1,
+        "recent_events_24h": 1,
+        "recent_analytics_1h": 1,
+    }
@@ -0,0 +1,122 @@
+import asyncio
+import logging
+import threading
+import time
+
+import pytest
+from sqlalchemy import text
+
+from src.database import Base, SessionLocal, engine, init_db, run_in_db, schema_migrations
+from src.models import VideoEvent, VideoStream
+
+# video_streams as it was created before stream ids were AUTOINCREMENT
+OLD_STREAMS_TABLE = """
+CREATE TABLE video_streams (
+    stream_id INTEGER NOT NULL PRIMARY KEY,
+    stream_name VARCHAR(255) NOT NULL,
+    stream_url VARCHAR(500) NOT NULL,
+    stream_type VARCHAR(50),
+    is_active BOOLEAN,
+    created_at DATETIME,
+    updated_at DATETIME
+)
+"""
+
+
+@pytest.fixture
+def old_database():
+    """An in-memory database holding streams and events from before the migrations"""
+    Base.metadata.drop_all(bind=engine)
+    with engine.begin() as conn:
+        conn.exec_driver_sql(OLD_STREAMS_TABLE)
+        conn.exec_driver_sql("CREATE INDEX ix_video_streams_stream_id ON video_streams (stream_id)")
+    VideoEvent.__table__.create(bind=engine)
+    with engine.begin() as conn:
+        for stream_id, name in ((1, "front"), (2, "back"), (3, "gone")):
+            conn.execute(text("INSERT INTO video_streams (stream_id, stream_name, stream_url, stream_type, is_active) "
+                              "VALUES (:id, :name, 'a.mp4', 'file', 1)"), {"id": stream_id, "name": name})
+        for stream_id in (1, 2, 3):
+            conn.execute(text("INSERT INTO video_events (stream_id, event_type) VALUES (:id, 'motion')"),
+                         {"id": stream_id})
+        # Stream 3 was deleted before the purge engine removed events with it
+        conn.exec_driver_sql("DELETE FROM video_streams WHERE stream_id = 3")
+    yield
+    Base.metadata.drop_all(bind=engine)
+
+
+def _scalar(sql: str):
+    with engine.connect() as conn:
+        return conn.exec_driver_sql(sql).scalar()
+
+
+def test_autoincrement_migration_keeps_rows_and_foreign_keys(old_database):
+    init_db()
+
+    assert "AUTOINCREMENT" in _scalar("SELECT sql FROM sqlite_master WHERE name = 'video_streams'").upper()
+    with engine.connect() as conn:
+        assert conn.exec_driver_sql(
+            "SELECT stream_id, stream_name FROM video_streams ORDER BY stream_id").all() == [(1, "front"), (2, "back")]
+        # Events still point at their streams, through a key naming video_streams
+        assert conn.exec_driver_sql(
+            "SELECT e.stream_id, s.stream_name FROM video_events e JOIN video_streams s USING (stream_id) "
+            "ORDER BY e.stream_id").all() == [(1, "front"), (2, "back")]
+        assert {row[2] for row in conn.exec_driver_sql("PRAGMA foreign_key_list(video_events)")} == {"video_streams"}
+        assert conn.execute(schema_migrations.select()).all()[0][:2] == (1, "sqlite_autoincrement_ids")
+
+    # The id events still refer to is not handed out again
+    with engine.begin() as conn:
+        conn.exec_driver_sql("INSERT INTO video_streams (stream_name, stream_url) VALUES ('new', 'b.mp4')")
+    assert _scalar("SELECT MAX(stream_id) FROM video_streams") == 4
+
+
+def test_migrations_run_once(old_database, caplog):
+    init_db()
+    with caplog.at_level(logging.INFO, logger="src.database"):
+        init_db()
+    assert "Rebuilt" not in caplog.text and "Applied migration" not in caplog.text
+    assert _scalar("SELECT COUNT(*) FROM schema_migrations") == 1
+
+
+def test_new_databases_record_migrations_without_rebuilding(database):
+    assert "AUTOINCREMENT" in _scalar("SELECT sql FROM sqlite_master WHERE name = 'video_streams'").upper()
+    assert _scalar("SELECT COUNT(*) FROM schema_migrations") == 1
+
+
+def test_run_in_db_keeps_the_event_loop_free(database):
+    def slow_count(db):
+        time.sleep(0.2)
+        return threading.current_thread().name, db.query(VideoStream).count()
+
+    async def main():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        task = asyncio.create_task(ticker())
+        result = await run_in_db(slow_count)
+        task.cancel()
+        return result, ticks
+
+    (thread, count), ticks = asyncio.run(main())
+    assert thread.startswith("db") and count == 0
+    # The loop kept running while the query slept
+    assert ticks >= 5
+
+
+def test_run_in_db_rolls_back_a_failed_call(database):
+    def add_and_fail(db, name):
+        db.add(VideoStream(stream_name=name, stream_url="a.mp4"))
+        db.flush()
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        asyncio.run(run_in_db(add_and_fail, "lost"))
+    db = SessionLocal()
+    try:
+        assert db.query(VideoStream).count() == 0
+    finally:
+        db.close()
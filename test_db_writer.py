@@ -0,0 +1,140 @@
+import threading
+import time
+
+import pytest
+
+import src.db_writer
+from src.database import SessionLocal
+from src.db_writer import DatabaseWriter
+from src.models import VideoAnalytics, VideoEvent, VideoStream
+
+
+@pytest.fixture
+def stream_id(database):
+    db = SessionLocal()
+    try:
+        stream = VideoStream(stream_name="test", stream_url="test.mp4", stream_type="file")
+        db.add(stream)
+        db.commit()
+        return stream.stream_id
+    finally:
+        db.close()
+
+
+@pytest.fixture
+def writer():
+    writers = []
+
+    def make(**kwargs) -> DatabaseWriter:
+        options = dict(flush_interval=60)
+        options.update(kwargs)
+        writers.append(DatabaseWriter(**options))
+        writers[-1].start()
+        return writers[-1]
+
+    yield make
+    for started in writers:
+        started.stop(timeout=5)
+
+
+def _column(model, name):
+    db = SessionLocal()
+    try:
+        return sorted(value for value, in db.query(getattr(model, name)).all())
+    finally:
+        db.close()
+
+
+def test_drain_flushes_everything_queued_before_it(stream_id, writer):
+    db_writer = writer()
+    db_writer.insert(VideoEvent, {'stream_id': stream_id, 'event_type': 'motion'})
+    assert _column(VideoEvent, 'event_type') == []
+    assert db_writer.drain(timeout=5)
+    assert _column(VideoEvent, 'event_type') == ['motion']
+
+
+def test_drop_newest_discards_incoming_droppable_rows(stream_id, writer):
+    db_writer = writer(max_size=2, policy='drop_newest')
+    for fps in (1.0, 2.0, 3.0):
+        db_writer.insert(VideoAnalytics, {'stream_id': stream_id, 'fps': fps}, droppable=True)
+    assert db_writer.drain(timeout=5)
+    assert db_writer.dropped == 1
+    assert _column(VideoAnalytics, 'fps') == [1.0, 2.0]
+
+
+def test_drop_oldest_discards_queued_droppable_rows(stream_id, writer):
+    db_writer = writer(max_size=2, policy='drop_oldest')
+    for fps in (1.0, 2.0, 3.0):
+        db_writer.insert(VideoAnalytics, {'stream_id': stream_id, 'fps': fps}, droppable=True)
+    assert db_writer.drain(timeout=5)
+    assert db_writer.dropped == 1
+    assert _column(VideoAnalytics, 'fps') == [2.0, 3.0]
+
+
+def test_events_wait_for_room_instead_of_being_dropped(stream_id, writer):
+    db_writer = writer(max_size=1, policy='drop_newest', flush_interval=0.1)
+    db_writer.insert(VideoAnalytics, {'stream_id': stream_id, 'fps': 1.0}, droppable=True)
+    db_writer.insert(VideoEvent, {'stream_id': stream_id, 'event_type': 'motion'})
+    assert db_writer.drain(timeout=5)
+    assert db_writer.dropped == 0
+    assert _column(VideoEvent, 'event_type') == ['motion']
+
+
+def test_failed_batch_keeps_its_good_events(stream_id, writer, monkeypatch):
+    monkeypatch.setattr(src.db_writer, "WRITE_RETRY_DELAY", 0)
+    db_writer = writer()
+    db_writer.insert(VideoEvent, {'stream_id': stream_id, 'event_type': 'first'})
+    # event_type is NOT NULL, so this row fails the whole batch
+    db_writer.insert(VideoEvent, {'stream_id': stream_id, 'event_type': None})
+    db_writer.insert(VideoAnalytics, {'stream_id': stream_id, 'fps': 1.0}, droppable=True)
+    db_writer.insert(VideoEvent, {'stream_id': stream_id, 'event_type': 'second'})
+    assert db_writer.drain(timeout=5)
+    assert _column(VideoEvent, 'event_type') == ['first', 'second']
+    assert _column(VideoAnalytics, 'fps') == []
+    assert (db_writer.written, db_writer.failed) == (2, 2)
+
+
+def test_listeners_see_committed_inserts(stream_id, writer):
+    db_writer = writer()
+    seen = []
+    db_writer.add_listener(lambda inserted: seen.extend(model for model, _ in inserted))
+    db_writer.insert(VideoEvent, {'stream_id': stream_id, 'event_type': 'motion'})
+    assert db_writer.drain(timeout=5)
+    assert seen == [VideoEvent]
+
+
+def test_listeners_get_the_ids_of_inserted_rows(stream_id, writer):
+    db_writer = writer()
+    seen = []
+    db_writer.add_listener(seen.extend)
+    for event_type in ('motion', 'person', 'car'):
+        db_writer.insert(VideoEvent, {'stream_id': stream_id, 'event_type': event_type})
+    assert db_writer.drain(timeout=5)
+    pushed = {values['event_type']: values['event_id'] for _, values in seen}
+    db = SessionLocal()
+    try:
+        assert pushed == {event.event_type: event.event_id for event in db.query(VideoEvent).all()}
+    finally:
+        db.close()
+
+
+def test_writes_through_when_not_started(stream_id):
+    DatabaseWriter().insert(VideoEvent, {'stream_id': stream_id, 'event_type': 'motion'})
+    assert _column(VideoEvent, 'event_type') == ['motion']
+
+
+def test_writes_through_when_stopped_during_backpressure(stream_id):
+    db_writer = DatabaseWriter(max_size=1)
+    # Running, but with no writer thread the queue never gets room
+    db_writer.running = True
+    db_writer.insert(VideoAnalytics, {'stream_id': stream_id, 'fps': 1.0}, droppable=True)
+    producer = threading.Thread(
+        target=db_writer.insert, args=(VideoEvent, {'stream_id': stream_id, 'event_type': 'motion'}))
+    producer.start()
+    time.sleep(0.2)
+    assert producer.is_alive()
+
+    db_writer.stop()
+    producer.join(timeout=5)
+    assert not producer.is_alive()
+    assert _column(VideoEvent, 'event_type') == ['motion']
@@ -0,0 +1,122 @@
+import asyncio
+import os
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from src.file_serving import _parse_range, media_file_response, resolve_media_path
+from src.packs import append_entry
+
+DATA = bytes(range(256)) * 4
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-99", (0, 99)),
+    ("bytes=100-", (100, 1023)),
+    ("bytes=-24", (1000, 1023)),
+    ("bytes=-5000", (0, 1023)),
+    ("bytes=1000-5000", (1000, 1023)),
+    ("BYTES = 5-6", (5, 6)),
+])
+def test_parse_range(header, expected):
+    assert _parse_range(header, len(DATA)) == expected
+
+
+@pytest.mark.parametrize("header", ["items=0-1", "bytes=0-1,5-6", "bytes=abc", "bytes=-", "bytes=9-3"])
+def test_ignored_ranges_serve_whole_file(header):
+    assert _parse_range(header, len(DATA)) is None
+
+
+@pytest.mark.parametrize("header", ["bytes=1024-", "bytes=-0"])
+def test_unsatisfiable_ranges(header):
+    with pytest.raises(ValueError):
+        _parse_range(header, len(DATA))
+
+
+def test_resolve_media_path_stays_inside_root(tmp_path):
+    root = tmp_path / "frames"
+    root.mkdir()
+    (root / "a.jpg").write_bytes(b"x")
+    assert resolve_media_path("a.jpg", str(root)) == str(root / "a.jpg")
+    assert resolve_media_path(str(root / "a.jpg"), str(root)) == str(root / "a.jpg")
+    for requested in ("../secret", "/etc/passwd", ""):
+        with pytest.raises(HTTPException):
+            resolve_media_path(requested, str(root))
+
+
+def _serve(path: str, **headers):
+    """(status, headers, body) of media_file_response for a GET with ``headers``"""
+    scope = {
+        "type": "http",
+        "method": "GET",
+        "path": "/",
+        "headers": [(name.replace("_", "-").encode(), value.encode()) for name, value in headers.items()],
+    }
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    async def run():
+        response = await media_file_response(Request(scope, receive), path)
+        await response(scope, receive, send)
+
+    asyncio.run(run())
+    start = messages[0]
+    body = b"".join(message.get("body", b"") for message in messages[1:])
+    return start["status"], {k.decode(): v.decode() for k, v in start["headers"]}, body
+
+
+@pytest.fixture
+def media_file(tmp_path):
+    path = tmp_path / "clip.jpg"
+    path.write_bytes(DATA)
+    return str(path)
+
+
+def test_full_response_has_validators(media_file):
+    status, headers, body = _serve(media_file)
+    assert status == 200 and body == DATA
+    assert headers["accept-ranges"] == "bytes"
+    assert "immutable" in headers["cache-control"]
+    assert headers["etag"] and headers["last-modified"]
+
+
+def test_range_response(media_file):
+    status, headers, body = _serve(media_file, range="bytes=10-19")
+    assert status == 206 and body == DATA[10:20]
+    assert headers["content-range"] == f"bytes 10-19/{len(DATA)}"
+    assert headers["content-length"] == "10"
+
+
+def test_unsatisfiable_range_response(media_file):
+    status, headers, _ = _serve(media_file, range="bytes=5000-")
+    assert status == 416 and headers["content-range"] == f"bytes */{len(DATA)}"
+
+
+def test_conditional_requests(media_file):
+    etag = _serve(media_file)[1]["etag"]
+    assert _serve(media_file, if_none_match=etag)[0] == 304
+    # A stale If-Range gets the whole file instead of a range of the new one
+    status, _, body = _serve(media_file, range="bytes=0-9", if_range='"stale"')
+    assert status == 200 and body == DATA
+
+
+def test_missing_file_is_404(tmp_path):
+    with pytest.raises(HTTPException) as error:
+        _serve(str(tmp_path / "missing.jpg"))
+    assert error.value.status_code == 404
+
+
+def test_pack_entry_is_served_from_its_offset(tmp_path):
+    pack = os.path.join(str(tmp_path), "2024010112.pack")
+    append_entry(os.path.join(pack, "a.jpg"), b"first")
+    append_entry(os.path.join(pack, "b.jpg"), DATA)
+    status, _, body = _serve(os.path.join(pack, "b.jpg"))
+    assert status == 200 and body == DATA
+    status, _, body = _serve(os.path.join(pack, "b.jpg"), range="bytes=-4")
+    assert status == 206 and body == DATA[-4:]
@@ -0,0 +1,175 @@
+import asyncio
+import os
+
+import cv2
+import numpy as np
+import pytest
+from fastapi import HTTPException
+
+import app as api
+import src.hls
+from src.database import SessionLocal
+from src.fmp4 import fragment
+from src.hls import PLAYLIST_NAME, STALE_SEGMENTS, HlsHub, _OpenCvSegments
+from src.models import VideoStream
+from src.recorder import can_encode
+
+needs_vp9 = pytest.mark.skipif(not can_encode('.mp4', 'VP90'), reason="OpenCV cannot write VP9 MP4")
+
+
+def _frame(index: int) -> np.ndarray:
+    frame = np.zeros((48, 64, 3), dtype=np.uint8)
+    frame[:, index % 64] = 255
+    return frame
+
+
+def _decoded_frames(path: str) -> int:
+    capture = cv2.VideoCapture(path)
+    count = 0
+    while capture.read()[0]:
+        count += 1
+    capture.release()
+    return count
+
+
+@needs_vp9
+def test_fragment_keeps_every_sample(tmp_path):
+    source = str(tmp_path / "source.mp4")
+    writer = cv2.VideoWriter(source, cv2.VideoWriter_fourcc(*'VP90'), 10, (64, 48))
+    for index in range(12):
+        writer.write(_frame(index))
+    writer.release()
+
+    init, media = fragment((tmp_path / "source.mp4").read_bytes(), sequence=3)
+    assert b'mvex' in init and b'moof' not in init
+    assert media[4:8] == b'moof'
+    joined = tmp_path / "joined.mp4"
+    joined.write_bytes(init + media)
+    assert _decoded_frames(str(joined)) == 12
+
+
+def test_fragment_rejects_files_without_moov():
+    with pytest.raises(ValueError):
+        fragment(b'\x00\x00\x00\x08free')
+
+
+@needs_vp9
+def test_opencv_segments_roll_a_playlist(tmp_path):
+    segments = _OpenCvSegments(str(tmp_path), "abc", fps=10, segment_seconds=0.5, window=2, codec='VP90')
+    for index in range(5 * 5):
+        segments.write(index / 10, _frame(index))
+    segments.close()
+
+    # Five segments, of which the window and the stale ones are kept
+    names = sorted(name for name in os.listdir(tmp_path) if name != PLAYLIST_NAME)
+    kept = [f"abc_{sequence:06d}" for sequence in range(5 - 2 - STALE_SEGMENTS, 5)]
+    assert names == sorted([f"{name}.m4s" for name in kept] + [f"{name}.mp4" for name in kept])
+
+    playlist = (tmp_path / PLAYLIST_NAME).read_text().splitlines()
+    assert "#EXT-X-MEDIA-SEQUENCE:3" in playlist
+    assert "#EXT-X-DISCONTINUITY-SEQUENCE:3" in playlist
+    assert playlist[-7:] == [
+        '#EXT-X-MAP:URI="abc_000003.mp4"', "#EXTINF:0.500,", "abc_000003.m4s",
+        "#EXT-X-DISCONTINUITY",
+        '#EXT-X-MAP:URI="abc_000004.mp4"', "#EXTINF:0.500,", "abc_000004.m4s",
+    ]
+
+    joined = tmp_path / "joined.mp4"
+    joined.write_bytes((tmp_path / "abc_000004.mp4").read_bytes() + (tmp_path / "abc_000004.m4s").read_bytes())
+    assert _decoded_frames(str(joined)) == 5
+
+
+@needs_vp9
+def test_opencv_segments_repeat_frames_over_gaps(tmp_path):
+    segments = _OpenCvSegments(str(tmp_path), "abc", fps=10, segment_seconds=1, window=3, codec='VP90')
+    # Only three frames arrive in the first second; the segment still holds ten
+    for timestamp in (0.0, 0.45, 0.95):
+        segments.write(timestamp, _frame(int(timestamp * 10)))
+    assert list(segments.segments) == [(0, "abc_000000", 1.0)]
+    segments.close()
+
+
+@needs_vp9
+def test_pick_encoder(monkeypatch):
+    monkeypatch.setattr(src.hls.shutil, "which", lambda binary: None)
+    monkeypatch.setattr(src.hls, "HLS_ENCODER", "auto")
+    assert HlsHub._pick_encoder() in {('opencv', 'avc1'), ('opencv', 'VP90')}
+    monkeypatch.setattr(src.hls, "HLS_ENCODER", "ffmpeg")
+    assert HlsHub._pick_encoder() is None
+
+    monkeypatch.setattr(src.hls.shutil, "which", lambda binary: "/usr/bin/ffmpeg")
+    assert HlsHub._pick_encoder() == ('ffmpeg', "/usr/bin/ffmpeg")
+    monkeypatch.setattr(src.hls, "HLS_ENCODER", "opencv")
+    assert HlsHub._pick_encoder()[0] == 'opencv'
+
+    monkeypatch.setattr(src.hls, "can_encode", lambda extension, codec: False)
+    assert HlsHub._pick_encoder() is None
+
+
+def test_segment_names_and_types():
+    hub = HlsHub(frame_hub=None)
+    assert hub.segment_path(1, "../playlist.m3u8") is None
+    assert hub.media_type("abc_000001.ts") == "video/mp2t"
+    assert hub.media_type("abc_000001.m4s") == "video/mp4"
+    assert hub.media_type("abc_000001.mp4") == "video/mp4"
+
+
+@pytest.fixture
+def hls_stream(database, monkeypatch):
+    """A stream row, running in the app's manager, with a usable HLS encoder"""
+    db = SessionLocal()
+    stream = VideoStream(stream_name="test", stream_url="test.mp4", stream_type="file")
+    db.add(stream)
+    db.commit()
+    stream_id = stream.stream_id
+    db.close()
+
+    hub = api.stream_manager.hls
+    monkeypatch.setattr(hub, "encoder", ('opencv', 'VP90'))
+    monkeypatch.setitem(api.stream_manager.active_streams, stream_id, {'running': True})
+    return stream_id
+
+
+def _playlist(stream_id: int):
+    return asyncio.run(api.get_hls_playlist(stream_id))
+
+
+def test_playlist_is_503_without_an_encoder(hls_stream, monkeypatch):
+    monkeypatch.setattr(api.stream_manager.hls, "encoder", None)
+    with pytest.raises(HTTPException) as error:
+        _playlist(hls_stream)
+    assert error.value.status_code == 503 and "no usable encoder" in error.value.detail
+
+
+def test_playlist_of_a_stopped_stream_is_409(hls_stream, monkeypatch):
+    monkeypatch.setitem(api.stream_manager.active_streams, hls_stream, {'running': False})
+    with pytest.raises(HTTPException) as error:
+        _playlist(hls_stream)
+    assert error.value.status_code == 409
+
+
+def test_playlist_is_served_once_ready(hls_stream, monkeypatch, tmp_path):
+    playlist = tmp_path / PLAYLIST_NAME
+    playlist.write_text("#EXTM3U\n")
+    monkeypatch.setattr(api.stream_manager.hls, "touch", lambda stream_id: str(playlist))
+    response = _playlist(hls_stream)
+    assert response.body == b"#EXTM3U\n"
+    assert response.media_type == "application/vnd.apple.mpegurl"
+    assert response.headers["cache-control"] == "no-cache"
+
+
+def test_playlist_not_ready_in_time_is_503_with_retry_after(hls_stream, monkeypatch, tmp_path):
+    monkeypatch.setattr(api.stream_manager.hls, "touch", lambda stream_id: str(tmp_path / PLAYLIST_NAME))
+    # Every look at the clock is a minute later, so the wait gives up at once
+    clock = iter(range(0, 3600, 60))
+    monkeypatch.setattr(api.time, "time", lambda: next(clock))
+    with pytest.raises(HTTPException) as error:
+        _playlist(hls_stream)
+    assert error.value.status_code == 503 and error.value.detail == "Playlist not ready yet"
+    assert int(error.value.headers["Retry-After"]) >= 1
+
+
+def test_unknown_segments_are_404(hls_stream):
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(api.get_hls_segment(hls_stream, "abc_000001.m4s", request=None))
+    assert error.value.status_code == 404
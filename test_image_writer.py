@@ -0,0 +1,99 @@
+import os
+import threading
+import time
+
+import cv2
+import numpy as np
+import pytest
+
+import src.image_writer
+from src.image_writer import ImageWriter
+
+IMAGE = np.zeros((8, 8, 3), dtype=np.uint8)
+
+
+@pytest.fixture
+def gated_store(monkeypatch):
+    """store_image that waits for the test to open the gate"""
+    gate = threading.Event()
+    stored = []
+
+    def store(path, image, quality=95):
+        gate.wait(timeout=5)
+        stored.append((path, quality))
+        return 0.0, 0.0
+
+    monkeypatch.setattr(src.image_writer, "store_image", store)
+    yield gate, stored
+    gate.set()
+
+
+def _idle_writer(**kwargs) -> ImageWriter:
+    """A writer accepting work with no threads to write it, so its queue only fills"""
+    writer = ImageWriter(**kwargs)
+    writer.running = True
+    return writer
+
+
+def test_writes_inline_when_not_started(tmp_path):
+    path = str(tmp_path / "frame.jpg")
+    assert ImageWriter().submit(path, IMAGE) == path
+    assert cv2.imread(path).shape == IMAGE.shape
+
+
+def test_drop_newest_returns_none_for_images_that_do_not_fit():
+    writer = _idle_writer(max_size=2, policy='drop_newest')
+    assert [writer.submit(f"{index}.jpg", IMAGE) for index in range(3)] == ["0.jpg", "1.jpg", None]
+    assert writer.dropped == 1 and writer.get_status()['queue_depth'] == 2
+
+
+def test_drop_oldest_is_remapped_to_drop_newest():
+    # Queued paths are already stored in events, so they are never dropped
+    writer = _idle_writer(max_size=1, policy='drop_oldest')
+    assert writer.policy == 'drop_newest'
+    assert writer.submit("0.jpg", IMAGE) == "0.jpg"
+    assert writer.submit("1.jpg", IMAGE) is None
+    assert [queued[0] for queued in writer._queue] == ["0.jpg"]
+
+
+def test_lower_quality_past_half_full():
+    writer = _idle_writer(max_size=4, policy='lower_quality', quality=95, reduced_quality=70)
+    for index in range(4):
+        writer.submit(f"{index}.jpg", IMAGE)
+    assert [queued[2] for queued in writer._queue] == [95, 95, 70, 70]
+    assert writer.reduced == 2
+
+
+def test_block_waits_for_room_instead_of_dropping(gated_store):
+    gate, stored = gated_store
+    writer = ImageWriter(threads=1, max_size=1, policy='block')
+    writer.start()
+    try:
+        writer.submit("0.jpg", IMAGE, stream_id=1)
+        # Wait for the worker to take it, so the next one fills the queue
+        while writer.get_status()['queue_depth']:
+            time.sleep(0.01)
+        writer.submit("1.jpg", IMAGE, stream_id=1)
+
+        producer = threading.Thread(target=writer.submit, args=("2.jpg", IMAGE), kwargs={'stream_id': 1})
+        producer.start()
+        time.sleep(0.1)
+        assert producer.is_alive()
+        assert not writer.drain_stream(1, timeout=0.05)
+
+        gate.set()
+        producer.join(timeout=5)
+        assert writer.drain_stream(1, timeout=5)
+    finally:
+        writer.stop(timeout=5)
+    assert [path for path, _ in stored] == ["0.jpg", "1.jpg", "2.jpg"]
+    assert writer.dropped == 0 and writer.get_status()['blocked_ms'] > 0
+
+
+def test_stop_writes_everything_queued(tmp_path):
+    writer = ImageWriter(threads=1)
+    writer.start()
+    paths = [writer.submit(str(tmp_path / f"{index}.jpg"), IMAGE) for index in range(5)]
+    writer.stop(timeout=5)
+    assert all(os.path.exists(path) for path in paths)
+    assert writer.written == 5
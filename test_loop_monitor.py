@@ -0,0 +1,27 @@
+import asyncio
+import time
+
+from src.loop_monitor import EventLoopMonitor
+
+
+def test_no_samples_report_zero_lag():
+    assert EventLoopMonitor().get_status() == {'lag_ms': 0.0, 'avg_lag_ms': 0.0, 'p99_lag_ms': 0.0, 'max_lag_ms': 0.0}
+
+
+def test_blocking_the_loop_shows_up_as_lag():
+    monitor = EventLoopMonitor(interval=0.01)
+
+    async def main():
+        monitor.start()
+        await asyncio.sleep(0.05)
+        # A synchronous call on the loop, like a query or a camera open
+        time.sleep(0.15)
+        await asyncio.sleep(0.05)
+        await monitor.stop()
+
+    asyncio.run(main())
+    status = monitor.get_status()
+    assert status['max_lag_ms'] >= 100
+    assert status['p99_lag_ms'] == status['max_lag_ms']
+    assert status['avg_lag_ms'] < status['max_lag_ms']
+    assert len(monitor.samples) >= 5
@@ -0,0 +1,72 @@
+import cv2
+import numpy as np
+import pytest
+
+import src.mjpeg_hub
+from src.mjpeg_hub import MjpegHub, _parse_profiles, _StreamChannel, encode_frame, get_profile, snap_profile
+
+PROFILES = _parse_profiles("preview:320:5:50,standard:640:15:60,full:0:30:70")
+
+
+@pytest.fixture(autouse=True)
+def profiles(monkeypatch):
+    monkeypatch.setattr(src.mjpeg_hub, "MJPEG_PROFILES", PROFILES)
+
+
+@pytest.mark.parametrize("width, fps, quality, expected", [
+    (None, None, None, "full"),
+    (320, None, None, "preview"),
+    (321, None, None, "standard"),
+    (320, 10, None, "standard"),
+    (320, None, 65, "full"),
+    (4000, None, None, "full"),
+    (320, 60, None, "full"),
+])
+def test_snap_profile(width, fps, quality, expected):
+    assert snap_profile(width, fps, quality).name == expected
+
+
+def test_get_profile():
+    assert get_profile("standard") == PROFILES[1]
+    assert get_profile("huge") is None
+
+
+def _decoded_size(jpeg_bytes: bytes):
+    return cv2.imdecode(np.frombuffer(jpeg_bytes, dtype=np.uint8), cv2.IMREAD_COLOR).shape[:2]
+
+
+def test_encode_frame_downscales_to_profile_width():
+    frame = np.zeros((720, 1280, 3), dtype=np.uint8)
+    assert _decoded_size(encode_frame(frame, PROFILES[0])) == (180, 320)
+    assert _decoded_size(encode_frame(frame, PROFILES[2])) == (720, 1280)
+    small = np.zeros((120, 160, 3), dtype=np.uint8)
+    assert _decoded_size(encode_frame(small, PROFILES[1])) == (120, 160)
+
+
+def test_viewers_of_a_profile_share_its_encodes():
+    channel = _StreamChannel(1)
+    assert channel.encode(PROFILES[0]) == (0, None)
+
+    channel.publish(np.zeros((240, 320, 3), dtype=np.uint8))
+    first = channel.encode(PROFILES[0])
+    assert first[1].startswith(b"--frame\r\nContent-Type: image/jpeg\r\n\r\n")
+    assert channel.encode(PROFILES[0]) == first
+    channel.encode(PROFILES[1])
+    assert channel.encodes == {"preview": 1, "standard": 1}
+
+
+def test_publish_without_viewers_is_a_no_op():
+    hub = MjpegHub()
+    hub.publish(1, np.zeros((8, 8, 3), dtype=np.uint8))
+    assert not hub.has_subscribers(1)
+    assert hub.get_status() == {}
+
+
+def test_sinks_receive_published_frames():
+    hub, received = MjpegHub(), []
+    hub.add_sink(1, received.append)
+    frame = np.zeros((8, 8, 3), dtype=np.uint8)
+    hub.publish(1, frame)
+    hub.remove_sink(1, received.append)
+    hub.publish(1, frame)
+    assert len(received) == 1 and received[0] is frame
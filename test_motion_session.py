@@ -0,0 +1,162 @@
+import numpy as np
+
+import src.stream_manager
+from src.database import SessionLocal
+from src.models import VideoEvent, VideoStream
+from src.motion_session import MotionSessionTracker
+from src.stream_manager import StreamManager
+
+FRAME = np.zeros((4, 4, 3), dtype=np.uint8)
+THRESHOLD = 1000
+
+
+def _tracker(**kwargs) -> MotionSessionTracker:
+    options = dict(start_frames=2, cooldown=5, max_session=300)
+    options.update(kwargs)
+    return MotionSessionTracker(**options)
+
+
+def _feed(tracker: MotionSessionTracker, timestamp: float, area: int = 5000):
+    return tracker.update(area, THRESHOLD, FRAME, timestamp)
+
+
+def test_session_opens_after_consecutive_motion_frames():
+    tracker = _tracker()
+    _feed(tracker, 0.0)
+    assert tracker.session is None
+    _feed(tracker, 0.1)
+    assert tracker.session is not None
+    assert tracker.session.start_time == 0.0 and tracker.session.motion_frames == 2
+
+
+def test_single_motion_frame_does_not_open_a_session():
+    tracker = _tracker()
+    _feed(tracker, 0.0)
+    _feed(tracker, 0.1, area=0)
+    _feed(tracker, 0.2)
+    assert tracker.session is None
+
+
+def test_session_closes_once_cooldown_passes_without_motion():
+    tracker = _tracker()
+    _feed(tracker, 0.0)
+    _feed(tracker, 1.0)
+    assert _feed(tracker, 5.9, area=0) is None
+    session = _feed(tracker, 6.0, area=0)
+    assert session is not None and tracker.session is None
+    assert session.duration == 1.0 and session.motion_frames == 2
+
+
+def test_motion_above_release_threshold_keeps_session_open():
+    tracker = _tracker()
+    _feed(tracker, 0.0)
+    _feed(tracker, 1.0)
+    # Below the start threshold but above half of it
+    assert _feed(tracker, 7.0, area=600) is None
+    assert tracker.session.last_motion == 7.0
+
+
+def test_long_motion_is_split_at_max_session():
+    tracker = _tracker(max_session=10)
+    _feed(tracker, 0.0)
+    _feed(tracker, 5.0)
+    finished = _feed(tracker, 10.0)
+    assert finished is not None and finished.end_time == 5.0
+    assert tracker.session.start_time == 10.0
+
+
+def test_peak_frame_is_picked_first():
+    tracker = _tracker()
+    frames = [np.full((4, 4, 3), value, dtype=np.uint8) for value in range(3)]
+    for timestamp, (area, frame) in enumerate(zip((2000, 9000, 3000), frames)):
+        tracker.update(area, THRESHOLD, frame, float(timestamp))
+    picked = tracker.session.representative_frames(3)
+    assert [role for role, _, _ in picked] == ['peak', 'first', 'last']
+    assert picked[0][2] is frames[1]
+
+
+def test_tick_without_frames_closes_session_after_cooldown():
+    """A source that stops delivering frames still ends its session"""
+    tracker = _tracker()
+    _feed(tracker, 0.0)
+    _feed(tracker, 1.0)
+    assert tracker.tick(5.0) is None
+    session = tracker.tick(6.0)
+    assert session is not None and session.end_time == 1.0
+    assert tracker.session is None
+    assert tracker.tick(20.0) is None
+
+
+def test_tick_discards_pending_motion_frames():
+    tracker = _tracker()
+    _feed(tracker, 0.0)
+    tracker.tick(0.5)
+    _feed(tracker, 1.0)
+    assert tracker.session is None
+
+
+def test_close_returns_open_session():
+    tracker = _tracker()
+    assert tracker.close() is None
+    _feed(tracker, 0.0)
+    _feed(tracker, 0.1)
+    assert tracker.close() is not None and tracker.session is None
+
+
+class _Processor:
+    motion_threshold = THRESHOLD
+
+    def __init__(self):
+        self.saved = []
+
+    def save_frame(self, frame, event_type, on_written=None):
+        self.saved.append(event_type)
+        return f"frames/{event_type}_{len(self.saved)}.jpg"
+
+
+def _events():
+    db = SessionLocal()
+    try:
+        return db.query(VideoEvent).all()
+    finally:
+        db.close()
+
+
+def test_motion_event_is_written_when_the_session_opens(database, monkeypatch):
+    db = SessionLocal()
+    stream = VideoStream(stream_name="test", stream_url="test.mp4", stream_type="file")
+    db.add(stream)
+    db.commit()
+    stream_id = stream.stream_id
+    db.close()
+
+    manager = StreamManager(workers=0)
+    processor = _Processor()
+    manager.processors[stream_id] = processor
+    manager.active_streams[stream_id] = {'motion': _tracker()}
+    monkeypatch.setattr(manager.recorder, "trigger", lambda stream_id, now=None: "clips/motion.mp4")
+    clock = [0.0]
+    monkeypatch.setattr(src.stream_manager.time, "time", lambda: clock[0])
+
+    def frame(timestamp, image, motion_area):
+        clock[0] = timestamp
+        manager._handle_motion_event(stream_id, image, {'motion_area': motion_area})
+
+    frame(0.0, FRAME, 5000)
+    assert _events() == []
+    frame(0.1, FRAME, 5000)
+    [event] = _events()
+    assert event.event_type == "motion_detected" and event.video_path == "clips/motion.mp4"
+    assert event.event_metadata['session_status'] == 'active'
+    assert event.frame_path == "frames/motion_first_1.jpg"
+
+    peak_frame = FRAME.copy()
+    frame(1.0, peak_frame, 9000)
+    frame(7.0, FRAME, 0)
+    # The session closed into the same row; the first frame is not saved twice
+    [event] = _events()
+    assert event.event_metadata['session_status'] == 'ended'
+    assert event.event_metadata['duration_s'] == 1.0
+    assert event.event_metadata['frame_paths'] == ["frames/motion_peak_2.jpg", "frames/motion_first_1.jpg"]
+    assert event.frame_path == "frames/motion_peak_2.jpg"
+    assert processor.saved == ["motion_first", "motion_peak"]
@@ -0,0 +1,48 @@
+import os
+from datetime import datetime
+
+from src.packs import (append_entry, list_packs, lookup_entry, pack_entry_path, read_entry, remove_pack,
+                       remove_packs, split_pack_entry)
+
+HOUR = datetime(2024, 1, 1, 12, 30)
+
+
+def test_entry_paths():
+    path = pack_entry_path("clips", 3, "a.jpg", HOUR)
+    assert path == os.path.join("clips", "packs", "stream_3", "2024010112.pack", "a.jpg")
+    assert split_pack_entry(path) == (os.path.join("clips", "packs", "stream_3", "2024010112.pack"), "a.jpg")
+    assert split_pack_entry(os.path.join("clips", "a.jpg")) is None
+
+
+def test_appended_entries_read_back(tmp_path):
+    first = pack_entry_path(str(tmp_path), 1, "a.jpg", HOUR)
+    second = pack_entry_path(str(tmp_path), 1, "b.jpg", HOUR)
+    append_entry(first, b"first")
+    pack = split_pack_entry(first)[0]
+    assert lookup_entry(pack, "a.jpg") == (0, 5)
+    # The cached index is re-read once the pack has grown
+    append_entry(second, b"second")
+    assert lookup_entry(pack, "b.jpg") == (5, 6)
+    assert read_entry(pack, *lookup_entry(pack, "b.jpg")) == b"second"
+    assert lookup_entry(pack, "missing.jpg") is None
+    assert lookup_entry(str(tmp_path / "none.pack"), "a.jpg") is None
+
+
+def test_list_and_remove_packs(tmp_path):
+    clips = str(tmp_path)
+    kept = pack_entry_path(clips, 1, "a.jpg", HOUR)
+    removed = pack_entry_path(clips, 2, "b.jpg", datetime(2024, 1, 1, 13))
+    append_entry(kept, b"a")
+    append_entry(removed, b"b")
+    assert sorted((stream_id, hour) for stream_id, hour, _ in list_packs(clips)) == [
+        (1, datetime(2024, 1, 1, 12)), (2, datetime(2024, 1, 1, 13))]
+
+    # A pack still holding a kept path survives
+    assert remove_packs([kept, removed], keep=[kept]) == 1
+    assert [stream_id for stream_id, _, _ in list_packs(clips)] == [1]
+    assert not os.path.exists(os.path.dirname(split_pack_entry(removed)[0]))
+
+    pack = split_pack_entry(kept)[0]
+    assert remove_pack(pack)
+    assert not remove_pack(pack)
+    assert lookup_entry(pack, "a.jpg") is None
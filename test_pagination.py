@@ -0,0 +1,71 @@
+import base64
+from datetime import datetime, timedelta
+
+import pytest
+
+from src.database import SessionLocal
+from src.models import VideoEvent, VideoStream
+from src.pagination import decode_cursor, encode_cursor, paginate
+
+
+def test_cursor_round_trip():
+    timestamp = datetime(2024, 1, 2, 3, 4, 5, 678901)
+    cursor = encode_cursor(timestamp, 42)
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == (timestamp, 42)
+
+
+@pytest.mark.parametrize("cursor", [
+    "",
+    "not a cursor",
+    base64.urlsafe_b64encode(b"2024-01-01T00:00:00").decode(),
+    base64.urlsafe_b64encode(b"yesterday|1").decode(),
+])
+def test_invalid_cursor_raises_value_error(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+
+def test_pages_walk_every_row_once_newest_first(database):
+    db = SessionLocal()
+    try:
+        stream = VideoStream(stream_name="test", stream_url="test.mp4", stream_type="file")
+        db.add(stream)
+        db.flush()
+        start = datetime(2024, 1, 1)
+        # Pairs of rows share a timestamp, so pages must break ties by id
+        for index in range(7):
+            db.add(VideoEvent(stream_id=stream.stream_id, event_type="motion",
+                              event_time=start + timedelta(seconds=index // 2)))
+        db.commit()
+
+        expected = [
+            event.event_id for event in
+            db.query(VideoEvent).order_by(VideoEvent.event_time.desc(), VideoEvent.event_id.desc())
+        ]
+        seen, cursor, pages = [], None, 0
+        while True:
+            rows, cursor = paginate(db.query(VideoEvent), VideoEvent.event_time, VideoEvent.event_id,
+                                    cursor, limit=3)
+            seen += [row.event_id for row in rows]
+            pages += 1
+            if cursor is None:
+                break
+        assert seen == expected
+        assert pages == 3
+    finally:
+        db.close()
+
+
+def test_exact_last_page_has_no_next_cursor(database):
+    db = SessionLocal()
+    try:
+        db.add(VideoStream(stream_name="test", stream_url="test.mp4", stream_type="file"))
+        db.flush()
+        for _ in range(3):
+            db.add(VideoEvent(stream_id=1, event_type="motion"))
+        db.commit()
+        rows, cursor = paginate(db.query(VideoEvent), VideoEvent.event_time, VideoEvent.event_id, limit=3)
+        assert len(rows) == 3 and cursor is None
+    finally:
+        db.close()
@@ -0,0 +1,100 @@
+from datetime import date, datetime
+
+import pytest
+from sqlalchemy import insert
+
+from src.database import SessionLocal
+from src.models import VideoAnalytics, VideoEvent, VideoStream
+from src.partitions import AnalyticsPartitions, partition_name
+
+DAY_ONE = datetime(2024, 1, 1, 23, 59)
+DAY_TWO = datetime(2024, 1, 2, 0, 1)
+
+
+@pytest.fixture
+def partitions(database):
+    db = SessionLocal()
+    db.add(VideoStream(stream_name="test", stream_url="test.mp4", stream_type="file"))
+    db.commit()
+    db.close()
+
+    partitions = AnalyticsPartitions(enabled=True)
+    yield partitions
+    for day in partitions.days():
+        partitions.drop(day)
+
+
+def _write(partitions: AnalyticsPartitions, model, rows):
+    db = SessionLocal()
+    try:
+        routed = partitions.route(db, model, rows)
+        for table, table_rows in routed:
+            db.execute(insert(table), table_rows)
+        db.commit()
+        return routed
+    finally:
+        db.close()
+
+
+def test_rows_are_routed_to_their_day(partitions):
+    routed = _write(partitions, VideoAnalytics, [
+        {'stream_id': 1, 'timestamp': DAY_ONE, 'fps': 1.0},
+        {'stream_id': 1, 'timestamp': DAY_TWO, 'fps': 2.0},
+        {'stream_id': 1, 'timestamp': DAY_TWO, 'fps': 3.0},
+    ])
+    assert sorted((table.name, len(rows)) for table, rows in routed) == [
+        (partition_name(date(2024, 1, 1)), 1), (partition_name(date(2024, 1, 2)), 2)]
+    assert partitions.days() == [date(2024, 1, 1), date(2024, 1, 2)]
+
+
+def test_other_models_and_disabled_partitioning_pass_through(partitions):
+    rows = [{'stream_id': 1, 'event_type': 'motion'}]
+    assert _write(partitions, VideoEvent, rows) == [(VideoEvent, rows)]
+
+    analytics = [{'stream_id': 1, 'timestamp': DAY_ONE}]
+    assert _write(AnalyticsPartitions(enabled=False), VideoAnalytics, analytics) == [(VideoAnalytics, analytics)]
+    assert partitions.days() == []
+
+
+def test_tables_cover_only_overlapping_days(partitions):
+    _write(partitions, VideoAnalytics, [
+        {'stream_id': 1, 'timestamp': DAY_ONE},
+        {'stream_id': 1, 'timestamp': DAY_TWO},
+    ])
+    names = [table.name for table in partitions.tables(start=datetime(2024, 1, 2, 12))]
+    assert names == [partition_name(date(2024, 1, 2)), VideoAnalytics.__tablename__]
+    names = [table.name for table in partitions.tables()]
+    assert names[:2] == [partition_name(date(2024, 1, 2)), partition_name(date(2024, 1, 1))]
+
+
+def test_pages_merge_partitions_with_unpartitioned_rows(partitions):
+    unpartitioned = AnalyticsPartitions(enabled=False)
+    _write(unpartitioned, VideoAnalytics, [{'stream_id': 1, 'timestamp': datetime(2024, 1, 1, 12)}])
+    _write(partitions, VideoAnalytics, [
+        {'stream_id': 1, 'timestamp': DAY_ONE},
+        {'stream_id': 1, 'timestamp': DAY_TWO},
+    ])
+
+    db = SessionLocal()
+    try:
+        seen, cursor = [], None
+        while True:
+            rows, cursor = partitions.page(db, 1, datetime(2024, 1, 1), cursor, limit=2)
+            seen += [row.timestamp for row in rows]
+            if cursor is None:
+                break
+    finally:
+        db.close()
+    assert seen == [DAY_TWO, DAY_ONE, datetime(2024, 1, 1, 12)]
+
+
+def test_drop_removes_a_whole_day(partitions):
+    _write(partitions, VideoAnalytics, [
+        {'stream_id': 1, 'timestamp': DAY_ONE},
+        {'stream_id': 1, 'timestamp': DAY_TWO},
+    ])
+    partitions.drop(date(2024, 1, 1))
+    assert partitions.days() == [date(2024, 1, 2)]
+    # A new row for the dropped day recreates its partition
+    _write(partitions, VideoAnalytics, [{'stream_id': 1, 'timestamp': DAY_ONE}])
+    assert partitions.days() == [date(2024, 1, 1), date(2024, 1, 2)]
@@ -0,0 +1,54 @@
+import numpy as np
+
+import src.preprocessing
+from src.preprocessing import PYRAMID_LEVELS, PreprocessedFrame, preprocess
+
+
+def _frame(width: int, height: int) -> np.ndarray:
+    return np.random.default_rng(0).integers(0, 255, (height, width, 3), dtype=np.uint8)
+
+
+def test_views_are_computed_lazily_and_once(monkeypatch):
+    pre = PreprocessedFrame(_frame(1280, 720), analysis_width=640)
+    calls = []
+    resize = src.preprocessing.cv2.resize
+
+    def counting_resize(*args, **kwargs):
+        calls.append(args[1])
+        return resize(*args, **kwargs)
+
+    monkeypatch.setattr(src.preprocessing.cv2, "resize", counting_resize)
+
+    assert calls == []
+    assert pre.analysis.shape == (360, 640, 3)
+    assert pre.analysis is pre.analysis and pre.analysis_gray is pre.analysis_gray
+    assert calls == [(640, 360)]
+
+
+def test_narrow_frames_are_not_copied():
+    frame = _frame(320, 240)
+    pre = PreprocessedFrame(frame, analysis_width=640)
+    assert pre.scale == 1.0 and pre.analysis is frame
+
+
+def test_pyramid_halves_each_level_and_stops_at_small_images():
+    pre = PreprocessedFrame(_frame(1280, 720), analysis_width=640)
+    assert [level.shape for level in pre.pyramid] == [(360, 640), (180, 320), (90, 160)][:PYRAMID_LEVELS]
+    assert pre.pyramid[0] is pre.analysis_gray
+
+    small = PreprocessedFrame(_frame(100, 60), analysis_width=640)
+    assert len(small.pyramid) == 1
+
+
+def test_boxes_and_areas_map_back_to_source_coordinates():
+    pre = PreprocessedFrame(_frame(1280, 720), analysis_width=640)
+    assert pre.to_source_box(10, 20, 30, 40) == {'x': 20, 'y': 40, 'w': 60, 'h': 80}
+    assert pre.to_source_box(10, 20, 30, 40, level=1) == {'x': 40, 'y': 80, 'w': 120, 'h': 160}
+    assert pre.to_source_area(100) == 400
+    # Boxes are clipped to the source frame
+    assert pre.to_source_box(630, 350, 20, 20) == {'x': 1260, 'y': 700, 'w': 20, 'h': 20}
+
+
+def test_preprocess_reuses_a_preprocessed_frame():
+    pre = preprocess(_frame(320, 240))
+    assert preprocess(pre) is pre
@@ -0,0 +1,71 @@
+import asyncio
+import json
+
+from src.pubsub import PubSubHub
+
+
+def _parse(chunk: bytes):
+    topic, data = chunk.decode().strip().split("\n")
+    return topic[len("event: "):], json.loads(data[len("data: "):])
+
+
+async def _receive(hub: PubSubHub, topics, publish, count: int, heartbeat: float = 5.0):
+    """Messages after the greeting, published while the client was not reading"""
+    stream = hub.subscribe(topics, heartbeat=heartbeat)
+    assert _parse(await stream.__anext__())[0] == 'hello'
+    publish()
+    received = [await stream.__anext__() for _ in range(count)]
+    await stream.aclose()
+    return received
+
+
+def test_keyed_messages_keep_only_the_newest_state():
+    hub = PubSubHub()
+
+    def publish():
+        hub.publish('streams', {'stream_id': 1, 'state': 'started'}, key=1)
+        hub.publish('events', {'event_id': 1})
+        hub.publish('streams', {'stream_id': 1, 'state': 'stopped'}, key=1)
+        hub.publish('streams', {'stream_id': 2, 'state': 'started'}, key=2)
+        hub.publish('events', {'event_id': 2})
+
+    received = asyncio.run(_receive(hub, ['streams', 'events'], publish, 4))
+    assert [_parse(chunk) for chunk in received] == [
+        ('events', {'event_id': 1}),
+        ('streams', {'stream_id': 1, 'state': 'stopped'}),
+        ('streams', {'stream_id': 2, 'state': 'started'}),
+        ('events', {'event_id': 2}),
+    ]
+
+
+def test_overflowing_client_is_told_to_resync():
+    hub = PubSubHub(max_pending=2)
+
+    def publish():
+        for event_id in range(5):
+            hub.publish('events', {'event_id': event_id})
+
+    received = asyncio.run(_receive(hub, ['events'], publish, 3))
+    assert [_parse(chunk) for chunk in received] == [
+        ('resync', {'dropped': 3}),
+        ('events', {'event_id': 3}),
+        ('events', {'event_id': 4}),
+    ]
+
+
+def test_only_subscribed_topics_are_delivered():
+    hub = PubSubHub()
+
+    def publish():
+        assert hub.has_subscribers('events') and not hub.has_subscribers('metrics')
+        hub.publish('metrics', {'cpu_usage': 1.0})
+        hub.publish('events', {'event_id': 1})
+
+    received = asyncio.run(_receive(hub, ['events'], publish, 1))
+    assert [_parse(chunk) for chunk in received] == [('events', {'event_id': 1})]
+    assert not hub.has_subscribers()
+
+
+def test_idle_connections_get_keepalives():
+    received = asyncio.run(_receive(PubSubHub(), ['events'], lambda: None, 1, heartbeat=0.01))
+    assert received == [b": keepalive\n\n"]
@@ -0,0 +1,186 @@
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+import src.image_writer
+from src.database import SessionLocal
+from src.db_writer import DatabaseWriter
+from src.image_writer import ImageWriter
+from src.models import PurgeJob, VideoAnalytics, VideoEvent, VideoStream
+from src.purge import PurgeEngine
+
+
+def _add_stream() -> int:
+    db = SessionLocal()
+    try:
+        stream = VideoStream(stream_name="test", stream_url="test.mp4", stream_type="file")
+        db.add(stream)
+        db.commit()
+        return stream.stream_id
+    finally:
+        db.close()
+
+
+def _count(model, stream_id: int) -> int:
+    db = SessionLocal()
+    try:
+        return db.query(model).filter(model.stream_id == stream_id).count()
+    finally:
+        db.close()
+
+
+def _delete(stream_id: int, **options) -> dict:
+    engine = PurgeEngine(**options)
+    engine.start()
+    try:
+        job_id = engine.delete_stream(stream_id)['job_id']
+        deadline = time.time() + 10
+        while engine.get_job(job_id)['status'] in ('queued', 'running') and time.time() < deadline:
+            time.sleep(0.05)
+        return engine.get_job(job_id)
+    finally:
+        engine.stop()
+
+
+@pytest.fixture
+def gated_images(monkeypatch):
+    """Image writes that wait until the returned event is set"""
+    gate = threading.Event()
+    store_image = src.image_writer.store_image
+
+    def gated(*args, **kwargs):
+        gate.wait(timeout=10)
+        return store_image(*args, **kwargs)
+
+    monkeypatch.setattr(src.image_writer, "store_image", gated)
+    return gate
+
+
+def test_delete_waits_for_queued_writes(database, tmp_path, gated_images):
+    """A stream deleted while its last event and image are still queued leaves nothing behind"""
+    stream_id = _add_stream()
+    db_writer = DatabaseWriter(flush_interval=60)
+    image_writer = ImageWriter(threads=1)
+    db_writer.start()
+    image_writer.start()
+    try:
+        frame_path = image_writer.submit(str(tmp_path / "frame.jpg"), np.zeros((8, 8, 3), dtype=np.uint8),
+                                         stream_id=stream_id)
+        db_writer.insert(VideoEvent, {'stream_id': stream_id, 'event_type': 'motion', 'frame_path': frame_path})
+        db_writer.insert(VideoAnalytics, {'stream_id': stream_id, 'fps': 10.0}, droppable=True)
+
+        # Nothing has landed yet, so a purge now would miss both
+        assert _count(VideoEvent, stream_id) == 0 and not os.path.exists(frame_path)
+        assert not image_writer.drain_stream(stream_id, timeout=0.2)
+
+        def prepare(prepared_id: int):
+            # What StreamManager.remove_stream does after stopping the stream
+            gated_images.set()
+            assert image_writer.drain_stream(prepared_id, timeout=5)
+            assert db_writer.drain(timeout=5)
+            assert os.path.exists(frame_path) and _count(VideoEvent, stream_id) == 1
+
+        job = _delete(stream_id, prepare_stream=prepare)
+    finally:
+        gated_images.set()
+        image_writer.stop(timeout=5)
+        db_writer.stop(timeout=5)
+
+    assert job['status'] == 'done'
+    assert job['deleted']['events'] == 1 and job['deleted']['analytics'] == 1
+    assert job['deleted']['frames'] == 1 and not os.path.exists(frame_path)
+    assert _count(VideoEvent, stream_id) == 0 and _count(VideoAnalytics, stream_id) == 0
+    assert _count(VideoStream, stream_id) == 0
+
+
+def test_drain_of_other_streams_does_not_wait(database, tmp_path, gated_images):
+    image_writer = ImageWriter(threads=1)
+    image_writer.start()
+    try:
+        image_writer.submit(str(tmp_path / "frame.jpg"), np.zeros((8, 8, 3), dtype=np.uint8), stream_id=1)
+        assert image_writer.drain_stream(2, timeout=0.2)
+    finally:
+        gated_images.set()
+        image_writer.stop(timeout=5)
+
+
+def test_deleted_stream_ids_are_not_reused(database):
+    first = _add_stream()
+    assert _delete(first)['status'] == 'done'
+    assert _add_stream() == first + 1
+
+
+def test_unfinished_jobs_resume_after_a_restart(database):
+    stream_id = _add_stream()
+    db = SessionLocal()
+    try:
+        db.add(VideoEvent(stream_id=stream_id, event_type='motion'))
+        db.commit()
+    finally:
+        db.close()
+
+    # Queued, then cut short by a restart before it finished
+    job_id = PurgeEngine().delete_stream(stream_id)['job_id']
+    db = SessionLocal()
+    try:
+        db.query(PurgeJob).filter(PurgeJob.job_id == job_id).update({'status': 'running'})
+        db.commit()
+    finally:
+        db.close()
+
+    engine = PurgeEngine()
+    # Hidden from the stream list from the moment the jobs are reloaded
+    engine._load_jobs()
+    assert engine.deleting_streams() == [stream_id]
+    engine.start()
+    try:
+        deadline = time.time() + 10
+        while engine.get_job(job_id)['status'] != 'done' and time.time() < deadline:
+            time.sleep(0.05)
+        assert engine.get_job(job_id)['deleted']['events'] == 1
+    finally:
+        engine.stop()
+    assert _count(VideoEvent, stream_id) == 0
+    assert _count(VideoStream, stream_id) == 0
+
+    # Finished jobs are listed again after the next restart
+    engine = PurgeEngine()
+    engine.start()
+    engine.stop()
+    assert [job['status'] for job in engine.list_jobs()] == ['done']
+
+
+def test_retention_keeps_frames_that_newer_events_share(database, tmp_path):
+    stream_id = _add_stream()
+    shared = tmp_path / "shared.jpg"
+    shared.write_bytes(b"jpeg")
+    now = datetime.utcnow()
+    db = SessionLocal()
+    try:
+        db.add_all([
+            # A motion session and a track that started during it, either
+            # side of the 30-day retention cutoff
+            VideoEvent(stream_id=stream_id, event_type="motion", frame_path=str(shared),
+                       event_time=now - timedelta(days=30, minutes=1)),
+            VideoEvent(stream_id=stream_id, event_type="person", frame_path=str(shared),
+                       event_time=now - timedelta(days=30) + timedelta(minutes=1)),
+        ])
+        db.commit()
+    finally:
+        db.close()
+
+    engine = PurgeEngine()
+    engine.start()
+    try:
+        engine.run_retention_now()
+        deadline = time.time() + 10
+        while engine.last_pass is None and time.time() < deadline:
+            time.sleep(0.05)
+    finally:
+        engine.stop()
+    assert _count(VideoEvent, stream_id) == 1
+    assert shared.exists()
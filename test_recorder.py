@@ -0,0 +1,127 @@
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+import src.recorder
+from src.recorder import ClipRecorder, resolve_format
+
+FRAME = np.zeros((48, 64, 3), dtype=np.uint8)
+
+
+@pytest.fixture
+def recorder(tmp_path):
+    """A recorder whose clips are collected as (path, frame timestamps) instead of encoded"""
+    recorders = []
+
+    def make(**kwargs) -> ClipRecorder:
+        options = dict(root=str(tmp_path), pre_seconds=1, post_seconds=1, max_seconds=60, fps=10, fmt='avi')
+        options.update(kwargs)
+        recorder = ClipRecorder(**options)
+        recorder.clips = []
+        recorder._write = lambda path, frames: recorder.clips.append((path, [t for t, _ in frames]))
+        recorders.append(recorder)
+        return recorder
+
+    yield make
+    for made in recorders:
+        made.stop()
+
+
+def _feed(recorder: ClipRecorder, start: float, end: float, frame=FRAME):
+    for tenth in range(round(start * 10), round(end * 10) + 1):
+        recorder.add_frame(1, frame, tenth / 10)
+
+
+def test_clip_spans_pre_roll_to_post_roll(recorder):
+    clips = recorder()
+    _feed(clips, 0.1, 2.0)
+    path = clips.trigger(1, 2.0)
+    _feed(clips, 2.1, 2.9)
+    assert clips.clips == []
+    _feed(clips, 3.0, 3.0)
+    clips.drain_stream(1)
+
+    [(written, timestamps)] = clips.clips
+    assert written == path and path.endswith(".avi")
+    assert timestamps[0] == 1.0 and timestamps[-1] == 3.0 and len(timestamps) == 21
+
+
+def test_triggers_during_a_clip_extend_it_and_share_its_path(recorder):
+    clips = recorder(max_seconds=3)
+    _feed(clips, 0.1, 2.0)
+    path = clips.trigger(1, 2.0)
+    assert clips.trigger(1, 2.5) == path
+    _feed(clips, 2.1, 3.4)
+    assert clips.clips == []
+    # Extended to 3.5 by the second trigger; further ones stop at max_seconds
+    assert clips.trigger(1, 3.4) == path
+    _feed(clips, 3.5, 5.0)
+    clips.drain_stream(1)
+    [(_, timestamps)] = clips.clips
+    assert timestamps[0] == 1.0 and timestamps[-1] == 4.0
+    assert clips.clips_started == 1
+
+
+def _frame_bytes(recorder, frame=FRAME) -> int:
+    probe = recorder()
+    probe.add_frame(1, frame, 1.0)
+    return probe.get_status()['buffered_bytes']
+
+
+def test_pre_roll_keeps_only_pre_seconds(recorder):
+    frame_bytes = _frame_bytes(recorder)
+    clips = recorder(pre_seconds=0.5)
+    _feed(clips, 0.1, 5.0)
+    # 4.5 to 5.0
+    assert clips.get_status()['buffered_bytes'] == 6 * frame_bytes
+
+
+def test_clip_is_cut_short_at_the_byte_cap(recorder):
+    noise = np.random.default_rng(0).integers(0, 255, (48, 64, 3), dtype=np.uint8)
+    frame_bytes = _frame_bytes(recorder, noise)
+
+    clips = recorder(max_bytes=frame_bytes * 10, post_seconds=30)
+    clips.trigger(1, 0.1)
+    _feed(clips, 0.1, 2.0, frame=noise)
+    clips.drain_stream(1)
+    # Written with what it had when the buffer went over, not dropped
+    [(_, timestamps)] = clips.clips
+    assert timestamps == [tenth / 10 for tenth in range(1, 12)]
+    assert clips.clips_truncated == 1
+    assert clips.get_status()['buffered_bytes'] <= frame_bytes * 10
+
+
+def test_disabled_recorder_buffers_nothing(recorder):
+    clips = recorder(pre_seconds=0, post_seconds=0)
+    _feed(clips, 0.1, 1.0)
+    assert clips.trigger(1, 1.0) is None
+    assert not clips.wants_frame(1) and clips.get_status()['buffered_bytes'] == 0
+
+
+def test_resolve_format(monkeypatch):
+    assert resolve_format('webm') == 'webm' and resolve_format('avi') == 'avi'
+    monkeypatch.setattr(src.recorder, "can_encode", lambda extension, codec: codec == 'avc1')
+    assert resolve_format('auto') == 'mp4'
+    monkeypatch.setattr(src.recorder, "can_encode", lambda extension, codec: False)
+    assert resolve_format('auto') == 'webm'
+    assert resolve_format('mkv') == 'webm'
+
+
+def test_clips_are_written_under_a_temporary_name(tmp_path):
+    clips = ClipRecorder(root=str(tmp_path), pre_seconds=1, post_seconds=0.5, fps=10, fmt='avi')
+    try:
+        for tenth in range(20):
+            clips.add_frame(1, FRAME, tenth / 10)
+        path = clips.trigger(1, 1.9)
+        assert clips.drain_stream(1)
+    finally:
+        clips.stop()
+    assert os.listdir(os.path.dirname(path)) == [os.path.basename(path)]
+    capture = cv2.VideoCapture(path)
+    frames = 0
+    while capture.read()[0]:
+        frames += 1
+    capture.release()
+    assert frames == 11
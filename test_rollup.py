@@ -0,0 +1,59 @@
+from datetime import datetime
+
+from src.database import SessionLocal
+from src.models import AnalyticsHourly, AnalyticsMinutely, VideoAnalytics, VideoEvent, VideoStream
+from src.rollup import PROCESSING_BINS, AnalyticsRollup, bucket_start, bucket_to_dict, histogram_percentile
+
+
+def _histogram(**counts) -> list:
+    histogram = [0] * (len(PROCESSING_BINS) + 1)
+    for bound, count in counts.items():
+        histogram[PROCESSING_BINS.index(int(bound[1:]))] = count
+    return histogram
+
+
+def test_bucket_start_truncates_to_resolution():
+    timestamp = datetime(2024, 1, 1, 12, 34, 56, 789)
+    assert bucket_start(timestamp, 'minute') == datetime(2024, 1, 1, 12, 34)
+    assert bucket_start(timestamp, 'hour') == datetime(2024, 1, 1, 12)
+
+
+def test_histogram_percentile_is_upper_bound_of_bin():
+    histogram = _histogram(b10=90, b500=10)
+    assert histogram_percentile(histogram, 0.5) == 10.0
+    assert histogram_percentile(histogram, 0.95) == 500.0
+    assert histogram_percentile([0] * len(histogram), 0.5) is None
+
+
+def test_rows_fold_into_minute_and_hour_buckets(database):
+    db = SessionLocal()
+    db.add(VideoStream(stream_name="test", stream_url="test.mp4", stream_type="file"))
+    db.commit()
+    db.close()
+
+    rollup = AnalyticsRollup()
+    rows = [
+        {'stream_id': 1, 'timestamp': datetime(2024, 1, 1, 12, 0, 10), 'fps': 10.0, 'object_count': 2,
+         'motion_detected': True, 'quality_score': 0.5, 'processing_time_ms': 8},
+        {'stream_id': 1, 'timestamp': datetime(2024, 1, 1, 12, 0, 50), 'fps': 20.0, 'object_count': 0,
+         'motion_detected': False, 'quality_score': 0.7, 'processing_time_ms': 40},
+    ]
+    rollup([(VideoAnalytics, rows[0]), (VideoEvent, {'stream_id': 1})])
+    # A later batch for the same buckets merges into them
+    rollup([(VideoAnalytics, rows[1]), (VideoAnalytics, dict(rows[1], timestamp=datetime(2024, 1, 1, 12, 1)))])
+
+    db = SessionLocal()
+    try:
+        minutes = db.query(AnalyticsMinutely).order_by(AnalyticsMinutely.bucket_start).all()
+        assert [(m.bucket_start.minute, m.samples) for m in minutes] == [(0, 2), (1, 1)]
+        first = bucket_to_dict(minutes[0])
+        assert first['avg_fps'] == 15.0 and first['max_fps'] == 20.0
+        assert first['motion_frames'] == 1 and first['max_objects'] == 2
+        assert first['avg_quality'] == 0.6 and first['avg_processing_ms'] == 24.0
+        assert first['p50_processing_ms'] == 10.0 and first['p95_processing_ms'] == 50.0
+
+        hours = db.query(AnalyticsHourly).all()
+        assert len(hours) == 1 and hours[0].samples == 3
+        assert hours[0].processing_histogram == _histogram(b10=1, b50=2)
+    finally:
+        db.close()
@@ -0,0 +1,49 @@
+from types import SimpleNamespace
+
+import src.scheduler
+from src.scheduler import AnalysisScheduler
+
+
+def test_skips_frames_down_to_target_rate():
+    """A 30 fps source analyzed at 10 fps decodes every third frame"""
+    scheduler = AnalysisScheduler(source_fps=30, target_fps=10, max_cpu_ms_per_sec=0)
+    scheduler.set_budget()
+    assert scheduler.frames_to_skip == 2
+    assert [scheduler.should_decode() for _ in range(6)] == [False, False, True, False, False, True]
+
+
+def test_cpu_budget_lowers_analysis_rate():
+    """50 ms per frame under a 100 ms/s budget allows 2 analyzed frames per second"""
+    scheduler = AnalysisScheduler(source_fps=30, target_fps=30, max_cpu_ms_per_sec=100)
+    scheduler.record(50)
+    assert scheduler.allowed_fps == 2
+    assert scheduler.frames_to_skip == 14
+
+
+def test_no_budget_or_unknown_source_rate_decodes_everything():
+    unlimited = AnalysisScheduler(source_fps=30, target_fps=0, max_cpu_ms_per_sec=0)
+    unlimited.record(50)
+    assert unlimited.frames_to_skip == 0
+
+    unknown = AnalysisScheduler(source_fps=0, target_fps=1)
+    unknown.record(50)
+    assert unknown.frames_to_skip == 0
+    assert all(unknown.should_decode() for _ in range(5))
+
+
+def test_implausible_source_rate_is_ignored():
+    assert AnalysisScheduler(source_fps=1000).source_fps == 0
+
+
+def test_take_window_reports_skip_ratio_since_last_call(monkeypatch):
+    clock = SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(src.scheduler, "time", SimpleNamespace(time=lambda: clock.now))
+    scheduler = AnalysisScheduler(source_fps=30, target_fps=10, max_cpu_ms_per_sec=0)
+    scheduler.set_budget()
+    for _ in range(6):
+        clock.now += 0.04
+        if scheduler.should_decode():
+            scheduler.record(1)
+    assert scheduler.take_window()['skip_ratio'] == 0.667
+    # Nothing seen since the previous window
+    assert scheduler.take_window()['skip_ratio'] == 0.0
@@ -0,0 +1,105 @@
+import os
+import threading
+
+import cv2
+import numpy as np
+import pytest
+
+from src.thumbnails import ThumbnailCache, snap_width
+
+
+def _image(directory, name: str, width: int = 400, height: int = 300, seed: int = 0) -> str:
+    path = str(directory / name)
+    image = np.random.default_rng(seed).integers(0, 255, (height, width, 3), dtype=np.uint8)
+    cv2.imwrite(path, image)
+    return path
+
+
+@pytest.fixture
+def cache(tmp_path):
+    caches = []
+
+    def make(**kwargs) -> ThumbnailCache:
+        caches.append(ThumbnailCache(root=str(tmp_path / "thumbnails"), **kwargs))
+        return caches[-1]
+
+    yield make
+    for made in caches:
+        made.shutdown()
+
+
+def test_concurrent_requests_share_one_encode(tmp_path, cache, monkeypatch):
+    thumbnails = cache()
+    source = _image(tmp_path, "a.jpg")
+    release = threading.Event()
+    encodes = []
+    encode = thumbnails._encode
+
+    def slow_encode(*args):
+        encodes.append(args)
+        release.wait(timeout=5)
+        return encode(*args)
+
+    monkeypatch.setattr(thumbnails, "_encode", slow_encode)
+    futures = [thumbnails.request(source, 160) for _ in range(3)]
+    assert futures[1] is futures[0] and futures[2] is futures[0]
+    release.set()
+
+    path = futures[0].result(timeout=5)
+    assert cv2.imread(path).shape[1] == 160
+    assert len(encodes) == 1
+    assert thumbnails.get(source, 160) == path
+    status = thumbnails.get_status()
+    assert (status['misses'], status['hits'], status['inflight']) == (1, 3, 0)
+
+
+def test_least_recently_used_thumbnails_are_evicted_by_bytes(tmp_path, cache):
+    sources = [_image(tmp_path, f"{name}.jpg", seed=seed) for seed, name in enumerate("abc")]
+    probe = ThumbnailCache(root=str(tmp_path / "probe"))
+    size = os.path.getsize(probe.get(sources[0], 160))
+    probe.shutdown()
+
+    # Room for two thumbnails, not three
+    thumbnails = cache(max_bytes=int(size * 2.5))
+    first = thumbnails.get(sources[0], 160)
+    second = thumbnails.get(sources[1], 160)
+    # Reading the first makes the second the least recently used
+    assert thumbnails.get(sources[0], 160) == first
+    third = thumbnails.get(sources[2], 160)
+
+    assert os.path.exists(first) and os.path.exists(third)
+    assert not os.path.exists(second)
+    status = thumbnails.get_status()
+    assert status['evictions'] == 1 and status['entries'] == 2 and status['bytes'] <= status['max_bytes']
+
+
+def test_existing_thumbnails_are_indexed_on_start(tmp_path, cache):
+    source = _image(tmp_path, "a.jpg")
+    path = cache().get(source, 160)
+    restarted = cache()
+    assert restarted.get_status()['entries'] == 1
+    assert restarted.get(source, 160) == path
+    assert restarted.get_status()['misses'] == 0
+
+
+def test_narrow_sources_are_served_as_they_are(tmp_path, cache):
+    thumbnails = cache()
+    source = _image(tmp_path, "small.jpg", width=120, height=90)
+    assert thumbnails.get(source, 160) is None
+    assert thumbnails.get(source, 160) is None
+    assert thumbnails.get_status()['misses'] == 1 and not os.listdir(thumbnails.root)
+
+
+def test_replaced_sources_get_new_thumbnails(tmp_path, cache):
+    thumbnails = cache()
+    source = _image(tmp_path, "a.jpg")
+    before = thumbnails.get(source, 160)
+    _image(tmp_path, "a.jpg", width=800, height=300, seed=1)
+    after = thumbnails.get(source, 160)
+    assert after != before and cv2.imread(after).shape[:2] == (60, 160)
+
+
+def test_widths_snap_up_to_configured_ones():
+    assert snap_width(100) == 160
+    assert snap_width(161) == 320
+    assert snap_width(5000) == 640
@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+
+from src.tracker import ObjectTracker, box_iou
+
+FRAME = np.zeros((240, 320, 3), dtype=np.uint8)
+
+
+def _box(x, y, w=40, h=80):
+    return {'x': x, 'y': y, 'w': w, 'h': h}
+
+
+def _person(x, y, confidence=0.8, w=40, h=80):
+    return {'type': 'person', 'confidence': confidence, 'bounding_box': _box(x, y, w, h), 'area': w * h}
+
+
+def test_box_iou():
+    assert box_iou(_box(0, 0), _box(0, 0)) == 1.0
+    assert box_iou(_box(0, 0), _box(100, 100)) == 0.0
+    # Half of one box overlaps half of the other: 1600 / (3200 + 3200 - 1600)
+    assert box_iou(_box(0, 0), _box(20, 0)) == pytest.approx(1 / 3)
+    assert box_iou(_box(0, 0, 0, 0), _box(0, 0, 0, 0)) == 0.0
+
+
+def test_overlapping_detections_continue_a_track():
+    tracker = ObjectTracker(stream_id=1)
+    started = tracker.update([_person(10, 10)], FRAME, timestamp=1.0)['started']
+    result = tracker.update([_person(14, 12, confidence=0.9)], FRAME, timestamp=1.1)
+    assert not result['started']
+    assert result['updated'] == started
+    track = started[0]
+    assert track.hits == 2 and track.duration == pytest.approx(0.1)
+    assert track.best_confidence == 0.9
+
+
+def test_types_are_never_matched_across():
+    tracker = ObjectTracker(stream_id=1)
+    tracker.update([_person(10, 10)], FRAME, timestamp=1.0)
+    car = dict(_person(10, 10), type='car')
+    result = tracker.update([car], FRAME, timestamp=1.1)
+    assert len(result['started']) == 1 and not result['updated']
+
+
+def test_best_pair_wins_when_two_detections_compete():
+    tracker = ObjectTracker(stream_id=1)
+    track = tracker.update([_person(10, 10)], FRAME, timestamp=1.0)['started'][0]
+    result = tracker.update([_person(30, 10), _person(12, 10)], FRAME, timestamp=1.1)
+    assert result['updated'] == [track]
+    assert track.bounding_box == _box(12, 10)
+    assert [t.bounding_box for t in result['started']] == [_box(30, 10)]
+
+
+def test_fast_object_matches_by_centroid_distance():
+    tracker = ObjectTracker(stream_id=1)
+    track = tracker.update([_person(10, 10)], FRAME, timestamp=1.0)['started'][0]
+    # No overlap, but the centroid moved less than half a box diagonal
+    result = tracker.update([_person(52, 10)], FRAME, timestamp=1.1)
+    assert result['updated'] == [track]
+
+
+def test_track_ends_after_max_misses_in_searched_frames():
+    tracker = ObjectTracker(stream_id=1, max_misses=2)
+    track = tracker.update([_person(10, 10)], FRAME, timestamp=1.0)['started'][0]
+    assert not tracker.update([], FRAME, timestamp=1.1)['ended']
+    assert tracker.update([], FRAME, timestamp=1.2)['ended'] == [track]
+    assert not tracker.tracks
+
+
+def test_unsearched_frames_do_not_count_as_misses():
+    tracker = ObjectTracker(stream_id=1, max_misses=1)
+    tracker.update([_person(10, 10)], FRAME, timestamp=1.0)
+    # Detection skipped, then run only far away from the track
+    assert not tracker.update([], FRAME, searched_regions=[], timestamp=1.1)['ended']
+    assert not tracker.update([], FRAME, searched_regions=[_box(200, 100)], timestamp=1.2)['ended']
+    assert len(tracker.tracks) == 1
+
+
+def test_close_all_ends_every_track():
+    tracker = ObjectTracker(stream_id=1)
+    tracker.update([_person(10, 10), _person(200, 100)], FRAME, timestamp=1.0)
+    assert len(tracker.close_all()) == 2
+    assert not tracker.tracks
@@ -0,0 +1,83 @@
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+import src.video_processor
+from src.preprocessing import PreprocessedFrame
+from src.video_processor import VideoProcessor
+
+PRE = PreprocessedFrame(np.zeros((360, 640, 3), dtype=np.uint8))
+
+
+@pytest.fixture
+def processor(monkeypatch):
+    monkeypatch.setattr(src.video_processor.time, "time", lambda: 100.0)
+    processor = VideoProcessor(1, "test.mp4")
+    processor.detection_gating = 'roi'
+    # The periodic full-frame refresh is not due
+    processor.last_full_detection = 100.0
+    return processor
+
+
+def test_frames_without_motion_skip_detection(processor):
+    assert processor.plan_detection(PRE, False, []) is None
+    assert processor.detection_stats == {'full': 0, 'roi': 0, 'skipped': 1}
+
+
+def test_small_motion_is_searched_in_padded_regions(processor):
+    regions = processor.plan_detection(PRE, True, [(300, 100, 20, 20)])
+    assert len(regions) == 1
+    x, y, w, h = regions[0]
+    # Padded to at least one HOG window around the motion
+    assert x <= 300 and y <= 100 and x + w >= 320 and y + h >= 120
+    assert w >= 128 and h >= 192
+    assert processor.detection_stats['roi'] == 1
+
+
+def test_overlapping_regions_are_merged(processor):
+    regions = processor.plan_detection(PRE, True, [(100, 100, 20, 20), (130, 110, 20, 20)])
+    assert len(regions) == 1
+
+
+def test_motion_covering_most_of_the_frame_runs_full_detection(processor):
+    assert processor.plan_detection(PRE, True, [(0, 0, 600, 340)]) == []
+    assert processor.detection_stats['full'] == 1
+
+
+def test_full_detection_refresh_ignores_gating(processor):
+    processor.last_full_detection = 100.0 - processor.full_detection_interval
+    assert processor.plan_detection(PRE, False, []) == []
+    assert processor.last_full_detection == 100.0
+    # Until the next refresh is due, frames without motion are skipped again
+    assert processor.plan_detection(PRE, False, []) is None
+
+
+def test_motion_gating_searches_the_full_frame_only_on_motion(processor):
+    processor.detection_gating = 'motion'
+    assert processor.plan_detection(PRE, True, [(300, 100, 20, 20)]) == []
+    assert processor.plan_detection(PRE, False, []) is None
+
+
+def test_gating_off_detects_on_every_frame(processor):
+    processor.detection_gating = 'off'
+    assert processor.plan_detection(PRE, False, []) == []
+
+
+class _Clock(datetime):
+    """The hour turns between two reads"""
+    reads = iter([datetime(2024, 1, 1, 12, 59, 59, 999999), datetime(2024, 1, 1, 13)])
+
+    @classmethod
+    def utcnow(cls):
+        return next(cls.reads)
+
+
+def test_packed_clip_name_and_pack_use_one_clock(processor, monkeypatch, tmp_path):
+    monkeypatch.setattr(src.video_processor, "CLIP_STORAGE", 'pack')
+    monkeypatch.setattr(src.video_processor, "CLIPS_DIR", str(tmp_path))
+    monkeypatch.setattr(src.video_processor, "datetime", _Clock)
+    frame = np.random.default_rng(0).integers(0, 255, (100, 100, 3), dtype=np.uint8)
+
+    path = processor.save_object_clip(frame, {'x': 10, 'y': 10, 'w': 50, 'h': 50}, "person", "1-2-3")
+    assert path.endswith("stream_1/2024010112.pack/stream_1_person_clip_20240101_125959_999999_1-2-3.jpg")
@@ -0,0 +1,95 @@
+import queue
+
+import numpy as np
+
+import src.worker_pool
+from src.worker_pool import (SHARED_FRAME_SLOTS, ForwardingThumbnails, SharedFrameReader, SharedFrameWriter,
+                             StreamWorkerPool)
+
+
+def _frame(value: int, shape=(4, 6, 3)) -> np.ndarray:
+    return np.full(shape, value, dtype=np.uint8)
+
+
+def _read(reader: SharedFrameReader, event):
+    _, stream_id, name, slot, shape, dtype, sequence = event
+    return reader.read(stream_id, name, slot, shape, dtype, sequence)
+
+
+def test_shared_frame_round_trip():
+    events = queue.Queue()
+    writer, reader = SharedFrameWriter(events), SharedFrameReader()
+    try:
+        writer.set_watched(1, True)
+        writer.publish(1, _frame(7))
+        frame = _read(reader, events.get_nowait())
+        assert frame is not None and frame.shape == (4, 6, 3) and (frame == 7).all()
+    finally:
+        reader.close()
+        writer.close()
+
+
+def test_unwatched_streams_are_not_published():
+    events = queue.Queue()
+    writer = SharedFrameWriter(events)
+    try:
+        writer.publish(1, _frame(1))
+        assert events.empty()
+    finally:
+        writer.close()
+
+
+def test_overwritten_slot_reads_as_none():
+    events = queue.Queue()
+    writer, reader = SharedFrameWriter(events), SharedFrameReader()
+    try:
+        writer.set_watched(1, True)
+        writer.publish(1, _frame(1))
+        stale = events.get_nowait()
+        # One full lap of the ring reuses the stale frame's slot
+        for value in range(SHARED_FRAME_SLOTS):
+            writer.publish(1, _frame(value + 2))
+        assert _read(reader, stale) is None
+        latest = [events.get_nowait() for _ in range(SHARED_FRAME_SLOTS)][-1]
+        assert (_read(reader, latest) == SHARED_FRAME_SLOTS + 1).all()
+    finally:
+        reader.close()
+        writer.close()
+
+
+def test_new_frame_size_gets_a_new_segment():
+    events = queue.Queue()
+    writer, reader = SharedFrameWriter(events), SharedFrameReader()
+    try:
+        writer.set_watched(1, True)
+        writer.publish(1, _frame(1))
+        first = events.get_nowait()
+        writer.publish(1, _frame(2, shape=(8, 10, 3)))
+        second = events.get_nowait()
+        assert second[2] != first[2]
+        assert _read(reader, second).shape == (8, 10, 3)
+    finally:
+        reader.close()
+        writer.close()
+
+
+class _Thumbnails:
+    def __init__(self):
+        self.prefetched = []
+
+    def prefetch(self, source, widths=None):
+        self.prefetched.append((source, widths))
+
+
+def test_worker_thumbnails_are_made_by_the_api_process(monkeypatch):
+    events = queue.Queue()
+    thumbnails = ForwardingThumbnails(events)
+    monkeypatch.setattr(src.worker_pool, "THUMBNAIL_EAGER_WIDTHS", [])
+    thumbnails.prefetch("frames/a.jpg")
+    assert events.empty()
+
+    monkeypatch.setattr(src.worker_pool, "THUMBNAIL_EAGER_WIDTHS", [320])
+    thumbnails.prefetch("frames/a.jpg")
+    cache = _Thumbnails()
+    StreamWorkerPool(1, frame_hub=None, thumbnails=cache)._handle_event(events.get_nowait())
+    assert cache.prefetched == [("frames/a.jpg", None)]